@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+import time
+
+from astrbot.api import logger
+
+from .storage import atomic_write_bytes
+
+
+class BackfillCheckpoint:
+    """回填进度：已完成的群号 -> {"added": 新增条数, "at": 完成时间}，每完成一个群原子写入一次"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.groups = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.groups = json.load(f).get("groups") or {}
+            except Exception as e:
+                logger.warning(f"[invite] 回填进度文件损坏，将从头开始：{e}")
+
+    def done(self, group_id) -> bool:
+        return str(group_id) in self.groups
+
+    async def mark(self, group_id, added: int):
+        self.groups[str(group_id)] = {"added": added, "at": int(time.time())}
+        payload = json.dumps({"groups": self.groups}, ensure_ascii=False).encode("utf-8")
+        await asyncio.to_thread(atomic_write_bytes, self.path, payload)
+
+    def reset(self):
+        self.groups = {}
+
+
+class Backfiller:
+    """按群并发回填历史成员：最多 concurrency 个群同时拉取成员列表，
+    每个群处理完（一次批量写入并落盘）后记录检查点，中断后重跑会跳过已完成的群。
+    同一时刻只允许一个回填任务。
+    """
+
+    def __init__(self, checkpoint_path: str, concurrency: int = 4):
+        self.checkpoint_path = checkpoint_path
+        self.concurrency = max(1, int(concurrency))
+        self.running = False
+
+    async def run(self, group_ids, process, restart: bool = False):
+        """process(group_id) 为协程函数，返回该群新增条数。
+        逐个产出 (已完成数, 待处理总数, group_id, 新增条数, 异常)；跳过的群不产出。
+        """
+        checkpoint = BackfillCheckpoint(self.checkpoint_path)
+        if restart:
+            checkpoint.reset()
+        pending = [str(g) for g in dict.fromkeys(group_ids) if not checkpoint.done(g)]
+        if not pending:
+            return
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def worker(group_id):
+            async with semaphore:
+                try:
+                    return group_id, await process(group_id), None
+                except Exception as e:
+                    return group_id, 0, e
+
+        self.running = True
+        tasks = [asyncio.ensure_future(worker(g)) for g in pending]
+        try:
+            finished = 0
+            for next_done in asyncio.as_completed(tasks):
+                group_id, added, error = await next_done
+                finished += 1
+                if error is None:
+                    await checkpoint.mark(group_id, added)
+                else:
+                    logger.warning(f"[invite] 回填群 {group_id} 失败：{error}")
+                yield finished, len(pending), group_id, added, error
+        finally:
+            # 调用方提前结束（如命令被取消）时不再继续拉取
+            for task in tasks:
+                task.cancel()
+            self.running = False
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import io
+import os
+import random
+import zlib
+
+try:
+    from PIL import Image
+except ImportError:  # 没有 Pillow 时直接使用原图
+    Image = None
+
+from astrbot.api import logger
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.webp')
+
+
+class BackgroundCatalog:
+    """卡片背景目录：plugin-data/invitecount_images/ 下的图片。
+
+    - 只在目录 mtime 变化时重新扫描，平时每次取图只有一次 stat
+    - 每张原图在后台线程里预处理一次：缩到卡片宽度、转为压缩 JPEG，
+      按原图内容哈希缓存在 cache_dir，预处理完成前先返回原图
+    - mode=group 时按群号固定选图（同一群的卡片背景稳定，也更容易命中渲染缓存）
+    """
+
+    def __init__(self, folder: str, cache_dir: str, width: int = 1120, quality: int = 85, mode: str = "random"):
+        self.folder = folder
+        self.cache_dir = cache_dir
+        self.width = width
+        self.quality = quality
+        self.mode = mode
+        self._mtime = None
+        self._images = []  # [(path, mtime_ns, size)]
+        self._variants = {}  # (path, mtime_ns, size) -> 预处理后的文件
+        self._preparing = False
+        self.stats = {"scans": 0, "prepared": 0, "errors": 0}
+
+    def pick(self, key=None) -> str | None:
+        """返回一张背景图的本地路径；目录为空返回 None"""
+        self._refresh()
+        if not self._images:
+            return None
+        if key is not None and self.mode == "group":
+            entry = self._images[zlib.crc32(str(key).encode("utf-8")) % len(self._images)]
+        else:
+            entry = random.choice(self._images)
+        return self._variants.get(entry, entry[0])
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            if self._mtime is None:
+                # 首次访问时建好目录，方便用户放图
+                try:
+                    os.makedirs(self.folder, exist_ok=True)
+                except OSError:
+                    pass
+                self._mtime = -1
+            self._images = []
+            return
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        images = []
+        try:
+            with os.scandir(self.folder) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTS):
+                        st = entry.stat()
+                        images.append((entry.path, st.st_mtime_ns, st.st_size))
+        except OSError as e:
+            logger.debug(f"[invite debug] 扫描背景目录失败: {e}")
+        images.sort()
+        self._images = images
+        current = set(images)
+        for entry in [e for e in self._variants if e not in current]:
+            del self._variants[entry]
+        self.stats["scans"] += 1
+        self._schedule_prepare()
+
+    def _schedule_prepare(self):
+        """在事件循环里取出待预处理的原图交给线程池；线程只返回结果，由 _merge 在事件循环里并入"""
+        if Image is None or self._preparing:
+            return
+        pending = [e for e in self._images if e not in self._variants]
+        if not pending:
+            return
+        self._preparing = True
+        keep = {os.path.basename(p) for p in self._variants.values()}
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._merge(self._prepare_all(pending, keep))
+            return
+        future = loop.run_in_executor(None, self._prepare_all, pending, keep)
+        future.add_done_callback(self._prepared)
+
+    def _prepared(self, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            self._preparing = False
+            logger.debug(f"[invite debug] 背景图预处理失败: {e}")
+            return
+        self._merge(result)
+
+    def _merge(self, result):
+        variants, prepared, errors = result
+        self._preparing = False
+        self._variants.update(variants)
+        self.stats["prepared"] += prepared
+        self.stats["errors"] += errors
+        # 预处理期间被删掉的原图不再保留
+        current = set(self._images)
+        for entry in [e for e in self._variants if e not in current]:
+            del self._variants[entry]
+        # 预处理期间目录又有变化时继续处理新图
+        self._schedule_prepare()
+
+    def _prepare_all(self, pending: list, keep: set):
+        """在线程中执行：预处理 pending 里的原图，返回 ({entry: 文件}, 成功数, 失败数)；不改动实例状态"""
+        variants = {}
+        prepared = errors = 0
+        for entry in pending:
+            try:
+                variants[entry] = self._prepare(entry[0])
+                prepared += 1
+            except Exception as e:
+                # 无法处理的图保留原图，不再重试
+                variants[entry] = entry[0]
+                errors += 1
+                logger.debug(f"[invite debug] 背景图预处理失败 {entry[0]}: {e}")
+        self._prune(keep | {os.path.basename(p) for p in variants.values()})
+        return variants, prepared, errors
+
+    def _prepare(self, path: str) -> str:
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.blake2b(raw, digest_size=16)
+        digest.update(f"{self.width}:{self.quality}".encode())
+        out_path = os.path.join(self.cache_dir, f"{digest.hexdigest()}.jpg")
+        if os.path.exists(out_path):
+            return out_path
+        with Image.open(io.BytesIO(raw)) as src:
+            src.draft("RGB", (self.width, self.width))  # JPEG 直接按缩小比例解码
+            img = src.convert("RGB")
+        if img.width > self.width:
+            img = img.resize((self.width, max(1, round(img.height * self.width / img.width))), Image.LANCZOS)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = out_path + ".tmp"
+        img.save(tmp, "JPEG", quality=self.quality, optimize=True, progressive=True)
+        os.replace(tmp, out_path)
+        return out_path
+
+    def _prune(self, keep: set):
+        """删除已不对应任何原图的缓存文件（keep 为仍在使用的缓存文件名）"""
+        try:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".jpg") and name not in keep:
+                    os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
@@ -0,0 +1,251 @@
+"""邀请统计插件基准测试。
+
+用法（在插件目录下执行）：
+    python benchmarks/bench.py --sizes 1k,100k --backends json,sqlite --out bench-results.json
+    python benchmarks/bench.py --sizes 1k --compare bench-results.json   # 与上次结果对比
+
+每个 (数据规模, 存储后端) 组合在独立子进程中运行，峰值内存互不干扰；
+结果写为 JSON，便于不同版本之间对比回归。
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCH_DIR)
+STUB_DIR = os.path.join(BENCH_DIR, "stubs")
+
+# 后端名 -> 插件配置
+BACKENDS = {
+    "json": {"storage_backend": "json", "snapshot_format": "binary"},
+    "json-text": {"storage_backend": "json", "snapshot_format": "json"},
+    "sqlite": {"storage_backend": "sqlite"},
+    "sharded": {"storage_backend": "sharded"},
+}
+RANK_MODES = {"全量": "", "总": "总", "差": "差", "周": "周", "月": "月"}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    scale = {"k": 1000, "m": 1000 ** 2}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def load_plugin_module():
+    """以包的方式导入插件（插件内部使用相对导入），astrbot.api 用本地替身"""
+    sys.path.insert(0, STUB_DIR)
+    sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+    sys.path.insert(0, BENCH_DIR)
+    logging.getLogger("astrbot").setLevel(logging.ERROR)
+    return importlib.import_module(f"{os.path.basename(PLUGIN_DIR)}.main")
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50": round(statistics.median(samples), 3),
+        "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "mean": round(statistics.fmean(samples), 3),
+        "n": len(samples),
+    }
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def data_bytes(store) -> int:
+    """存储后端自身的数据文件大小（不含作为输入的 invitecount.json，json-text 除外）"""
+    paths = []
+    if store.backend == "json":
+        paths = [store.snap_path if store.snapshot_format == "binary" else store.path, *store.journal.files()]
+    elif store.backend == "sqlite":
+        paths = [store.path, store.path + "-wal"]
+    elif store.backend == "sharded":
+        paths = [os.path.join(store.path, name) for name in os.listdir(store.path)]
+    return sum(os.path.getsize(p) for p in paths if os.path.isfile(p))
+
+
+async def timed_command(plugin, agen_factory, repeat: int) -> dict:
+    samples = []
+    for i in range(repeat):
+        # 每次清空渲染缓存，测的是数据查询与卡片生成而非缓存命中
+        plugin.render_cache.clear()
+        started = time.perf_counter()
+        async for _ in agen_factory(i):
+            pass
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+async def run_case(size: int, backend: str, events: int, repeat: int) -> dict:
+    main = load_plugin_module()
+    import synthetic
+    from astrbot.api import AstrBotConfig
+    from astrbot.api.star import Context
+
+    workdir = tempfile.mkdtemp(prefix="invitecount-bench-")
+    try:
+        data_dir = os.path.join(workdir, "plugin-data")
+        os.makedirs(data_dir)
+        inviters = synthetic.write_dataset(os.path.join(data_dir, "invitecount.json"), size)
+        # 自动写盘关闭，写盘耗时由 save_ms 单独测量；图片渲染走本地替身（只含模板渲染）
+        config = {"storage_scope": "group", "save_interval": 3600, "save_batch_size": 10 ** 9,
+                  "journal_compact_size": 10 ** 9, "enable_image_render": True, **BACKENDS[backend]}
+        result = {"size": size, "backend": backend}
+
+        # 首次启动：读入 JSON 交换格式（sqlite/sharded 含一次性导入）
+        plugin = main.InviteQueryPlugin(Context(workdir), AstrBotConfig(config))
+        result["first_load_ms"] = round(plugin.load_ms, 3)
+        await plugin.initialize()
+        result["records"] = plugin.store.count_records()
+        if plugin.store.backend == "json":
+            started = time.perf_counter()
+            plugin.store.compact()
+            result["snapshot_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        await plugin.terminate()
+
+        # 再次启动：读取后端自身格式
+        plugin = main.InviteQueryPlugin(Context(workdir), AstrBotConfig(config))
+        result["reload_ms"] = round(plugin.load_ms, 3)
+        await plugin.initialize()
+        result["data_bytes"] = data_bytes(plugin.store)
+        # 首次访问数据桶：延迟解码/按需加载分片与建索引的一次性开销，单独计时以免混入吞吐
+        started = time.perf_counter()
+        plugin.store.inviter_index(synthetic.CTX_ID)
+        result["first_access_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+        # 事件摄入
+        notices = synthetic.notice_events(events, inviters)
+        started = time.perf_counter()
+        for event in notices:
+            await plugin.handle_group_event(event)
+        await plugin.writer.drain()
+        elapsed = time.perf_counter() - started
+        result["ingest_notices_per_s"] = round(len(notices) / elapsed, 1)
+        messages = synthetic.message_events(events * 10)
+        started = time.perf_counter()
+        for event in messages:
+            await plugin.handle_group_event(event)
+        elapsed = time.perf_counter() - started
+        result["ingest_messages_per_s"] = round(len(messages) / elapsed, 1)
+        started = time.perf_counter()
+        plugin.save()
+        result["save_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+        # 查询与排行
+        rng = random.Random(1)
+        targets = [rng.choice(inviters[:50]) for _ in range(repeat)]
+        result["query_ms"] = await timed_command(plugin, lambda i: plugin.cmd_invite_query(
+            synthetic.command_event(f"/邀请查询 {targets[i]}", sender=targets[i])), repeat)
+        result["rank_ms"] = {}
+        for name, mode in RANK_MODES.items():
+            text = f"/邀请排行 {mode}".strip()
+            result["rank_ms"][name] = await timed_command(
+                plugin, lambda i: plugin.cmd_invite_rank(synthetic.command_event(text)), repeat)
+
+        await plugin.terminate()
+        result["peak_rss_mb"] = peak_rss_mb()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def flatten(result: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and key not in ("size", "n"):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(current: list, baseline_path: str, threshold: float = 0.1):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["size"], r["backend"]): r for r in json.load(f).get("results", [])}
+    for result in current:
+        base = baseline.get((result["size"], result["backend"]))
+        if base is None:
+            continue
+        old, new = flatten(base), flatten(result)
+        print(f"== {result['backend']} / {result['size']} 条 ==")
+        for key in sorted(new):
+            if key not in old or not old[key]:
+                continue
+            change = (new[key] - old[key]) / old[key]
+            if abs(change) < threshold:
+                continue
+            # *_per_s 越大越好，其余（耗时、大小、内存）越小越好
+            better = change > 0 if key.endswith("_per_s") else change < 0
+            print(f"  {key}: {old[key]} -> {new[key]} ({change:+.0%}，{'提升' if better else '退化'})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邀请统计插件基准测试")
+    parser.add_argument("--sizes", default="1k,100k", help="数据规模，逗号分隔，如 1k,100k,1m")
+    parser.add_argument("--backends", default="json", help=f"存储后端，逗号分隔：{','.join(BACKENDS)}")
+    parser.add_argument("--events", type=int, default=2000, help="摄入测试的通知事件数（普通消息为其 10 倍）")
+    parser.add_argument("--repeat", type=int, default=20, help="每个命令的测量次数")
+    parser.add_argument("--out", default="bench-results.json", help="结果输出文件")
+    parser.add_argument("--compare", help="与之前的结果文件对比，列出变化超过 10%% 的指标")
+    parser.add_argument("--case", nargs=2, metavar=("SIZE", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        result = asyncio.run(run_case(int(args.case[0]), args.case[1], args.events, args.repeat))
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    results = []
+    for backend in args.backends.split(","):
+        if backend not in BACKENDS:
+            parser.error(f"未知存储后端 {backend}")
+        for size in map(parse_size, args.sizes.split(",")):
+            print(f"[bench] {backend} / {size} 条 ...", file=sys.stderr)
+            proc = subprocess.run(
+                [sys.executable, __file__, "--case", str(size), backend,
+                 "--events", str(args.events), "--repeat", str(args.repeat)],
+                capture_output=True, text=True, encoding="utf-8",
+            )
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                sys.exit(proc.returncode)
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "events": args.events,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[bench] 结果已写入 {args.out}", file=sys.stderr)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""基准测试用的 astrbot.api 最小替身，只提供插件导入与运行所需的接口"""
+import logging
+
+logger = logging.getLogger("astrbot")
+
+
+class AstrBotConfig(dict):
+    pass
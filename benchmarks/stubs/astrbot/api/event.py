@@ -0,0 +1,22 @@
+class _Filter:
+    class EventMessageType:
+        GROUP_MESSAGE = "group_message"
+
+    @staticmethod
+    def event_message_type(*args, **kwargs):
+        return lambda fn: fn
+
+    @staticmethod
+    def command(*args, **kwargs):
+        return lambda fn: fn
+
+
+filter = _Filter()
+
+
+class AstrMessageEvent:
+    pass
+
+
+class MessageEventResult:
+    pass
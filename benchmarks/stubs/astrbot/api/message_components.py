@@ -0,0 +1,3 @@
+class At:
+    def __init__(self, qq):
+        self.qq = qq
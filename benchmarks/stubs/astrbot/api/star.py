@@ -0,0 +1,16 @@
+class Context:
+    def __init__(self, data_dir: str | None = None):
+        self.data_dir = data_dir
+
+
+class Star:
+    def __init__(self, context):
+        self.context = context
+
+    async def html_render(self, template, data, return_url=True):
+        # 不调用文转图服务，只计入插件自身的模板渲染开销
+        return f"bench://render/{len(template)}"
+
+
+def register(*args, **kwargs):
+    return lambda cls: cls
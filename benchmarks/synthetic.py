@@ -0,0 +1,130 @@
+"""合成数据：OneBot 通知事件与指定规模的邀请数据文件"""
+import json
+import random
+import time
+
+PLATFORM = "aiocqhttp"
+GROUP_ID = "100000"
+CTX_ID = f"{PLATFORM}:G:{GROUP_ID}"
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class BenchMessage:
+    def __init__(self, raw: dict):
+        self.raw_message = raw
+        self.message = []
+
+
+class BenchEvent:
+    """AstrMessageEvent 替身：通知事件与命令消息共用"""
+
+    def __init__(self, raw: dict, text: str = "", sender: str = "10000", admin: bool = True):
+        self.message_obj = BenchMessage(raw)
+        self.message_str = text
+        self.sender = sender
+        self.admin = admin
+
+    def get_platform_name(self):
+        return PLATFORM
+
+    def get_group_id(self):
+        return str(self.message_obj.raw_message.get("group_id") or "")
+
+    def get_session_id(self):
+        return self.get_group_id()
+
+    def get_sender_id(self):
+        return self.sender
+
+    def is_admin(self):
+        return self.admin
+
+    def get_messages(self):
+        return []
+
+    def plain_result(self, text):
+        return ("plain", text)
+
+    def image_result(self, url):
+        return ("image", url)
+
+
+def inviter_pool(records: int) -> list:
+    """邀请人数量约为记录数的 2%，邀请数呈长尾分布"""
+    return [str(20000 + i) for i in range(max(10, records // 50))]
+
+
+def member_record(rng: random.Random, inviters: list, now: float) -> dict:
+    joined = now - rng.random() * 365 * 86400
+    record = {
+        "nickname": f"成员{rng.randint(1, 10 ** 6)}",
+        "inviter": None,
+        "inviter_name": None,
+        "join_type": "主动",
+        "join_time": time.strftime(TIME_FORMAT, time.localtime(joined)),
+        "leave_type": None,
+        "leave_time": None,
+    }
+    if rng.random() < 0.7:
+        # 帕累托分布挑邀请人：少数人邀请了大部分成员
+        inviter = inviters[min(len(inviters) - 1, int(rng.paretovariate(1.2)) - 1)]
+        record.update(inviter=inviter, inviter_name=f"邀请人{inviter}", join_type="邀请")
+    roll = rng.random()
+    if roll < 0.15:
+        record["leave_type"] = "自己退群"
+    elif roll < 0.2:
+        record["leave_type"] = "被踢(10001)"
+    if record["leave_type"]:
+        record["leave_time"] = time.strftime(TIME_FORMAT, time.localtime(joined + rng.random() * 86400 * 30))
+    return record
+
+
+def write_dataset(path: str, records: int, seed: int = 42) -> list:
+    """生成单群 records 条记录的 invitecount.json（插件的交换格式），返回邀请人列表"""
+    rng = random.Random(seed)
+    inviters = inviter_pool(records)
+    now = time.time()
+    bucket = {str(10 ** 7 + i): member_record(rng, inviters, now) for i in range(records)}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({CTX_ID: bucket}, f, ensure_ascii=False, separators=(",", ":"))
+    return inviters
+
+
+def notice_events(count: int, inviters: list, seed: int = 7) -> list:
+    """入群/退群/被踢通知，比例约 6:3:1，用户 ID 与已有数据不重叠"""
+    rng = random.Random(seed)
+    events = []
+    now = int(time.time())
+    joined = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.6 or not joined:
+            uid = str(9 * 10 ** 8 + i)
+            joined.append(uid)
+            invited = rng.random() < 0.7
+            raw = {
+                "post_type": "notice", "notice_type": "group_increase",
+                "sub_type": "invite" if invited else "approve",
+                "user_id": uid, "operator_id": rng.choice(inviters) if invited else "",
+            }
+        else:
+            uid = joined.pop(rng.randrange(len(joined)))
+            kicked = roll >= 0.9
+            raw = {
+                "post_type": "notice", "notice_type": "group_decrease",
+                "sub_type": "kick" if kicked else "leave",
+                "user_id": uid, "operator_id": "10001" if kicked else uid,
+            }
+        raw.update(group_id=GROUP_ID, time=now + i, self_id="10000")
+        events.append(BenchEvent(raw))
+    return events
+
+
+def message_events(count: int) -> list:
+    """普通群聊消息：插件只需尽快判定与己无关"""
+    raw = {"post_type": "message", "message_type": "group", "group_id": GROUP_ID, "message": "hello"}
+    return [BenchEvent(raw, "hello") for _ in range(count)]
+
+
+def command_event(text: str, sender: str = "10000") -> BenchEvent:
+    return BenchEvent({"post_type": "message", "group_id": GROUP_ID}, text, sender=sender)
@@ -0,0 +1,279 @@
+import hashlib
+import html
+import os
+import re
+from collections import OrderedDict
+from typing import NamedTuple
+
+try:
+    from PIL import Image, ImageDraw, ImageFilter, ImageFont
+except ImportError:  # Pillow 为可选依赖，未安装时只走 html_render
+    Image = ImageDraw = ImageFilter = ImageFont = None
+
+from astrbot.api import logger
+
+# 按顺序尝试的中文字体；插件目录 fonts/ 下的字体优先
+FONT_CANDIDATES = (
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/google-noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/wqy-microhei/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Medium.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+    "C:/Windows/Fonts/simhei.ttf",
+)
+
+DEFAULT_GRADIENT = ("#fdf6ee", "#dbe9fa")
+
+
+class Cell(NamedTuple):
+    text: str
+    color: str = "#333333"
+    bold: bool = False
+
+
+class Card(NamedTuple):
+    """与 HTML 卡片同源的结构化数据，供本地渲染使用"""
+    title: str
+    accent: str
+    rows: tuple = ()  # 每行为 Cell 序列
+    subtitle: str = ""  # 标题右侧（时间）
+    body: str = ""  # 多行正文（奖励卡）
+    body_color: str = "#333333"
+    footer: str = ""
+    empty: str = ""  # rows 为空时的提示
+    panel_alpha: float = 0.82
+
+
+def html_to_text(value: str) -> str:
+    """奖励内容支持 HTML：换行标签转换行，其余标签去掉"""
+    value = re.sub(r"(?i)<br\s*/?>", "\n", value or "")
+    value = re.sub(r"(?i)</(p|div|li)>", "\n", value)
+    return html.unescape(re.sub(r"<[^>]+>", "", value)).strip()
+
+
+class PillowCardRenderer:
+    """用 Pillow 直接绘制查询/排行/奖励卡片，无需浏览器或文转图服务。
+
+    字体在构造时加载一次；背景图解码、缩放到卡片宽度并预先模糊后按 (路径, mtime) 缓存。
+    输出 JPEG 写入 out_dir，文件名为卡片内容哈希，相同卡片直接复用。
+    """
+
+    def __init__(self, out_dir: str, font_path: str | None = None, width: int = 560, scale: int = 2,
+                 max_files: int = 256, max_backgrounds: int = 8):
+        self.out_dir = out_dir
+        self.width = width
+        self.scale = max(1, int(scale))
+        self.max_files = max_files
+        self.max_backgrounds = max_backgrounds
+        self._backgrounds = OrderedDict()  # (path, mtime, width) -> (背景, 模糊背景)
+        self.fonts = {}
+        self.font_path = None
+        if Image is None:
+            return
+        self.font_path = self._find_font(font_path)
+        s = self.scale
+        for name, size in (("title", 23), ("text", 16), ("small", 14)):
+            self.fonts[name] = self._load_font(size * s)
+        if self.font_path is None:
+            logger.warning("[invite] 未找到中文字体，本地渲染的中文可能无法显示，可在配置 render_font_path 中指定")
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    @staticmethod
+    def _find_font(font_path):
+        candidates = []
+        if font_path:
+            candidates.append(font_path)
+        local = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+        if os.path.isdir(local):
+            candidates.extend(
+                os.path.join(local, f) for f in sorted(os.listdir(local))
+                if f.lower().endswith((".ttf", ".otf", ".ttc"))
+            )
+        candidates.extend(FONT_CANDIDATES)
+        for path in candidates:
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _load_font(self, size: int):
+        if self.font_path:
+            try:
+                return ImageFont.truetype(self.font_path, size)
+            except OSError as e:
+                logger.warning(f"[invite] 加载字体失败 {self.font_path}: {e}")
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:  # Pillow < 10.1
+            return ImageFont.load_default()
+
+    # ==== 背景 ====
+    def _background(self, path: str | None, size: tuple) -> tuple:
+        """返回 (背景, 模糊背景)；两者都按卡片宽度缓存，不同高度的卡片只需裁剪"""
+        width = size[0]
+        key = ("", 0, width)
+        if path:
+            try:
+                key = (path, os.path.getmtime(path), width)
+            except OSError as e:
+                logger.debug(f"[invite debug] 背景图不可用 {path}: {e}")
+        entry = self._backgrounds.get(key)
+        if entry is None:
+            entry = self._decode(key[0], width)
+            self._backgrounds[key] = entry
+            while len(self._backgrounds) > self.max_backgrounds:
+                self._backgrounds.popitem(last=False)
+        else:
+            self._backgrounds.move_to_end(key)
+        return self._cover(entry[0], size), self._cover(entry[1], size)
+
+    def _decode(self, path: str, width: int) -> tuple:
+        if path:
+            try:
+                with Image.open(path) as src:
+                    src.draft("RGB", (width, width))  # JPEG 直接按缩小比例解码
+                    # 裁成 宽x宽 的方图：常见卡片高度都不超过宽度，渲染时只需裁剪无需再缩放
+                    img = self._cover(src.convert("RGB"), (width, width), Image.LANCZOS)
+                return img, img.filter(ImageFilter.GaussianBlur(7 * self.scale))
+            except Exception as e:
+                logger.debug(f"[invite debug] 背景图解码失败 {path}: {e}")
+        # 渐变底图模糊前后一样
+        img = self._gradient((width, width))
+        return img, img
+
+    @staticmethod
+    def _cover(img, size, resample=None):
+        """等比缩放后居中裁剪，对应 CSS background-size:cover"""
+        w, h = size
+        ratio = max(w / img.width, h / img.height)
+        if ratio != 1:
+            size = (max(w, round(img.width * ratio)), max(h, round(img.height * ratio)))
+            img = img.resize(size, resample if resample is not None else Image.BILINEAR)
+        left = (img.width - w) // 2
+        top = (img.height - h) // 2
+        return img.crop((left, top, left + w, top + h))
+
+    @staticmethod
+    def _gradient(size):
+        w, h = size
+        start = Image.new("RGB", (1, 1), DEFAULT_GRADIENT[0]).getpixel((0, 0))
+        end = Image.new("RGB", (1, 1), DEFAULT_GRADIENT[1]).getpixel((0, 0))
+        strip = Image.new("RGB", (w, 1))
+        strip.putdata([
+            tuple(round(a + (b - a) * x / max(1, w - 1)) for a, b in zip(start, end)) for x in range(w)
+        ])
+        return strip.resize((w, h))
+
+    # ==== 排版 ====
+    def _wrap(self, text: str, font, max_width: int) -> list:
+        lines = []
+        for para in text.split("\n"):
+            line = ""
+            for ch in para:
+                if line and font.getlength(line + ch) > max_width:
+                    lines.append(line)
+                    line = ch
+                else:
+                    line += ch
+            lines.append(line)
+        return lines
+
+    def _fit(self, text: str, font, max_width: int) -> str:
+        if font.getlength(text) <= max_width:
+            return text
+        while text and font.getlength(text + "…") > max_width:
+            text = text[:-1]
+        return text + "…"
+
+    def _columns(self, rows, font, max_width, gap):
+        """按每列最长文本分配列宽，超出时压缩最宽的列（通常是昵称）"""
+        count = max(len(r) for r in rows)
+        widths = [0] * count
+        for row in rows:
+            for i, cell in enumerate(row):
+                widths[i] = max(widths[i], int(font.getlength(cell.text)))
+        overflow = sum(widths) + gap * (count - 1) - max_width
+        if overflow > 0:
+            widest = widths.index(max(widths))
+            widths[widest] = max(gap, widths[widest] - overflow)
+        return widths
+
+    def render(self, card: Card, background_path: str | None = None) -> str:
+        """绘制卡片并返回图片文件路径"""
+        key = hashlib.blake2b(repr((card, background_path, self.font_path)).encode("utf-8"), digest_size=16).hexdigest()
+        out_path = os.path.join(self.out_dir, f"{key}.jpg")
+        if os.path.exists(out_path):
+            return out_path
+        s = self.scale
+        width = self.width * s
+        margin, pad = 18 * s, 20 * s
+        inner = width - 2 * margin - 2 * pad
+        title_font, text_font, small_font = self.fonts["title"], self.fonts["text"], self.fonts["small"]
+        row_h = 35 * s
+        body_lines = self._wrap(card.body, text_font, inner) if card.body else []
+        rows = card.rows or ([[Cell(card.empty, "#bbbbbb")]] if card.empty else [])
+        panel_h = pad + 34 * s + 20 * s
+        panel_h += len(rows) * row_h + len(body_lines) * 28 * s
+        panel_h += (30 * s if card.footer else 0) + pad
+        height = max(230 * s, panel_h + 2 * margin)
+
+        canvas, blurred = self._background(background_path, (width, height))
+        box = (margin, margin, width - margin, margin + panel_h)
+        # 半透明磨砂面板：取预先模糊好的背景，与白色按面板透明度混合后按圆角贴回
+        panel = blurred.crop(box)
+        panel = Image.blend(panel, Image.new("RGB", panel.size, "#ffffff"), card.panel_alpha)
+        mask = Image.new("L", panel.size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle((0, 0, panel.width - 1, panel.height - 1), radius=15 * s, fill=255)
+        canvas.paste(panel, box[:2], mask=mask)
+        draw = ImageDraw.Draw(canvas)
+
+        x, y = margin + pad, margin + pad
+        draw.text((x, y), card.title, font=title_font, fill=card.accent, stroke_width=1, stroke_fill=card.accent)
+        if card.subtitle:
+            draw.text((width - margin - pad, y + 10 * s), card.subtitle, font=small_font, fill="#888888", anchor="ra")
+        y += 38 * s
+        draw.line((x, y, width - margin - pad, y), fill="#dbe7fe", width=max(1, s))
+        y += 14 * s
+
+        if rows:
+            gap = 12 * s
+            widths = self._columns(rows, text_font, inner, gap)
+            for row in rows:
+                cx = x
+                for i, cell in enumerate(row):
+                    text = self._fit(cell.text, text_font, widths[i])
+                    stroke = 1 if cell.bold else 0
+                    draw.text((cx, y + 6 * s), text, font=text_font, fill=cell.color,
+                              stroke_width=stroke, stroke_fill=cell.color)
+                    cx += widths[i] + gap
+                y += row_h
+        for line in body_lines:
+            draw.text((x, y), line, font=text_font, fill=card.body_color)
+            y += 28 * s
+        if card.footer:
+            draw.text((width - margin - pad, y + 8 * s), card.footer, font=small_font, fill="#999999", anchor="ra")
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        tmp = out_path + ".tmp"
+        # 背景多为照片，JPEG 编码比 PNG 快且小得多
+        canvas.save(tmp, "JPEG", quality=90)
+        os.replace(tmp, out_path)
+        self._prune()
+        return out_path
+
+    def _prune(self):
+        try:
+            files = [os.path.join(self.out_dir, f) for f in os.listdir(self.out_dir) if f.endswith(".jpg")]
+            if len(files) <= self.max_files:
+                return
+            files.sort(key=os.path.getmtime)
+            for path in files[:len(files) - self.max_files]:
+                os.remove(path)
+        except OSError as e:
+            logger.debug(f"[invite debug] 清理渲染缓存失败: {e}")
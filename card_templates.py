@@ -0,0 +1,56 @@
+import os
+
+from jinja2 import ChoiceLoader, Environment, FileSystemLoader, select_autoescape
+
+from astrbot.api import logger
+
+BUILTIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+CARD_TEMPLATES = ("invite_query.html", "invite_rank.html", "invite_reward.html")
+
+# 交给 html_render 的外壳模板：卡片 HTML 作为数据传入，昵称里的 {{ }} 不会被二次求值
+PASSTHROUGH_TEMPLATE = "{{ body | safe }}"
+
+
+class CardTemplates:
+    """卡片 Jinja 模板：initialize() 时编译一次，之后每次只做渲染。
+
+    查找顺序：override_dir（用户自定义，同名文件覆盖）> 插件内置 templates/。
+    变量默认 HTML 转义，昵称等用户内容不会破坏卡片结构。
+    """
+
+    def __init__(self, override_dir: str | None = None):
+        self.override_dir = override_dir
+        loaders = []
+        if override_dir and os.path.isdir(override_dir):
+            loaders.append(FileSystemLoader(override_dir))
+        loaders.append(FileSystemLoader(BUILTIN_DIR))
+        self.env = Environment(
+            loader=ChoiceLoader(loaders),
+            autoescape=select_autoescape(("html",), default_for_string=True),
+            auto_reload=False,
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+        self._compiled = {}
+
+    def load(self):
+        """预编译全部卡片模板；用户模板语法错误时回退到内置模板"""
+        for name in CARD_TEMPLATES:
+            try:
+                self._compiled[name] = self.env.get_template(name)
+            except Exception as e:
+                logger.error(f"[invite] 加载模板 {name} 失败，使用内置模板：{e}")
+                builtin = Environment(
+                    loader=FileSystemLoader(BUILTIN_DIR),
+                    autoescape=self.env.autoescape,
+                    trim_blocks=True,
+                    lstrip_blocks=True,
+                )
+                self._compiled[name] = builtin.get_template(name)
+        return self
+
+    def render(self, name: str, data: dict) -> str:
+        template = self._compiled.get(name)
+        if template is None:
+            template = self._compiled[name] = self.env.get_template(name)
+        return template.render(data)
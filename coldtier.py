@@ -0,0 +1,291 @@
+import gzip
+import io
+import json
+import os
+from datetime import date
+from urllib.parse import quote
+
+from astrbot.api import logger
+
+from .records import MemberRecord, intern_id
+from .storage import aggregate_key, atomic_write_bytes
+
+
+def summary_key(record: MemberRecord) -> tuple:
+    """冷数据层汇总计数的键：(邀请人, 进群日序号（无进群时间为 0）, 离群方式)，与邀请人索引的日汇总同粒度"""
+    day = date.fromtimestamp(record.join_ts).toordinal() if record.join_ts else 0
+    return record.inviter or "", day, record.leave_type
+
+
+class _Committed(io.RawIOBase):
+    """只读出归档文件的前 size 字节（已提交部分），之后正在追加或中断残留的批次不可见"""
+
+    def __init__(self, f, size: int):
+        self.f = f
+        self.left = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        if self.left <= 0:
+            return 0
+        n = self.f.readinto(memoryview(buf)[:self.left])
+        self.left -= n
+        return n
+
+
+class ColdTier:
+    """冷数据层：离群超过保留天数的成员移出热数据，整条记录追加写入 gzip JSONL 归档
+    （每批一个 gzip 成员，只追加不改写；每行 {"ctx": ..., "uid": ..., "rec": ...}）。
+
+    成员明细只在归档文件里，内存中每个数据桶只留按 (邀请人, 进群日, 离群方式) 汇总的人数（见 summary_key），
+    存储层构建邀请人索引时由 apply() 计入邀请人的累计/被踢/退群人数与日汇总，/邀请查询 与 /邀请排行 的总数与归档前一致。
+    归档过的成员重新入群时存储层只登记到 rejoined，由插件在后台线程里查归档（reconcile 流程），
+    找到后追加一行 {"ctx": ..., "uid": ..., "rec": ..., "drop": true} 作废该条并扣减汇总，不会重复计数。
+    汇总、各归档文件已提交的长度与待核对的重新入群成员存于 index.json，随存储每次落盘一起写入（见 InviteStore._write_job）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = os.path.join(path, "index.json")
+        self.summary = {}  # ctx_id -> {(邀请人, 进群日, 离群方式): 人数}
+        self.sizes = {}  # 归档文件名 -> 已提交字节数，之后的内容为中断时残留的未提交批次
+        self.rejoined = set()  # 有归档的数据桶里重新入群、待核对归档的 (ctx_id, user_id)
+        # 变更版本号：落盘成功后在事件循环里登记已写入的版本，写失败时保持未保存
+        self.version = 0
+        self.saved_version = 0
+        # 可选 asyncio.Event：有待核对的重新入群成员时置位，唤醒插件的冷数据后台任务
+        self.wakeup = None
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                self.sizes = raw.get("sizes") or {}
+                for ctx_id, rows in (raw.get("summary") or {}).items():
+                    self.summary[ctx_id] = {(inviter, day, kind): n for inviter, day, kind, n in rows}
+                self.rejoined = {(ctx_id, intern_id(uid)) for ctx_id, uid in raw.get("rejoined") or ()}
+                # 旧版索引逐个成员保存精简记录，载入时折算为汇总并在下次落盘时改写
+                for ctx_id, rows in (raw.get("members") or {}).items():
+                    for inviter, join_type, join_ts, kind, leave_ts in rows.values():
+                        self._count(ctx_id, summary_key(
+                            MemberRecord(inviter=inviter, join_ts=join_ts, leave_type=kind)
+                        ), 1)
+            except Exception as e:
+                logger.error(f"[invite] 冷数据索引损坏，已归档成员暂不计入统计：{e}")
+                self.summary, self.sizes, self.rejoined = {}, {}, set()
+
+    # ==== 汇总计数 ====
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.saved_version
+
+    def _changed(self):
+        self.version += 1
+
+    def has(self, ctx_id: str) -> bool:
+        return ctx_id in self.summary
+
+    def ctx_ids(self) -> list:
+        return list(self.summary)
+
+    def count(self, ctx_id: str | None = None) -> int:
+        if ctx_id is not None:
+            return sum(self.summary.get(ctx_id, {}).values())
+        return sum(sum(rows.values()) for rows in self.summary.values())
+
+    def _count(self, ctx_id: str, key: tuple, delta: int):
+        rows = self.summary.setdefault(ctx_id, {})
+        value = rows.get(key, 0) + delta
+        if value > 0:
+            rows[key] = value
+        else:
+            rows.pop(key, None)
+            if not rows:
+                del self.summary[ctx_id]
+        self._changed()
+
+    def add(self, ctx_id: str, record: MemberRecord) -> tuple:
+        """计入一条已归档记录，返回其汇总键"""
+        key = summary_key(record)
+        self._count(ctx_id, key, 1)
+        return key
+
+    def remove(self, ctx_id: str, record: MemberRecord) -> tuple | None:
+        """扣除一条已作废的归档记录，返回其汇总键；汇总里已没有对应计数时返回 None"""
+        key = summary_key(record)
+        if not self.summary.get(ctx_id, {}).get(key):
+            return None
+        self._count(ctx_id, key, -1)
+        return key
+
+    def apply(self, ctx_id: str, index):
+        """把该数据桶的归档人数计入邀请人索引"""
+        for (inviter, day, kind), count in self.summary.get(ctx_id, {}).items():
+            index.add_archived(inviter, day, kind, count)
+
+    def note_rejoin(self, ctx_id: str, user_id: str):
+        """有归档的数据桶里有成员（重新）入群：登记待核对，由后台在归档里查找并作废其旧记录"""
+        self.rejoined.add((ctx_id, intern_id(user_id)))
+        self._changed()
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def settle(self, keys):
+        """核对完成（无论归档里是否有该成员）后移出待核对集合"""
+        self.rejoined.difference_update(keys)
+        self._changed()
+
+    # ==== 归档文件 ====
+    @staticmethod
+    def file_key(ctx_id: str) -> str:
+        """归档文件按数据桶划分；user 作用域每个成员一个桶，同平台合用一个文件"""
+        key = aggregate_key(ctx_id)
+        return key if key and key.endswith(":U:") else ctx_id
+
+    def archive_name(self, ctx_id: str) -> str:
+        return quote(self.file_key(ctx_id), safe="") + ".jsonl.gz"
+
+    def append(self, name: str, rows: list, drop: bool = False) -> int:
+        """在线程中执行：把同一归档文件的 [(ctx_id, user_id, MemberRecord)] 作为一个 gzip 成员追加并 fsync，
+        先截掉上次中断残留的未提交内容；drop 为 True 时追加的是作废行。返回追加后的文件长度，由 commit() 在写队列里登记"""
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, name)
+        lines = []
+        for ctx_id, uid, rec in rows:
+            item = {"ctx": ctx_id, "uid": uid, "rec": rec.to_dict()}
+            if drop:
+                item["drop"] = True
+            lines.append(json.dumps(item, ensure_ascii=False))
+        payload = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+        with open(path, "ab") as f:
+            committed = self.sizes.get(name)
+            if committed is not None and f.tell() > committed:
+                f.truncate(committed)
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def commit(self, name: str, size: int):
+        self.sizes[name] = size
+        self._changed()
+
+    def _read(self, name: str):
+        """在线程中逐行解压一个归档文件的已提交部分，产出 (ctx_id, user_id, 记录字典, 是否作废行)"""
+        path = os.path.join(self.path, name)
+        size = self.sizes.get(name, 0)
+        if not size or not os.path.exists(path):
+            return
+        try:
+            with open(path, "rb") as raw_file:
+                with gzip.open(io.BufferedReader(_Committed(raw_file, size)), "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            item = json.loads(line)
+                            yield item["ctx"], item["uid"], item["rec"], bool(item.get("drop"))
+        except (EOFError, OSError) as e:
+            logger.debug(f"[invite debug] 读取冷数据归档 {name} 到末尾中断：{e}")
+
+    def scan(self, ctx_filter, inviter: str | None = None, skip=frozenset()):
+        """在线程中按需流式读取归档，产出仍有效的 (ctx_id, user_id, 记录字典)。
+        先过一遍收集作废行（只在重新入群时产生，数量很少），再跳过被作废的归档行与 skip 中待核对的成员"""
+        names = sorted({self.archive_name(ctx_id) for ctx_id in self.ctx_ids() if ctx_filter(ctx_id)})
+        for name in names:
+            dropped = {}
+            for ctx_id, uid, raw, drop in self._read(name):
+                if drop:
+                    key = (ctx_id, uid, raw.get("leave_ts", 0))
+                    dropped[key] = dropped.get(key, 0) + 1
+            for ctx_id, uid, raw, drop in self._read(name):
+                if drop or not ctx_filter(ctx_id) or (ctx_id, uid) in skip:
+                    continue
+                if inviter is not None and raw.get("inviter") != inviter:
+                    continue
+                key = (ctx_id, uid, raw.get("leave_ts", 0))
+                if dropped.get(key):
+                    dropped[key] -= 1
+                    continue
+                yield ctx_id, uid, raw
+
+    def lookup(self, keys) -> dict:
+        """在线程中执行：查找 keys 中各 (ctx_id, user_id) 当前有效的归档记录，返回 {(ctx_id, user_id): MemberRecord}"""
+        found = {}
+        wanted = set(keys)
+        for name in sorted({self.archive_name(ctx_id) for ctx_id, _ in wanted}):
+            for ctx_id, uid, raw, drop in self._read(name):
+                key = (ctx_id, uid)
+                if key not in wanted:
+                    continue
+                if not drop:
+                    found[key] = MemberRecord.from_dict(raw)
+                elif key in found and found[key].leave_ts == raw.get("leave_ts", 0):
+                    del found[key]
+        return found
+
+    def find(self, ctx_id: str, user_id: str) -> MemberRecord | None:
+        """在线程中执行：某个成员当前有效的归档记录"""
+        return self.lookup([(ctx_id, str(user_id))]).get((ctx_id, str(user_id)))
+
+    def recover(self, store) -> int:
+        """启动时调用：归档文件里已提交长度之后的批次补登。归档批次：热数据已删、索引未及写入就中断的计入汇总，
+        热数据中仍在的成员说明该批未生效，留待下次归档时截掉；作废批次：汇总未及扣减，直接补扣。返回补登条数"""
+        recovered = 0
+        names = [n for n in os.listdir(self.path) if n.endswith(".jsonl.gz")] if os.path.isdir(self.path) else []
+        for name in names:
+            path = os.path.join(self.path, name)
+            committed = self.sizes.get(name, 0)
+            try:
+                if os.path.getsize(path) <= committed:
+                    continue
+                with open(path, "rb") as raw_file:
+                    raw_file.seek(committed)
+                    with gzip.GzipFile(fileobj=raw_file) as f:
+                        lines = f.read().decode("utf-8").splitlines()
+            except (EOFError, OSError) as e:
+                logger.warning(f"[invite] 冷数据归档 {name} 末尾批次不完整，已忽略：{e}")
+                continue
+            found = 0
+            for line in lines:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                ctx_id, uid = item["ctx"], item["uid"]
+                rec = MemberRecord.from_dict(item["rec"])
+                if item.get("drop"):
+                    store.revive_record(ctx_id, rec)
+                    self.settle([(ctx_id, uid)])
+                    found += 1
+                elif store.get_record(ctx_id, uid) is None:
+                    store.archive_record(ctx_id, uid, rec)
+                    found += 1
+            if found:
+                self.commit(name, os.path.getsize(path))
+                recovered += found
+        if recovered:
+            store.mark_dirty()
+            logger.info(f"[invite] 已从冷数据归档补登 {recovered} 条未提交的记录")
+        return recovered
+
+    def save_job(self):
+        """在事件循环线程取好快照，返回 (线程里执行的写盘函数, 本次写入的版本号)；
+        写盘函数不改动任何状态，成功后由存储层在事件循环里调用 saved()，失败时冷层保持待保存，随下次落盘重试"""
+        payload = {
+            "sizes": dict(self.sizes),
+            "summary": {
+                ctx_id: [[inviter, day, kind, n] for (inviter, day, kind), n in rows.items()]
+                for ctx_id, rows in self.summary.items()
+            },
+            "rejoined": sorted(self.rejoined),
+        }
+
+        def job():
+            data = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            os.makedirs(self.path, exist_ok=True)
+            atomic_write_bytes(self.index_path, data)
+            return len(data)
+        return job, self.version
+
+    def saved(self, version: int):
+        """在事件循环线程调用：登记 version 及之前的变更已写入 index.json"""
+        self.saved_version = max(self.saved_version, version)
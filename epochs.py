@@ -0,0 +1,154 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+from urllib.parse import quote
+
+from astrbot.api import logger
+
+from .records import MemberRecord
+from .storage import LEGACY_CTX, atomic_write_bytes
+
+JOIN_FIELDS = ("inviter", "inviter_name", "join_type", "join_ts")
+LEAVE_FIELDS = ("leave_type", "leave_ts", "kicker")
+
+
+def physical_ctx(ctx_id: str, epoch: int) -> str:
+    """数据桶在某一轮次下的实际存储 ID：第 0 轮沿用原 ID（兼容已有数据），之后为 ctx_id#轮次"""
+    return ctx_id if not epoch else f"{ctx_id}#{epoch}"
+
+
+def merge_record(restored: MemberRecord | None, newer: MemberRecord) -> MemberRecord:
+    """恢复轮次时合并同一成员在两轮中的记录，逐字段合并而不是整条覆盖。
+
+    重置后 /邀请查询 新建的空白模板没有邀请人与入群时间，不能抹掉重置前的入群信息；
+    新一轮里重新入群（入群时间更晚）时入群与离群信息以新记录为准，否则只带回新的离群信息与昵称。
+    """
+    if restored is None:
+        return newer
+    merged = restored.copy()
+    if newer.nickname:
+        merged.nickname = newer.nickname
+    if newer.join_ts and newer.join_ts >= restored.join_ts:
+        names = JOIN_FIELDS + LEAVE_FIELDS
+    elif newer.leave_type and newer.leave_ts >= restored.join_ts:
+        names = LEAVE_FIELDS
+    else:
+        names = ()
+    for name in names:
+        setattr(merged, name, getattr(newer, name))
+    return merged
+
+
+def split_ctx(physical: str) -> tuple:
+    """physical_ctx 的逆运算，返回 (ctx_id, 轮次)"""
+    base, sep, num = physical.rpartition("#")
+    if sep and num.isdigit():
+        return base, int(num)
+    return physical, 0
+
+
+class EpochRegistry:
+    """数据桶轮次表：ctx_id -> {"epoch": 当前轮次, "next": 下一个可用轮次, "retired": [旧轮次...]}。
+
+    重置（赛季清零）只把当前轮次 +1，之后的读写都落到新轮次对应的数据桶里，旧数据原样留在存储中，
+    重置本身为 O(1)；恢复即把轮次切回上一轮。旧轮次超出保留数后由后台任务归档为 gzip JSONL 并从存储删除
+    （见 archive_path），归档后的轮次仍可从归档文件恢复。轮次表很小，每次变更整体原子写入。
+    """
+
+    def __init__(self, path: str, archive_dir: str):
+        self.path = path
+        self.archive_dir = archive_dir
+        self.buckets = {}
+        self._save_lock = asyncio.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.buckets = json.load(f).get("buckets") or {}
+            except Exception as e:
+                logger.warning(f"[invite] 轮次文件损坏，按第 0 轮处理：{e}")
+
+    def epoch(self, ctx_id: str) -> int:
+        entry = self.buckets.get(ctx_id)
+        return entry["epoch"] if entry else 0
+
+    def current(self, ctx_id: str) -> str:
+        """逻辑数据桶 ID -> 当前轮次的存储 ID；旧版扁平数据不分轮次"""
+        if ctx_id == LEGACY_CTX or not self.buckets:
+            return ctx_id
+        return physical_ctx(ctx_id, self.epoch(ctx_id))
+
+    def is_live(self, physical: str) -> bool:
+        """存储 ID 是否属于其数据桶的当前轮次（已重置的旧轮次不参与查询与汇总）"""
+        if not self.buckets:
+            return True
+        ctx_id, epoch = split_ctx(physical)
+        return self.epoch(ctx_id) == epoch
+
+    def retired(self, ctx_id: str) -> list:
+        entry = self.buckets.get(ctx_id)
+        return entry["retired"] if entry else []
+
+    def bump(self, ctx_id: str, reason: str = "") -> tuple:
+        """开启新一轮，返回 (旧存储 ID, 新存储 ID)"""
+        entry = self.buckets.get(ctx_id)
+        if entry is None:
+            entry = self.buckets[ctx_id] = {"epoch": 0, "next": 1, "retired": []}
+        old = entry["epoch"]
+        entry["retired"].append({"epoch": old, "at": int(time.time()), "reason": reason, "archived": False})
+        entry["epoch"] = entry["next"]
+        entry["next"] += 1
+        return physical_ctx(ctx_id, old), physical_ctx(ctx_id, entry["epoch"])
+
+    def restore(self, ctx_id: str) -> tuple | None:
+        """切回上一轮，返回 (被放弃的存储 ID, 恢复的存储 ID, 恢复轮次是否已归档)；没有可恢复的轮次返回 None"""
+        entry = self.buckets.get(ctx_id)
+        if not entry or not entry["retired"]:
+            return None
+        abandoned = entry["epoch"]
+        previous = entry["retired"].pop()
+        entry["epoch"] = previous["epoch"]
+        return physical_ctx(ctx_id, abandoned), physical_ctx(ctx_id, previous["epoch"]), previous["archived"]
+
+    def to_archive(self, keep: int) -> list:
+        """超出保留数、尚未归档的旧轮次：[(ctx_id, 轮次信息)]，最近的 keep 轮留在存储中以便快速恢复"""
+        pending = []
+        for ctx_id, entry in self.buckets.items():
+            retired = entry["retired"]
+            for info in retired[:max(0, len(retired) - max(0, keep))]:
+                if not info["archived"]:
+                    pending.append((ctx_id, info))
+        return pending
+
+    def archive_path(self, physical: str) -> str:
+        return os.path.join(self.archive_dir, quote(physical, safe="") + ".jsonl.gz")
+
+    async def save(self):
+        # 命令与后台归档可能同时保存，串行写入同一个临时文件
+        async with self._save_lock:
+            payload = json.dumps({"buckets": self.buckets}, ensure_ascii=False).encode("utf-8")
+            await asyncio.to_thread(atomic_write_bytes, self.path, payload)
+
+
+def write_archive(path: str, records: list) -> int:
+    """把 [(user_id, MemberRecord)] 写为 gzip JSONL（每行 {"uid": ..., "rec": ...}），返回写入字节数"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = [
+        json.dumps({"uid": uid, "rec": rec.to_dict()}, ensure_ascii=False)
+        for uid, rec in records
+    ]
+    payload = gzip.compress(("\n".join(lines) + "\n").encode("utf-8") if lines else b"")
+    atomic_write_bytes(path, payload)
+    return len(payload)
+
+
+def read_archive(path: str) -> list:
+    """write_archive 的逆运算：返回 [(user_id, 记录字典)]"""
+    rows = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                rows.append((item["uid"], item["rec"]))
+    return rows
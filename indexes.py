@@ -0,0 +1,436 @@
+from datetime import date
+
+from .records import LEAVE_KICK, LEAVE_NONE, LEAVE_SELF, MemberRecord
+
+
+class InviterStats:
+    """单个邀请人的被邀请人名单与计数；archived 为已移入冷数据层的下线数（计入计数，不在名单中）"""
+
+    __slots__ = ("invitees", "total", "valid", "kicked", "left", "archived")
+
+    def __init__(self):
+        # dict 代替 set 以保留入库顺序，便于名单分页
+        self.invitees = {}
+        self.total = 0
+        self.valid = 0
+        self.kicked = 0
+        self.left = 0
+        self.archived = 0
+
+    @property
+    def invalid(self) -> int:
+        return self.total - self.valid
+
+
+class TreeNode:
+    """邀请树节点：total/valid 为全部下线人数/仍在群人数，levels 为 相对层数 -> 人数"""
+
+    __slots__ = ("parent", "alive", "total", "valid", "levels")
+
+    def __init__(self):
+        self.parent = None
+        self.alive = False  # 自身是否仍在群（计入上级的有效下线）
+        self.total = 0
+        self.valid = 0
+        self.levels = {}
+
+    @property
+    def height(self) -> int:
+        """下线层数"""
+        return max(self.levels) if self.levels else 0
+
+
+class InviteTree:
+    """多级邀请树：成员 -> 邀请人 的父子关系，每个节点缓存子树汇总。
+
+    接入/断开一条边时把该子树的汇总沿祖先链逐级加减（O(深度 x 子树层数)），
+    查询子树人数为 O(1)。会成环的边（A 邀请 B、B 又邀请 A 的脏数据）暂不接入树，只计入直接邀请统计；
+    这些边记在 pending 里，之后有边断开（成员离群、改了邀请人）时重试接入。
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.children = {}  # uid -> {child_uid: None}
+        self.pending = {}  # 因成环暂未接入的边：uid -> (邀请人, 是否在群)
+        self.cycles = 0
+
+    def get(self, uid: str) -> TreeNode | None:
+        return self.nodes.get(str(uid))
+
+    def ancestors(self, uid: str) -> list:
+        """上级链（直接邀请人在前）；遇到环即停止"""
+        chain = []
+        seen = {uid}
+        node = self.nodes.get(uid)
+        while node is not None and node.parent is not None and node.parent not in seen:
+            chain.append(node.parent)
+            seen.add(node.parent)
+            node = self.nodes.get(node.parent)
+        return chain
+
+    def depth(self, uid: str) -> int:
+        return len(self.ancestors(str(uid)))
+
+    def _node(self, uid: str) -> TreeNode:
+        node = self.nodes.get(uid)
+        if node is None:
+            node = self.nodes[uid] = TreeNode()
+        return node
+
+    def link(self, uid: str, inviter: str, alive: bool):
+        if not inviter or inviter == uid:
+            return
+        current = self.nodes.get(uid)
+        if current is not None and current.parent is not None:
+            self.unlink(uid)
+        self.pending.pop(uid, None)
+        if uid in self.ancestors(inviter):
+            self.cycles += 1
+            self.pending[uid] = (inviter, alive)
+            return
+        self._attach(uid, inviter, alive)
+
+    def _attach(self, uid: str, inviter: str, alive: bool):
+        self._node(inviter)
+        node = self._node(uid)
+        node.parent = inviter
+        node.alive = alive
+        self.children.setdefault(inviter, {})[uid] = None
+        self._propagate(uid, node, 1)
+
+    def unlink(self, uid: str):
+        if self.pending.pop(uid, None) is not None:
+            return
+        node = self.nodes.get(uid)
+        if node is None or node.parent is None:
+            return
+        self._propagate(uid, node, -1)
+        parent = node.parent
+        node.parent = None
+        siblings = self.children.get(parent)
+        if siblings is not None:
+            siblings.pop(uid, None)
+            if not siblings:
+                del self.children[parent]
+        self._discard(uid)
+        self._discard(parent)
+        if self.pending:
+            self._retry()
+
+    def _retry(self):
+        """断开一条边后，之前因成环被拒的边可能已不再成环，重新接入"""
+        for uid, (inviter, alive) in list(self.pending.items()):
+            if uid not in self.ancestors(inviter):
+                del self.pending[uid]
+                self._attach(uid, inviter, alive)
+
+    def graft(self, inviter: str, count: int):
+        """给 inviter 挂上（count 为负则摘下）已归档的叶子下线：只计人数（均已离群），不建节点"""
+        self._node(inviter)
+        for distance, ancestor in enumerate([inviter] + self.ancestors(inviter)):
+            target = self.nodes[ancestor]
+            target.total += count
+            key = distance + 1
+            value = target.levels.get(key, 0) + count
+            if value:
+                target.levels[key] = value
+            else:
+                target.levels.pop(key, None)
+        if count < 0:
+            self._discard(inviter)
+
+    def _discard(self, uid: str):
+        node = self.nodes.get(uid)
+        if node is not None and node.parent is None and not node.total and uid not in self.children:
+            del self.nodes[uid]
+
+    def _propagate(self, uid: str, node: TreeNode, sign: int):
+        total = 1 + node.total
+        valid = int(node.alive) + node.valid
+        # 该子树相对其邀请人的层分布：自己在第 1 层，下线整体下移一层
+        levels = {1: 1}
+        for level, count in node.levels.items():
+            levels[level + 1] = count
+        for distance, ancestor in enumerate(self.ancestors(uid)):
+            target = self.nodes[ancestor]
+            target.total += sign * total
+            target.valid += sign * valid
+            for level, count in levels.items():
+                key = level + distance
+                value = target.levels.get(key, 0) + sign * count
+                if value:
+                    target.levels[key] = value
+                else:
+                    target.levels.pop(key, None)
+
+
+class RankIndex:
+    """按单项计数降序的名次索引：以计数值为下标的树状数组记录各计数的人数，
+    同计数的邀请人放在一个列表里（删除时与末尾交换，O(1)）。
+
+    名次按竞赛排名（同分并列）：rank = 计数更高的人数 + 1，为一次前缀和 O(log M)；
+    取第 p 名所在的计数用树状数组二分下降 O(log M)，M 为最大计数。分页与“我的排名”都不需要全量排序。
+    """
+
+    __slots__ = ("size", "tree", "groups", "score", "slot")
+
+    def __init__(self):
+        self.size = 0
+        self.tree = [0]
+        self.groups = {}  # 计数 -> [key, ...]
+        self.score = {}  # key -> 计数
+        self.slot = {}  # key -> 在同计数列表中的下标
+
+    def __len__(self) -> int:
+        return len(self.score)
+
+    def _grow(self, count: int):
+        if count < self.size:
+            return
+        # 容量翻倍后按各计数人数线性重建树状数组（下标 = 计数 + 1）
+        self.size = max(16, self.size * 2, count + 1)
+        tree = [0] * (self.size + 1)
+        for value, group in self.groups.items():
+            tree[value + 1] = len(group)
+        for i in range(1, self.size + 1):
+            j = i + (i & -i)
+            if j <= self.size:
+                tree[j] += tree[i]
+        self.tree = tree
+
+    def _add(self, count: int, delta: int):
+        i = count + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, count: int) -> int:
+        """计数 <= count 的人数"""
+        i = min(count + 1, self.size)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _count_at(self, position: int) -> int:
+        """降序第 position 位（从 0 起）的计数：即升序第 n - position 位，树状数组上二分下降"""
+        target = len(self.score) - position
+        i = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            j = i + step
+            if j <= self.size and self.tree[j] < target:
+                i = j
+                target -= self.tree[j]
+            step >>= 1
+        return i  # 下标 i + 1 对应计数 i
+
+    def set(self, key, count: int | None):
+        """更新 key 的计数；count 为 None 表示移出排行"""
+        old = self.score.get(key)
+        if old == count:
+            return
+        if old is not None:
+            group = self.groups[old]
+            i = self.slot.pop(key)
+            last = group.pop()
+            if last != key:
+                group[i] = last
+                self.slot[last] = i
+            if not group:
+                del self.groups[old]
+            self._add(old, -1)
+            del self.score[key]
+        if count is None:
+            return
+        self._grow(count)
+        group = self.groups.setdefault(count, [])
+        self.slot[key] = len(group)
+        group.append(key)
+        self._add(count, 1)
+        self.score[key] = count
+
+    def rank(self, key) -> int | None:
+        """名次（同分并列），不在排行中返回 None"""
+        count = self.score.get(key)
+        if count is None:
+            return None
+        return len(self.score) - self._prefix(count) + 1
+
+    def position(self, key) -> int | None:
+        """在降序列表中的位置（从 0 起，同分者按组内顺序排开）"""
+        count = self.score.get(key)
+        if count is None:
+            return None
+        return len(self.score) - self._prefix(count) + self.slot[key]
+
+    def items(self, start: int, stop: int) -> list:
+        """降序第 [start, stop) 位的 (key, 计数, 名次)"""
+        n = len(self.score)
+        start, stop = max(0, start), min(stop, n)
+        result = []
+        while start < stop:
+            count = self._count_at(start)
+            above = n - self._prefix(count)
+            group = self.groups[count]
+            end = min(stop, above + len(group))
+            for key in group[start - above:end - above]:
+                result.append((key, count, above + 1))
+            start = end
+        return result
+
+
+class InviterIndex:
+    """单个数据桶的邀请人反向索引：inviter -> InviterStats。
+
+    同时维护按入群日期的日汇总 daily：日序号(date.toordinal) -> inviter -> [有效, 总, 无效]，
+    任意时间窗口的排行只需累加窗口内的日桶，不再逐条解析入群时间。
+    由存储层在每次写记录时按“旧记录减、新记录加”增量维护，查询为 O(1)。
+    tree 为同一数据桶的多级邀请树（见 InviteTree），随之一起维护；跨桶汇总索引不建树（with_tree=False）。
+    """
+
+    def __init__(self, with_tree: bool = True):
+        self.by_inviter = {}
+        self.daily = {}
+        self.tree = InviteTree() if with_tree else None
+        # 指标(0 有效 / 1 总 / 2 无效) -> RankIndex，首次按该指标排名时构建
+        self.rankings = {}
+
+    @staticmethod
+    def _day(record: MemberRecord) -> int:
+        """进群日序号，无进群时间为 0（不计入日汇总）"""
+        return date.fromtimestamp(record.join_ts).toordinal() if record.join_ts else 0
+
+    def _roll(self, day: int, inviter: str, kind: int, delta: int):
+        if not day:
+            return
+        per_day = self.daily.setdefault(day, {})
+        counts = per_day.get(inviter)
+        if counts is None:
+            counts = per_day[inviter] = [0, 0, 0]
+        counts[1] += delta
+        counts[2 if kind else 0] += delta
+        if not counts[1]:
+            del per_day[inviter]
+            if not per_day:
+                del self.daily[day]
+
+    def _tally(self, stats: InviterStats, day: int, inviter: str, kind: int, delta: int):
+        stats.total += delta
+        self._roll(day, inviter, kind, delta)
+        if kind == LEAVE_NONE:
+            stats.valid += delta
+        elif kind == LEAVE_KICK:
+            stats.kicked += delta
+        elif kind == LEAVE_SELF:
+            stats.left += delta
+
+    def _stats(self, inviter: str) -> InviterStats:
+        stats = self.by_inviter.get(inviter)
+        if stats is None:
+            stats = self.by_inviter[inviter] = InviterStats()
+        return stats
+
+    def _settle(self, inviter: str, stats: InviterStats):
+        """计数变化后：计数归零的邀请人移出索引，已构建的名次索引同步更新"""
+        if not stats.total:
+            del self.by_inviter[inviter]
+            stats = None
+        if self.rankings:
+            self._rerank(inviter, stats)
+
+    def add(self, user_id: str, record: MemberRecord | None):
+        inviter = record.inviter if record else None
+        if not inviter:
+            return
+        stats = self._stats(inviter)
+        stats.invitees[user_id] = None
+        self._tally(stats, self._day(record), inviter, record.leave_type, 1)
+        if self.tree is not None:
+            self.tree.link(user_id, inviter, record.leave_type == LEAVE_NONE)
+        self._settle(inviter, stats)
+
+    def remove(self, user_id: str, record: MemberRecord | None):
+        inviter = record.inviter if record else None
+        if not inviter:
+            return
+        stats = self.by_inviter.get(inviter)
+        if stats is None or user_id not in stats.invitees:
+            return
+        del stats.invitees[user_id]
+        self._tally(stats, self._day(record), inviter, record.leave_type, -1)
+        if self.tree is not None:
+            self.tree.unlink(user_id)
+        self._settle(inviter, stats)
+
+    def add_archived(self, inviter: str, day: int, kind: int, count: int = 1):
+        """计入冷数据层的汇总人数（同一邀请人、进群日与离群方式的 count 人）：只加计数、日汇总与邀请树人数，不进被邀请人名单"""
+        if not inviter or count <= 0:
+            return
+        stats = self._stats(inviter)
+        stats.archived += count
+        self._tally(stats, day, inviter, kind, count)
+        if self.tree is not None:
+            self.tree.graft(inviter, count)
+        self._settle(inviter, stats)
+
+    def remove_archived(self, inviter: str, day: int, kind: int, count: int = 1):
+        stats = self.by_inviter.get(inviter) if inviter else None
+        if stats is None or stats.archived < count or count <= 0:
+            return
+        stats.archived -= count
+        self._tally(stats, day, inviter, kind, -count)
+        if self.tree is not None:
+            self.tree.graft(inviter, -count)
+        self._settle(inviter, stats)
+
+    @staticmethod
+    def _metric(stats: InviterStats, metric: int) -> int:
+        return stats.invalid if metric == 2 else stats.total if metric == 1 else stats.valid
+
+    def _rerank(self, inviter: str, stats: InviterStats | None):
+        for metric, ranking in self.rankings.items():
+            ranking.set(inviter, None if stats is None else self._metric(stats, metric))
+
+    def ranking(self, metric: int) -> RankIndex:
+        """全量计数的名次索引（metric 同 counts() 的下标：0 有效 / 1 总 / 2 无效），之后随写入增量维护"""
+        ranking = self.rankings.get(metric)
+        if ranking is None:
+            ranking = self.rankings[metric] = RankIndex()
+            for inviter, stats in self.by_inviter.items():
+                ranking.set(inviter, self._metric(stats, metric))
+        return ranking
+
+    def get(self, inviter: str) -> InviterStats | None:
+        return self.by_inviter.get(str(inviter))
+
+    def counts(self, start_day: date | None = None, end_day: date | None = None) -> dict:
+        """inviter -> [有效, 总, 无效]；不给日期时直接取全量计数"""
+        if start_day is None and end_day is None:
+            return {k: [v.valid, v.total, v.invalid] for k, v in self.by_inviter.items()}
+        start_key = start_day.toordinal() if start_day else 0
+        end_key = end_day.toordinal() if end_day else date.max.toordinal()
+        # 窗口天数少于已有日桶数时按日期逐天取，否则遍历已有日桶过滤
+        if end_key - start_key < len(self.daily):
+            days = range(start_key, end_key + 1)
+        else:
+            days = (d for d in self.daily if start_key <= d <= end_key)
+        result = {}
+        for day in days:
+            for inviter, (valid, total, invalid) in self.daily.get(day, {}).items():
+                acc = result.get(inviter)
+                if acc is None:
+                    result[inviter] = [valid, total, invalid]
+                else:
+                    acc[0] += valid
+                    acc[1] += total
+                    acc[2] += invalid
+        return result
+
+    @classmethod
+    def build(cls, records) -> "InviterIndex":
+        index = cls()
+        for uid, rec in records:
+            index.add(uid, rec)
+        return index
@@ -1,12 +1,30 @@
 from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context, Star, register
 from astrbot.api import logger, AstrBotConfig
+import asyncio
 import json
 import os
+import time
 from datetime import datetime, timedelta
 import astrbot.api.message_components as Comp
 from astrbot.api.message_components import At
-import random
+import heapq
+from itertools import islice
+
+from .backfill import Backfiller
+from .backgrounds import BackgroundCatalog
+from .card_renderer import Card, Cell, PillowCardRenderer, html_to_text
+from .card_templates import PASSTHROUGH_TEMPLATE, CardTemplates
+from .coldtier import ColdTier
+from .epochs import EpochRegistry, merge_record, physical_ctx, read_archive, split_ctx, write_archive
+from .members import MemberDirectory
+from .metrics import Metrics, metered
+from .migration import LegacyMigrator
+from .protocol import DedupWindow, NoticeNormalizer, notice_post_type
+from .records import JOIN_ACTIVE, JOIN_INVITE, JOIN_NONE, LEAVE_KICK, LEAVE_SELF, MemberRecord, intern_id
+from .render_cache import RenderCache
+from .storage import LEGACY_CTX, aggregate_key, atomic_write_bytes, create_store
+from .writer import StoreWriter
 
 # 数据持久化，存 data 目录下
 # AstrBot 推荐插件数据存储: data/plugins/data-invitecount/invite_data.json
@@ -24,6 +42,15 @@ def save_data(data):
     with open(INVITE_DATA_FILE, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2, default=str)
 
+def parse_day(text: str):
+    """解析 YYYY-mm-dd / YYYY/mm/dd / YYYYmmdd 日期参数，失败返回 None"""
+    for fmt in ('%Y-%m-%d', '%Y/%m/%d', '%Y%m%d'):
+        try:
+            return datetime.strptime(str(text).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
 def get_global_plugin_data_file(context):
     """
     返回主 data/plugin-data/invitecount.json 路径（与 plugins 并列，支持多环境）
@@ -56,91 +83,179 @@ class InviteQueryPlugin(Star):
         self.config = config or AstrBotConfig({"only_stat_valid": False, "allow_at_query": True, "show_inviter": True})
         logger.debug(f"[invite-plugin] 配置已注入/初始化: {dict(self.config or {})}")
         self.data_file = get_global_plugin_data_file(self.context)
-        self.invite_data = self.load_data()
+        self.store = create_store(
+            self.config.get("storage_backend", "json"),
+            self.data_file,
+            flush_interval=self.config.get("save_interval", 5),
+            flush_threshold=self.config.get("save_batch_size", 100),
+            compact_threshold=self.config.get("journal_compact_size", 5000),
+            max_resident=self.config.get("shard_cache_size", 256),
+            snapshot_format=self.config.get("snapshot_format", "binary"),
+        )
+        # 冷数据层：离群超过 cold_after_days 天的成员归档为压缩文件，须在加载（建索引）之前挂上
+        self.cold = ColdTier(os.path.join(os.path.dirname(self.data_file), 'invitecount_cold'))
+        self.store.cold = self.cold
+        self.load_data()
+        self.cold.recover(self.store)
+        # 性能指标：未启用时各埋点只有一次属性判断
+        self.metrics = Metrics(enabled=self.config.get("metrics_enabled", False))
+        self.store.on_flush = lambda ms, written: self.metrics.observe("save", ms)
+        self._metrics_task = None
+        # 所有记录变更经单写者队列按事件顺序串行执行
+        self.writer = StoreWriter()
+        self.member_directory = MemberDirectory(ttl=self.config.get("member_cache_ttl", 300))
+        self.normalizer = NoticeNormalizer()
+        self.dedup = DedupWindow(window=self.config.get("dedup_window", 600))
+        self.render_cache = RenderCache(
+            max_size=self.config.get("render_cache_size", 64),
+            ttl=self.config.get("render_cache_ttl", 600),
+        )
+        plugin_data_dir = os.path.dirname(self.data_file)
+        # 同名文件放在 invitecount_templates/ 下即可覆盖内置卡片模板
+        self.card_templates = CardTemplates(os.path.join(plugin_data_dir, 'invitecount_templates'))
+        self.background_catalog = BackgroundCatalog(
+            os.path.join(plugin_data_dir, 'invitecount_images'),
+            os.path.join(plugin_data_dir, 'invitecount_bgcache'),
+            mode=self.config.get("background_mode", "random"),
+        )
+        self.card_renderer = PillowCardRenderer(
+            os.path.join(plugin_data_dir, 'invitecount_render'),
+            font_path=self.config.get("render_font_path") or None,
+        )
+        # (ctx_id, group_id) -> 上次同步昵称时的成员列表版本
+        self._nickname_synced = {}
+        self.metrics_file = os.path.join(plugin_data_dir, 'invitecount_metrics.prom')
+        self.backfiller = Backfiller(
+            os.path.join(plugin_data_dir, 'invitecount_backfill.json'),
+            concurrency=self.config.get("backfill_concurrency", 4),
+        )
+        # 数据桶轮次（赛季重置）：重置只切换轮次，旧轮次由后台任务归档
+        self.epochs = EpochRegistry(
+            os.path.join(plugin_data_dir, 'invitecount_epochs.json'),
+            os.path.join(plugin_data_dir, 'invitecount_epochs'),
+        )
+        self.store.live_ctx = self.epochs.is_live
+        self._epoch_gc_task = None
+        # 旧版数据分批迁移（检查点记录进度，可后台运行）
+        self.migrator = LegacyMigrator(
+            os.path.join(plugin_data_dir, 'invitecount_migration.json'),
+            chunk_size=self.config.get("migration_chunk_size", 500),
+        )
+        self._migration_task = None
+        self._cold_task = None
 
     async def initialize(self):
         logger.debug(f"[invite] 配置已注入: {dict(self.config or {})}")
-        logger.info(f"[invite] 数据文件: {self.data_file}，当前记录数: {len(self.invite_data)}")
+        await self.store.start()
+        await self.writer.start()
+        # 卡片模板只在这里编译一次
+        self.card_templates.load()
+        interval = self.config.get("metrics_export_interval", 0) or 0
+        if self.metrics.enabled and interval > 0:
+            self._metrics_task = asyncio.create_task(self._export_metrics_loop(interval))
+        if self.epochs.to_archive(self._keep_epochs()):
+            self._schedule_epoch_gc()
+        if self._cold_after_days() > 0 or self.cold.ctx_ids() or self.cold.rejoined:
+            self.cold.wakeup = asyncio.Event()
+            self._cold_task = asyncio.create_task(self._cold_tier_loop())
+        logger.info(
+            f"[invite] 存储后端: {self.store.backend}，数据文件: {self.store.path}，"
+            f"当前记录数: {self.store.count_records()}，冷启动加载耗时: {self.load_ms:.1f} ms"
+        )
 
     def load_data(self):
-        # 数据文件加载
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"加载邀请数据失败：{e}")
-        return {}
+        # 数据文件加载（记录冷启动耗时，initialize 时输出）
+        started = time.perf_counter()
+        data = self.store.load()
+        self.load_ms = (time.perf_counter() - started) * 1000
+        return data
+
+    def mark_dirty(self, count: int = 1):
+        """登记数据变更，由后台任务按间隔/阈值合并写盘"""
+        self.store.mark_dirty(count)
 
     def save(self):
-        try:
-            with open(self.data_file, "w", encoding="utf-8") as f:
-                json.dump(self.invite_data, f, ensure_ascii=False, indent=2, default=str)
-        except Exception as e:
-            logger.error(f"保存邀请数据失败：{e}")
+        """立即落盘（原子写），平时请用 mark_dirty"""
+        self.store.flush()
 
-    def get_random_bgimg_path(self):
-        """自动查找 plugin-data/invitecount_images/ 下背景，返回一个本地文件或None"""
-        folder = os.path.join(os.path.dirname(self.data_file), 'invitecount_images')
-        if not os.path.exists(folder):
-            try:
-                os.makedirs(folder, exist_ok=True)
-            except Exception:
-                return None
-        imgs = [f for f in os.listdir(folder) if f.lower().endswith(('.png','.jpg','.jpeg','.webp'))]
-        if not imgs:
-            return None
-        return os.path.join(folder, random.choice(imgs))
+    def get_random_bgimg_path(self, key=None):
+        """从 plugin-data/invitecount_images/ 取一张背景（优先返回预处理后的小图），没有则返回None"""
+        return self.background_catalog.pick(key)
 
     async def try_get_nickname(self, group_id, user_id):
         """优先查昵称，有接口用接口，无则直接ID"""
         try:
             if hasattr(self.context, "get_group_member_info"):
-                member = await self.context.get_group_member_info(group_id, user_id)
+                with self.metrics.timer("api", "get_group_member_info"):
+                    member = await self.context.get_group_member_info(group_id, user_id)
                 name = member.get("nickname") or member.get("card") or str(user_id)
                 return name
         except Exception as e:
             logger.debug(f"无法获取昵称: {e}")
         return str(user_id)
 
-    async def sync_all_group_members(self, group_id):
+    def _member_list_fetcher(self, event, group_id):
+        """返回拉取群成员列表的无参协程函数；优先用 event.bot.api，其次 context 接口"""
+        if event is not None and hasattr(event, "bot") and hasattr(event.bot, "api"):
+            fetch = lambda: event.bot.api.call_action('get_group_member_list', group_id=group_id)
+        elif hasattr(self.context, 'get_group_member_list'):
+            fetch = lambda: self.context.get_group_member_list(group_id)
+        else:
+            return None
+
+        async def timed_fetch():
+            with self.metrics.timer("api", "get_group_member_list"):
+                return await fetch()
+        return timed_fetch
+
+    async def get_group_members(self, event, group_id) -> dict | None:
+        """经成员目录缓存获取 {user_id: member}，TTL 内及并发请求共享同一次拉取"""
+        if not group_id:
+            return None
+        fetch = self._member_list_fetcher(event, group_id)
+        if fetch is None:
+            return None
+        return await self.member_directory.get_members(group_id, fetch)
+
+    async def sync_all_group_members(self, group_id, ctx_id=LEGACY_CTX, event=None):
         """同步并更新当前群所有入库QQ的nickname为最新群名片/昵称"""
-        if not (group_id and hasattr(self.context, 'get_group_member_list')):
-            return
         try:
-            result = await self.context.get_group_member_list(group_id)
-            updated = 0
-            for member in result:
-                user_id = str(member.get('user_id'))
-                name = member.get('card') or member.get('nickname') or member.get('remark') or user_id
-                if user_id in self.invite_data:
-                    self.invite_data[user_id]['nickname'] = name
-                    updated += 1
-            if updated:
-                self.save()
+            members = await self.get_group_members(event, group_id)
+            if not members:
+                return
+            # 成员列表未重新拉取过则昵称不会有变化，跳过整表比对
+            version = self.member_directory.version(group_id)
+            if self._nickname_synced.get((ctx_id, str(group_id))) == version:
+                return
+            names = {}
+            for user_id, member in members.items():
+                names[user_id] = member.get('card') or member.get('nickname') or member.get('remark') or user_id
+            await self.writer.call(self.store.set_nicknames, ctx_id, names)
+            self._nickname_synced[(ctx_id, str(group_id))] = version
         except Exception as e:
             logger.debug(f'[invite-debug] 同步群名片异常: {e}')
 
     async def safe_get_member_name_by_list(self, event, group_id, user_id):
         name = user_id
-        try:
-            # 只要 event 有 bot 和 api，就直接用
-            if hasattr(event, "bot") and hasattr(event.bot, "api"):
-                members = await event.bot.api.call_action('get_group_member_list', group_id=group_id)
-                for member in members:
-                    if str(member.get("user_id")) == str(user_id):
-                        card = member.get("card", "").strip()
-                        nickname = member.get("nickname", "").strip()
-                        if card:
-                            name = card
-                        elif nickname:
-                            name = nickname
-                        break
-        except Exception as e:
-            logger.debug(f'[invite debug] get_group_member_list失败: {e}')
+        # 只要 event 有 bot 和 api，就直接用
+        if not (hasattr(event, "bot") and hasattr(event.bot, "api")):
+            return name
+        members = await self.get_group_members(event, group_id)
+        member = members.get(str(user_id)) if members else None
+        if member:
+            card = (member.get("card") or "").strip()
+            nickname = (member.get("nickname") or "").strip()
+            if card:
+                name = card
+            elif nickname:
+                name = nickname
         return name
 
     def _ctx_id_for(self, event: AstrMessageEvent, group_id: str | None, user_id: str | None) -> str:
+        """_logical_ctx_id 对应数据桶当前轮次的存储 ID（未重置过的数据桶即为其本身）"""
+        return self.epochs.current(self._logical_ctx_id(event, group_id, user_id))
+
+    def _logical_ctx_id(self, event: AstrMessageEvent, group_id: str | None, user_id: str | None) -> str:
         """根据 storage_scope 生成上下文 ID。
         - global:  platform:GLOBAL
         - group:   platform:G:<group_id>
@@ -160,8 +275,36 @@ class InviteQueryPlugin(Star):
             return f"{platform}:U:{key}"
         return f"{platform}:GLOBAL"
 
-    def _get_bucket_by_ctx(self, ctx_id: str) -> dict:
-        return self.invite_data.setdefault(ctx_id, {}) if isinstance(self.invite_data, dict) else {}
+    def _inviter_index_for(self, ctx_id: str, cross: bool = False):
+        """按邀请人统计时使用的索引。
+        user 作用域下每个成员单独一个数据桶，邀请人的下线分散在各自的桶里，需读跨桶汇总索引；
+        cross=True（/邀请排行 全服）时群作用域也汇总同平台所有群。全局桶本身即为汇总。
+        """
+        scope = str(self.config.get("storage_scope", "global")).lower()
+        if cross or scope == "user":
+            index = self.store.platform_index(ctx_id)
+            if index is not None:
+                return index
+        return self.store.inviter_index(ctx_id)
+
+    @staticmethod
+    def _invitee_key(ctx_id: str, key):
+        """索引中的被邀请人键：单桶索引为 user_id，汇总索引为 (ctx_id, user_id)"""
+        return key if isinstance(key, tuple) else (ctx_id, key)
+
+    def _inviter_name(self, index, ctx_id: str, inviter: str) -> str:
+        """邀请人昵称：先查当前数据桶；汇总索引下 user 作用域查邀请人自己的桶，
+        群作用域查其第一个下线所在的群（通常与邀请人同群）"""
+        rec = self.store.get_record(ctx_id, inviter)
+        key = aggregate_key(ctx_id)
+        if rec is None and key and key.endswith(":U:"):
+            rec = self.store.get_record(self.epochs.current(f"{key}{inviter}"), inviter)
+        if rec is None:
+            stats = index.get(inviter)
+            first = next(iter(stats.invitees), None) if stats else None
+            if isinstance(first, tuple):
+                rec = self.store.get_record(first[0], inviter)
+        return (rec and rec.nickname) or inviter
 
     def _is_group_admin(self, event: AstrMessageEvent) -> bool:
         """检查是否为群管理员"""
@@ -189,36 +332,45 @@ class InviteQueryPlugin(Star):
             scope = (self.config.get("storage_scope") or "global").lower()
             platform = event.get_platform_name() if hasattr(event, "get_platform_name") else "default"
             if scope == "global":
-                return f"{platform}:GLOBAL"
+                return self.epochs.current(f"{platform}:GLOBAL")
             if scope == "user":
                 key = event.get_sender_id()
-                return f"{platform}:U:{key}"
+                return self.epochs.current(f"{platform}:U:{key}")
             # default group
             key = event.get_group_id() or event.get_session_id() or "default"
-            return f"{platform}:G:{key}"
+            return self.epochs.current(f"{platform}:G:{key}")
         except Exception:
             return "default"
 
-    def _get_group_ctx_bucket(self, event: AstrMessageEvent) -> dict:
-        """获取当前群维度的数据桶（用于管理员重置），不受 storage_scope 影响"""
+    def _get_group_ctx_id(self, event: AstrMessageEvent) -> str:
+        """获取当前群维度的数据桶ID（用于管理员重置），不受 storage_scope 影响"""
         try:
             platform = event.get_platform_name() if hasattr(event, "get_platform_name") else "default"
             gid = event.get_group_id() or event.get_session_id() or "default"
-            ctx_id = f"{platform}:G:{gid}"
-            # 如果数据结构是嵌套的，返回对应bucket；否则返回整个invite_data
-            if isinstance(self.invite_data.get(ctx_id), dict):
-                return self.invite_data[ctx_id]
+            ctx_id = self.epochs.current(f"{platform}:G:{gid}")
+            # 如果数据结构是嵌套的，返回对应bucket；否则返回旧版扁平数据
+            if self.store.has_ctx(ctx_id):
+                return ctx_id
             # 兼容旧数据结构（扁平）
-            return self.invite_data
+            return LEGACY_CTX
         except Exception:
-            return self.invite_data
+            return LEGACY_CTX
 
-    async def try_render_html(self, event, html_body, data, fallback_text):
-        """尝试用 AstrBot 图片渲染接口(html_render)输出，支持随机本地背景且卡片全填充，失败则返回文本。"""
+    async def try_render_html(self, event, template, data, fallback_text, versioned=True, card=None):
+        """用卡片模板 template 与数据 data 生成 HTML，经 AstrBot 图片渲染接口(html_render)输出，
+        支持随机本地背景且卡片全填充，失败则返回文本。
+
+        渲染结果按 (HTML, 背景) 哈希缓存；versioned=False 表示卡片不依赖邀请数据，数据变更时不失效。
+        传入 card 时，render_engine=pillow 直接本地绘制，html_render 失败时也回退到本地绘制。
+        """
         if not self.config.get("enable_image_render", False):
             yield event.plain_result(fallback_text)
             return
-        bgimg_path = self.get_random_bgimg_path()
+        try:
+            bg_key = event.get_group_id() or event.get_sender_id()
+        except Exception:
+            bg_key = None
+        bgimg_path = self.get_random_bgimg_path(bg_key)
         if bgimg_path:
             safe_img_path = bgimg_path.replace(os.sep, '/')
             # 保证兼容 windows 路径+file://协议
@@ -245,153 +397,173 @@ class InviteQueryPlugin(Star):
                 "box-shadow:0 4px 32px #42545c44;"
                 "overflow:hidden;padding:0;"
             )
-        html_body = html_body.replace("background:__BG__;", bgimg_css)
         try:
-            url = await self.html_render(html_body, data, return_url=True)
-            yield event.image_result(url)
+            html_body = self.card_templates.render(template, {**data, "bg_style": bgimg_css})
         except Exception as e:
-            logger.debug(f'[invite debug] 图片渲染失败: {e}')
+            logger.error(f"[invite] 渲染卡片模板 {template} 失败：{e}")
+            yield event.plain_result(fallback_text)
+            return
+        version = self.store.version if versioned else None
+        cache_key = self.render_cache.make_key(html_body, bgimg_path, versioned)
+        url = self.render_cache.get(cache_key, version)
+        if url is not None:
+            yield event.image_result(url)
+            return
+        use_pillow = card is not None and self.card_renderer.available
+        url = None
+        if not (use_pillow and self.config.get("render_engine", "html") == "pillow"):
+            try:
+                with self.metrics.timer("render", "html_render"):
+                    url = await self.html_render(PASSTHROUGH_TEMPLATE, {"body": html_body}, return_url=True)
+            except Exception as e:
+                logger.debug(f'[invite debug] 图片渲染失败: {e}')
+        if url is None and use_pillow:
+            try:
+                with self.metrics.timer("render", "pillow"):
+                    url = await asyncio.to_thread(self.card_renderer.render, card, bgimg_path)
+            except Exception as e:
+                logger.debug(f'[invite debug] 本地渲染失败: {e}')
+        if url is None:
             yield event.plain_result(fallback_text)
+            return
+        # 渲染期间数据又变了则不缓存，避免旧卡片挂在新版本下
+        if not versioned or self.store.version == version:
+            self.render_cache.put(cache_key, url, version)
+        yield event.image_result(url)
 
     @filter.event_message_type(filter.EventMessageType.GROUP_MESSAGE)
     async def handle_group_event(self, event: AstrMessageEvent):
-        data = getattr(event.message_obj, 'raw_message', {})
-        logger.debug(f"[invite debug] 收到群事件: {data}")
+        data = getattr(event.message_obj, 'raw_message', None)
+        # 快速预筛：普通聊天消息在任何格式化/归一化之前直接返回
         if not isinstance(data, dict):
-            logger.debug("[invite debug] 原始事件不是 dict，跳过")
             return
+        post_type = notice_post_type(data)
+        if post_type is None:
+            return
+        with self.metrics.timer("event", post_type):
+            await self._handle_notice(event, data, post_type)
 
-        # 兼容多协议字段名（OneBot v11/v12、Napcat、Lagrange等）
-        post_type = data.get('post_type') or data.get('type') or data.get('notice_type')
-        raw_notice = data.get('notice_type') or data.get('event') or data.get('detail_type')
-        sub_type = data.get('sub_type') or data.get('subEvent') or data.get('extra_type')
-
-        # ID 归一化
-        group_id = (
-            data.get('group_id')
-            or data.get('chat_id')
-            or data.get('group')
-            or data.get('groupId')
-            or ''
-        )
-        user_id = (
-            data.get('user_id')
-            or data.get('target_id')
-            or data.get('member_id')
-            or data.get('userId')
-            or data.get('member')
-            or ''
-        )
-        operator_id = (
-            data.get('operator_id')
-            or data.get('inviter_id')
-            or data.get('operator_user_id')
-            or data.get('operatorUid')
-            or data.get('inviter')
-            or ''
-        )
+    async def _handle_notice(self, event, data: dict, post_type: str):
+        logger.debug("[invite debug] 收到群事件: %s", data)
 
-        group_id = str(group_id) if group_id is not None else ''
-        user_id = str(user_id) if user_id is not None else ''
-        operator_id = str(operator_id) if operator_id is not None else ''
-
-        # 统一 notice_type 语义
-        notice_type = raw_notice
-        # 常见别名归一化
-        alias_increase = {"group_increase", "member_increase", "group_member_increase", "group_member_increase_event"}
-        alias_decrease = {"group_decrease", "member_decrease", "group_member_decrease", "group_member_decrease_event"}
-        if notice_type in alias_increase:
-            notice_type = "group_increase"
-        elif notice_type in alias_decrease:
-            notice_type = "group_decrease"
-
-        # 子类型归一化
-        if sub_type in {"join", "approve", "increase", "pass"}:
-            sub_type = "approve"  # 主动加群/管理员同意
-        elif sub_type in {"invite", "invited"}:
-            sub_type = "invite"
-        elif sub_type in {"leave", "quit", "exit"}:
-            sub_type = "leave"
-        elif sub_type in {"kick", "kick_me", "ban"}:
-            sub_type = "kick"
+        # 兼容多协议字段名（OneBot v11/v12、Napcat、Lagrange等），按平台缓存字段映射
+        get_platform = getattr(event, 'get_platform_name', None)
+        platform = get_platform() if callable(get_platform) else ''
+        notice = self.normalizer.normalize(data, post_type, platform or '')
+        notice_type, sub_type = notice.notice_type, notice.sub_type
+        group_id, user_id, operator_id = notice.group_id, notice.user_id, notice.operator_id
+        self.metrics.inc("notices", f"{notice_type}.{sub_type}")
 
         logger.debug(
-            f"[invite debug] 归一化: post_type={post_type}, notice_type={notice_type}, sub_type={sub_type}, "
-            f"group_id={group_id}, user_id={user_id}, operator_id={operator_id}"
+            "[invite debug] 归一化(%s): post_type=%s, notice_type=%s, sub_type=%s, group_id=%s, user_id=%s, operator_id=%s",
+            notice.adapter, post_type, notice_type, sub_type, group_id, user_id, operator_id,
         )
 
-        time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        now_ts = int(datetime.now().timestamp())
 
-        if (post_type == "notice" or post_type == "group_notice") and group_id:
+        if group_id:
+            if notice_type in ("group_increase", "group_decrease"):
+                # 重连后重发的同一通知：在查昵称、写记录之前丢弃
+                if self.dedup.is_duplicate(notice):
+                    self.metrics.inc("duplicates", notice_type)
+                    logger.debug(f"[invite debug] 忽略重复通知: {notice_type}/{sub_type} user_id={user_id}")
+                    return
+                # 成员变动后群成员列表缓存失效
+                self.member_directory.invalidate(group_id)
             if notice_type == "group_increase":
-                # 新成员进群
+                # 新成员进群：先在写队列占位，查昵称期间到达的退群等事件排在本次写入之后
+                slot = self.writer.reserve()
                 try:
-                    member_name = await self.try_get_nickname(group_id, user_id)
-                except Exception as e:
-                    logger.debug(f"[invite debug] 获取成员名异常: {e}")
-                    member_name = user_id
-                # 依据作用域选择数据桶
-                ctx_id = self._ctx_id_for(event, group_id, user_id)
-                bucket = self._get_bucket_by_ctx(ctx_id)
-                if sub_type == "invite" and operator_id:
-                    try:
-                        operator_name = await self.try_get_nickname(group_id, operator_id)
-                    except Exception as e:
-                        logger.debug(f"[invite debug] 获取邀请人名异常: {e}")
-                        operator_name = operator_id
-                    bucket[str(user_id)] = {
-                        "nickname": member_name,
-                        "inviter": str(operator_id),
-                        "inviter_name": operator_name,
-                        "join_type": "邀请",
-                        "join_time": time,
-                        "leave_type": None,
-                        "leave_time": None
-                    }
-                    logger.info(f"[invite debug] 邀请入群已记: user_id={user_id}, inviter={operator_id}")
-                    self.save()
-                else:
-                    # 无 operator 视为主动或未识别，记为主动
-                    bucket[str(user_id)] = {
-                        "nickname": member_name,
-                        "inviter": None,
-                        "inviter_name": None,
-                        "join_type": "主动",
-                        "join_time": time,
-                        "leave_type": None,
-                        "leave_time": None
-                    }
-                    logger.info(f"[invite debug] 主动/未知方式入群已记: user_id={user_id}, sub_type={sub_type}")
-                    self.save()
+                    await self._record_join(event, slot, group_id, user_id, operator_id, sub_type, now_ts)
+                finally:
+                    slot.cancel()
             elif notice_type == "group_decrease":
                 # 成员退群/被踢
                 ctx_id = self._ctx_id_for(event, group_id, user_id)
-                bucket = self._get_bucket_by_ctx(ctx_id)
                 if sub_type == "leave":
-                    if str(user_id) in bucket:
-                        bucket[str(user_id)]["leave_type"] = "自己退群"
-                        bucket[str(user_id)]["leave_time"] = time
+                    if await self.writer.call(
+                        self._record_leave, ctx_id, user_id, "leave", leave_type=LEAVE_SELF, leave_ts=now_ts
+                    ):
                         logger.info(f"[invite debug] 成员退群: user_id={user_id}")
                     else:
                         logger.debug(f"[invite debug] 退群用户未在记录中: user_id={user_id}")
-                    self.save()
                 elif sub_type == "kick":
-                    if str(user_id) in bucket:
-                        bucket[str(user_id)]["leave_type"] = f"被踢({operator_id})"
-                        bucket[str(user_id)]["leave_time"] = time
+                    if await self.writer.call(
+                        self._record_leave,
+                        ctx_id, user_id, "kick", leave_type=LEAVE_KICK, leave_ts=now_ts, kicker=intern_id(operator_id),
+                    ):
                         logger.info(f"[invite debug] 成员被踢: user_id={user_id}, by {operator_id}")
                     else:
                         logger.debug(f"[invite debug] 被踢用户未在记录中: user_id={user_id}")
-                    self.save()
                 else:
                     logger.debug(f"[invite debug] 未识别的减少子类型: sub_type={sub_type}")
         else:
-            logger.debug(
-                f"[invite debug] 非 notice 或缺少 group_id，post_type={post_type}, group_id={group_id}"
-            )
+            logger.debug("[invite debug] notice 缺少 group_id，post_type=%s", post_type)
+
+    def _record_leave(self, ctx_id, user_id, reason, **fields) -> bool:
+        """在写队列里记录退群/被踢；当前轮次没有该成员（重置前入群）时记到仍在存储中的最近一个旧轮次，
+        恢复该轮次时离群状态随之带回。返回是否找到记录"""
+        if self.store.update_record(ctx_id, user_id, reason, **fields):
+            return True
+        logical = split_ctx(ctx_id)[0]
+        for info in reversed(self.epochs.retired(logical)):
+            if not info["archived"] and self.store.update_record(
+                physical_ctx(logical, info["epoch"]), user_id, reason, **fields
+            ):
+                return True
+        return False
+
+    def _ensure_record(self, ctx_id, user_id, nickname, archived=None):
+        """没有记录则按昵称新建统计模板，否则刷新昵称（无变化不记脏）；返回 (记录, 是否新建)。
+        archived 为事先从冷数据层查到的归档记录"""
+        member = self.store.get_record(ctx_id, user_id)
+        if member is None:
+            if archived is not None:
+                # 已归档的成员只读展示；新建模板会写入热数据，其离群记录就不再计入邀请人
+                return archived, False
+            member = MemberRecord(nickname=nickname)
+            self.store.put_record(ctx_id, user_id, member, reason="query")
+            return member, True
+        if member.nickname != nickname:
+            self.store.update_record(ctx_id, user_id, "nickname", nickname=nickname)
+            member = self.store.get_record(ctx_id, user_id)
+        return member, False
+
+    async def _record_join(self, event, slot, group_id, user_id, operator_id, sub_type, now_ts):
+        """查询成员/邀请人昵称后，在 handle_group_event 预留的写队列位置写入入群记录"""
+        try:
+            member_name = await self.try_get_nickname(group_id, user_id)
+        except Exception as e:
+            logger.debug(f"[invite debug] 获取成员名异常: {e}")
+            member_name = user_id
+        # 依据作用域选择数据桶
+        ctx_id = self._ctx_id_for(event, group_id, user_id)
+        if sub_type == "invite" and operator_id:
+            try:
+                operator_name = await self.try_get_nickname(group_id, operator_id)
+            except Exception as e:
+                logger.debug(f"[invite debug] 获取邀请人名异常: {e}")
+                operator_name = operator_id
+            await slot.commit(self.store.put_record, ctx_id, user_id, MemberRecord(
+                nickname=member_name,
+                inviter=operator_id,
+                inviter_name=operator_name,
+                join_type=JOIN_INVITE,
+                join_ts=now_ts,
+            ), reason="invite")
+            logger.info(f"[invite debug] 邀请入群已记: user_id={user_id}, inviter={operator_id}")
+        else:
+            # 无 operator 视为主动或未识别，记为主动
+            await slot.commit(self.store.put_record, ctx_id, user_id, MemberRecord(
+                nickname=member_name,
+                join_type=JOIN_ACTIVE,
+                join_ts=now_ts,
+            ), reason="join")
+            logger.info(f"[invite debug] 主动/未知方式入群已记: user_id={user_id}, sub_type={sub_type}")
 
     # ==== 查询统计命令 ====
     @filter.command("邀请查询")
+    @metered("command", "邀请查询")
     async def cmd_invite_query(self, event: AstrMessageEvent, qq: str = ""):
         user_id = None
         group_id = None
@@ -400,7 +572,6 @@ class InviteQueryPlugin(Star):
         if not group_id:
             raw = getattr(event.message_obj, 'raw_message', {})
             group_id = str(raw.get('group_id', None)) if raw else None
-        await self.sync_all_group_members(group_id)
         from astrbot.api.message_components import At
         for seg in getattr(event.message_obj, "message", []):
             if isinstance(seg, At):
@@ -422,9 +593,7 @@ class InviteQueryPlugin(Star):
                 user_id = event.get_sender_id()
         # 依据作用域选择数据桶
         ctx_id = self._ctx_id_for(event, group_id, user_id)
-        bucket = self._get_bucket_by_ctx(ctx_id)
-        member = bucket.get(str(user_id))
-        created = False
+        await self.sync_all_group_members(group_id, ctx_id, event)
         name = await self.safe_get_member_name_by_list(event, group_id, user_id)
         # fallback如有必要
         if not name or name == user_id:
@@ -432,7 +601,8 @@ class InviteQueryPlugin(Star):
                 return v.strip() if isinstance(v,str) else v
             if group_id and hasattr(self.context, "get_group_member_info"):
                 try:
-                    result = await self.context.get_group_member_info(str(group_id), str(user_id))
+                    with self.metrics.timer("api", "get_group_member_info"):
+                        result = await self.context.get_group_member_info(str(group_id), str(user_id))
                     logger.debug(f'[invite debug] 单独接口查返回: {result}')
                     mi = result.get('data', result)
                     card = getf(mi.get('card', ''))
@@ -443,23 +613,15 @@ class InviteQueryPlugin(Star):
                     name = card or nickname or remark or displayname or username or user_id
                 except Exception as e:
                     logger.debug(f'[invite debug] get_group_member_info异常: {e}')
-        if not member:
-            member = {
-                "nickname": name if name else user_id,
-                "inviter": None,
-                "inviter_name": None,
-                "join_type": None,
-                "join_time": None,
-                "leave_type": None,
-                "leave_time": None
-            }
-            bucket[str(user_id)] = member
-            self.save()
-            created = True
-        # 始终刷新本地nickname缓存
-        bucket[str(user_id)]["nickname"] = name if name else user_id
-        self.save()
-        inviter = member.get("inviter")
+        # 热数据里没有的成员可能已归档：冷数据层只有汇总人数，明细在线程里从归档文件查
+        archived = None
+        if self.cold.has(ctx_id) and self.store.get_record(ctx_id, user_id) is None:
+            archived = await asyncio.to_thread(self.cold.find, ctx_id, user_id)
+        # 读取与写入在写队列里一次完成，期间不会被入群/退群事件插入
+        member, created = await self.writer.call(
+            self._ensure_record, ctx_id, user_id, name if name else user_id, archived
+        )
+        inviter = member.inviter
         inviter_name = None
         if self.config.get("show_inviter", True) and inviter:
             inviter_name = await self.safe_get_member_name_by_list(event, group_id, inviter)
@@ -468,34 +630,18 @@ class InviteQueryPlugin(Star):
             inviter_display = f"{inviter_name} ({inviter})"
         elif inviter:
             inviter_display = f"{inviter}"
-        join_type = member.get("join_type") or "-"
-        join_time = member.get("join_time") or "-"
-        leave_type = member.get("leave_type")
-        leave_time = member.get("leave_time")
+        join_type = member.join_type_text or "-"
         now = datetime.now()
         days_ago = "-"
-        if join_time:
-            try:
-                join_dt = datetime.strptime(join_time, '%Y-%m-%d %H:%M:%S')
-                days_ago = f"{(now - join_dt).days}天前({join_dt.strftime('%Y-%m-%d')})"
-            except Exception:
-                days_ago = join_time
-        all_invited = [(u, v) for u, v in bucket.items() if isinstance(v, dict) and v.get("inviter") == str(user_id)]
-        if self.config.get("only_stat_valid", False):
-            invited = [item for item in all_invited if not item[1].get("leave_type")]
-        else:
-            invited = all_invited
-        total_invite = len(all_invited)
-        # 修正被踢人数和自己退群人数统计
-        kicked = 0
-        leave = 0
-        for _, v in all_invited:
-            lt = v.get("leave_type") or ""
-            if lt.startswith("被踢"):
-                kicked += 1
-            elif lt == "自己退群":
-                leave += 1
-        valid_invite = len([item for item in all_invited if not item[1].get("leave_type")])
+        if member.join_ts:
+            join_dt = datetime.fromtimestamp(member.join_ts)
+            days_ago = f"{(now - join_dt).days}天前({join_dt.strftime('%Y-%m-%d')})"
+        # 计数直接取自邀请人索引（随写入增量维护），无需扫描整个数据桶
+        stats = self._inviter_index_for(ctx_id).get(user_id)
+        total_invite = stats.total if stats else 0
+        kicked = stats.kicked if stats else 0
+        leave = stats.left if stats else 0
+        valid_invite = stats.valid if stats else 0
         logger.debug(
             f"[invite debug] 统计: user_id={user_id}, total={total_invite}, valid={valid_invite}, "
             f"kicked={kicked}, leave={leave}, only_stat_valid={self.config.get('only_stat_valid', False)}"
@@ -510,44 +656,302 @@ class InviteQueryPlugin(Star):
         msg += f"●被踢人数：{kicked} 人\n"
         msg += f"●自己退群：{leave} 人\n"
         msg += f"●有效邀请：{valid_invite} 人\n"
+        if stats and stats.archived:
+            msg += f"●其中已归档：{stats.archived} 人（/邀请名单 {user_id} 归档）\n"
         msg += f"=================\n\n"
         msg += datetime.now().strftime('%Y/%m/%d %H:%M:%S')
         if created:
             msg = "【提示】该用户暂无数据，已帮你新建统计模板！\n" + msg
-        # 新美观卡片布局
-        html_body = f"""
-<div style='background:__BG__;'>
-  <div style='background:rgba(255,255,255,0.82);backdrop-filter: blur(7.2px);margin:18px 18px 14px 18px;padding:22px 22px 10px 20px;border-radius:15px;box-shadow:0 1.5px 8.5px #58ace266;'>
-    <div style='display:flex;align-items:flex-end;justify-content:space-between;'>
-      <div style='font-weight:800;font-size:1.47rem;color:#395db6;text-shadow:0 2px 10px #f4f8ff;margin-bottom:2px;letter-spacing:2px'>邀请统计</div>
-      <div style='font-size:0.97rem;color:#888'>{datetime.now().strftime('%Y/%m/%d %H:%M:%S')}</div>
-    </div>
-    <hr style='border:none;border-top:1.3px solid #dbe7fe;margin:7.5px 0 13px 0'>
-    <table style='width:100%;font-size:1.01rem;line-height:2.18em;color:#333;'>
-        <tr><td style='color:#888;width:75px'>被查用户</td><td style='font-weight:bold'>{name}</td></tr>
-        <tr><td style='color:#888;'>用户QQ</td><td>{user_id}</td></tr>
-        <tr><td style='color:#888;'>邀请人</td><td>{inviter_display}</td></tr>
-        <tr><td style='color:#888;'>进群方式</td><td>{join_type}</td></tr>
-        <tr><td style='color:#888;'>进群时间</td><td>{days_ago}</td></tr>
-        <tr><td style='color:#888;'>累计邀请</td><td>{total_invite} 人</td></tr>
-        <tr><td style='color:#888;'>被踢人数</td><td>{kicked} 人</td></tr>
-        <tr><td style='color:#888;'>自己退群</td><td>{leave} 人</td></tr>
-        <tr><td style='color:#de5d62;'>有效邀请</td><td><b>{valid_invite} 人</b></td></tr>
-    </table>
-  </div>
-</div>
-"""
-        async for result in self.try_render_html(event, html_body, {}, msg):
+        # 卡片数据（模板见 templates/invite_query.html）
+        now_text = datetime.now().strftime('%Y/%m/%d %H:%M')
+        card_data = {
+            "now": now_text,
+            "name": name,
+            "user_id": user_id,
+            "inviter": inviter_display,
+            "join_type": join_type,
+            "join_time": days_ago,
+            "stats": {"total": total_invite, "kicked": kicked, "left": leave, "valid": valid_invite},
+        }
+        card = Card(
+            title="邀请统计",
+            accent="#395db6",
+            subtitle=now_text,
+            rows=tuple(
+                (Cell(label, "#de5d62" if label == "有效邀请" else "#888888"),
+                 Cell(str(value), "#333333", bold=label in ("被查用户", "有效邀请")))
+                for label, value in (
+                    ("被查用户", name), ("用户QQ", user_id), ("邀请人", inviter_display),
+                    ("进群方式", join_type), ("进群时间", days_ago), ("累计邀请", f"{total_invite} 人"),
+                    ("被踢人数", f"{kicked} 人"), ("自己退群", f"{leave} 人"), ("有效邀请", f"{valid_invite} 人"),
+                )
+            ),
+        )
+        async for result in self.try_render_html(event, "invite_query.html", card_data, msg, card=card):
             yield result
 
+    @filter.command("邀请名单")
+    @metered("command", "邀请名单")
+    async def cmd_invite_list(self, event: AstrMessageEvent, 参数: str = ""):
+        """分页列出某成员邀请的人：/邀请名单 [@成员|QQ] [页码] [归档]（归档：列出已移入冷数据层的下线）"""
+        page_size = 20
+        target_uid = None
+        try:
+            for comp in event.get_messages():
+                if isinstance(comp, Comp.At) and comp.qq:
+                    target_uid = str(comp.qq)
+                    break
+        except Exception:
+            pass
+        args = (event.message_str or '').strip().split()[1:]
+        archived_view = "归档" in args
+        numbers = [a for a in args if a.isdigit()]
+        page = 1
+        if target_uid:
+            if numbers:
+                page = int(numbers[0])
+        elif len(numbers) >= 2:
+            target_uid, page = numbers[0], int(numbers[1])
+        elif numbers:
+            # 单个数字：短的视为页码，长的视为 QQ
+            if len(numbers[0]) >= 5:
+                target_uid = numbers[0]
+            else:
+                page = int(numbers[0])
+        if not target_uid:
+            target_uid = event.get_sender_id()
+        page = max(1, page)
+
+        group_id = None
+        if hasattr(event, 'get_group_id'):
+            group_id = getattr(event, 'get_group_id', lambda: None)() or None
+        if not group_id:
+            raw = getattr(event.message_obj, 'raw_message', {})
+            group_id = str(raw.get('group_id', None)) if raw else None
+        ctx_id = self._ctx_id_for(event, group_id, target_uid)
+        stats = self._inviter_index_for(ctx_id).get(target_uid)
+        if not stats or not stats.total:
+            yield event.plain_result(f"{target_uid} 暂无邀请记录")
+            return
+        if archived_view:
+            if not stats.archived:
+                yield event.plain_result(f"{target_uid} 没有已归档的下线")
+                return
+            pages = (stats.archived + page_size - 1) // page_size
+            page = min(page, pages)
+            start = (page - 1) * page_size
+            # 冷数据不常驻内存，按需从归档文件流式解压，只取本页；已重新入群、待核对的成员不列出
+            skip = frozenset(self.cold.rejoined)
+            rows = await asyncio.to_thread(
+                lambda: list(islice(self.cold.scan(self._cold_filter(ctx_id), target_uid, skip), start, start + page_size))
+            )
+            text = f"====已归档下线 {target_uid}====\n(共 {stats.archived} 人，第 {page}/{pages} 页)\n"
+            for idx, (_, uid, raw) in enumerate(rows, start + 1):
+                rec = MemberRecord.from_dict(raw)
+                text += (
+                    f"{idx}. {rec.nickname or uid}({uid}) | {rec.leave_type_text} | "
+                    f"{rec.join_time or '-'} | 离群 {rec.leave_time}\n"
+                )
+            if page < pages:
+                text += f"发送 /邀请名单 {target_uid} {page + 1} 归档 查看下一页"
+            yield event.plain_result(text.rstrip())
+            return
+        # 已归档的下线只计入人数，名单分页只覆盖热数据
+        pages = max(1, (len(stats.invitees) + page_size - 1) // page_size)
+        page = min(page, pages)
+        start = (page - 1) * page_size
+        text = f"====邀请名单 {target_uid}====\n(共 {stats.total} 人，有效 {stats.valid} 人，第 {page}/{pages} 页)\n"
+        if stats.archived:
+            text += f"其中 {stats.archived} 人离群较久已归档，发送 /邀请名单 {target_uid} 归档 查看\n"
+        for idx, key in enumerate(islice(stats.invitees, start, start + page_size), start + 1):
+            rec_ctx, uid = self._invitee_key(ctx_id, key)
+            rec = self.store.get_record(rec_ctx, uid) or MemberRecord()
+            status = rec.leave_type_text or "在群"
+            join_time = rec.join_time or "-"
+            text += f"{idx}. {rec.nickname or uid}({uid}) | {status} | {join_time}\n"
+        if page < pages:
+            text += f"发送 /邀请名单 {target_uid} {page + 1} 查看下一页"
+        yield event.plain_result(text)
+
+    def _cold_filter(self, ctx_id: str):
+        """名单查看冷数据的范围：user 作用域为同平台各成员桶（当前轮次），其余作用域为当前数据桶"""
+        if str(self.config.get("storage_scope", "global")).lower() == "user":
+            key = aggregate_key(ctx_id)
+            return lambda c: c.startswith(key) and self.epochs.is_live(c)
+        return lambda c: c == ctx_id
+
+    @filter.command("邀请链")
+    @metered("command", "邀请链")
+    async def cmd_invite_chain(self, event: AstrMessageEvent, qq: str = ""):
+        """查看成员的多级邀请树：上级链、所在层级、下线人数与各层分布：/邀请链 [@成员|QQ]"""
+        target_uid = None
+        try:
+            for comp in event.get_messages():
+                if isinstance(comp, Comp.At) and comp.qq:
+                    target_uid = str(comp.qq)
+                    break
+        except Exception:
+            pass
+        if not target_uid:
+            digits = ''.join(ch for ch in str(qq) if ch.isdigit())
+            target_uid = digits or event.get_sender_id()
+
+        group_id = None
+        if hasattr(event, 'get_group_id'):
+            group_id = getattr(event, 'get_group_id', lambda: None)() or None
+        if not group_id:
+            raw = getattr(event.message_obj, 'raw_message', {})
+            group_id = str(raw.get('group_id', None)) if raw else None
+        ctx_id = self._ctx_id_for(event, group_id, target_uid)
+        tree = self.store.inviter_index(ctx_id).tree
+        node = tree.get(target_uid)
+        if node is None:
+            yield event.plain_result(f"{target_uid} 暂无邀请链记录")
+            return
+
+        def display(uid):
+            rec = self.store.get_record(ctx_id, uid)
+            return f"{rec.nickname or uid}({uid})" if rec else str(uid)
+
+        chain = tree.ancestors(str(target_uid))
+        text = f"====邀请链 {display(target_uid)}====\n"
+        if chain:
+            shown = [display(uid) for uid in reversed(chain[:5])]
+            if len(chain) > 5:
+                shown.insert(0, "…")
+            text += "上级链：" + " → ".join(shown + ["本人"]) + "\n"
+        text += f"所在层级：第 {len(chain) + 1} 层\n"
+        text += f"直接邀请：{len(tree.children.get(str(target_uid), ()))} 人\n"
+        text += f"下线总数：{node.total} 人（仍在群 {node.valid} 人）\n"
+        if node.levels:
+            text += f"下线层数：{node.height} 层\n"
+            text += "各层人数：" + " / ".join(
+                f"{level}层 {node.levels[level]}" for level in sorted(node.levels)[:10]
+            ) + "\n"
+        yield event.plain_result(text.rstrip())
+
     @filter.command("我的邀请")
+    @metered("command", "我的邀请")
     async def cmd_my_invite(self, event: AstrMessageEvent):
         user_id = event.get_sender_id()
         event.message_str = f"/邀请查询 @{user_id}"  # 伪造at查询自己
         async for r in self.cmd_invite_query(event):
             yield r
 
+    def _rank_options(self, args: list, mode: str = ""):
+        """解析排行参数：日期、“全服”、页码单独识别，其余第一个参数视为模式。
+        返回 (模式, 起始日, 结束日, 范围描述, 排序指标, 是否全服, 页码)，排序指标 0 有效 / 1 总 / 2 无效
+        """
+        days = []
+        modes = []
+        cross = False
+        page = 1
+        for arg in args:
+            day = parse_day(arg)
+            if day:
+                days.append(day)
+            elif arg.strip() in {"全服", "跨群"}:
+                cross = True
+            elif arg.isdigit():
+                page = max(1, int(arg))
+            else:
+                modes.append(arg.strip())
+        if args:
+            mode = modes[0] if modes else ""
+        # 统计范围选择（按入群日期的日汇总累加）
+        today = datetime.now().date()
+        start_day = end_day = None
+        period_display = "全量"
+        if days:
+            start_day = min(days[0], days[-1])
+            end_day = max(days[0], days[-1]) if len(days) >= 2 else today
+            period_display = f"{start_day}~{end_day}"
+        elif mode in {"周","week"}:
+            start_day, end_day = today - timedelta(days=6), today
+            period_display = "最近7天"
+        elif mode in {"月","month"}:
+            start_day, end_day = today - timedelta(days=29), today
+            period_display = "最近30天"
+        if mode in {"总", "全部", "all", "人数", "总人数"}:
+            sort_key = 1  # 总
+        elif mode in {"差", "失效", "无效", "无效人数"}:
+            sort_key = 2  # 无效
+        else:
+            sort_key = 0  # 有效
+        return mode, start_day, end_day, period_display, sort_key, cross, page
+
+    def _rank_index_for(self, event: AstrMessageEvent, cross: bool):
+        """依据作用域选择排行用的数据桶与索引（需要提供当前群ID，避免 group 模式落入 default 桶）"""
+        sender_uid = event.get_sender_id() if hasattr(event, 'get_sender_id') else None
+        curr_group_id = None
+        if hasattr(event, 'get_group_id'):
+            try:
+                curr_group_id = getattr(event, 'get_group_id', lambda: None)() or None
+            except Exception:
+                curr_group_id = None
+        if not curr_group_id:
+            raw = getattr(event.message_obj, 'raw_message', {})
+            curr_group_id = str(raw.get('group_id', None)) if raw else None
+        ctx_id_rank = self._ctx_id_for(event, group_id=curr_group_id, user_id=sender_uid)
+        # 全服或 user 作用域读跨桶汇总索引
+        return ctx_id_rank, self._inviter_index_for(ctx_id_rank, cross=cross)
+
+    @staticmethod
+    def _ranked(index, sort_key: int, start_day, end_day, start: int, stop: int):
+        """降序第 [start, stop) 位的 [(邀请人, [有效, 总, 无效], 名次)] 与参与排行的总人数；同分并列名次。
+        全量排行走名次索引（O(log M) 定位，无需排序），时间窗口排行累加日汇总后用堆取前 stop 名。
+        """
+        if start_day is None and end_day is None:
+            ranking = index.ranking(sort_key)
+            rows = []
+            for uid, _, rank in ranking.items(start, stop):
+                stats = index.get(uid)
+                rows.append((uid, [stats.valid, stats.total, stats.invalid], rank))
+            return rows, len(ranking)
+        count_map = index.counts(start_day, end_day)
+        top = heapq.nlargest(stop, count_map.items(), key=lambda x: x[1][sort_key])
+        rows = []
+        rank, prev = 0, None
+        for pos, (uid, tpl) in enumerate(top):
+            if tpl[sort_key] != prev:
+                rank, prev = pos + 1, tpl[sort_key]
+            if pos >= start:
+                rows.append((uid, tpl, rank))
+        return rows, len(count_map)
+
+    @staticmethod
+    def _window_neighbours(count_map: dict, sort_key: int, target_uid: str, span: int = 2) -> list:
+        """时间窗口排行中目标及其前后各 span 名的 [(邀请人, [有效, 总, 无效], 名次)]，次序与 _ranked 相同
+        （窗口计数降序，同分保持原顺序）。时间窗口没有常驻名次索引，只线性扫描窗口计数，不整体排序"""
+        mine = count_map[target_uid][sort_key]
+        before, after = [], []
+        seen = False
+        for pos, (uid, tpl) in enumerate(count_map.items()):
+            if uid == target_uid:
+                seen = True
+                continue
+            # (-计数, 原顺序) 越小越靠前
+            entry = (-tpl[sort_key], pos, uid, tpl)
+            if tpl[sort_key] > mine or (tpl[sort_key] == mine and not seen):
+                before.append(entry)
+            else:
+                after.append(entry)
+        window = (
+            sorted(heapq.nlargest(span, before))
+            + [(-mine, -1, target_uid, count_map[target_uid])]
+            + heapq.nsmallest(span, after)
+        )
+        # 名次 = 计数严格更高的人数 + 1（同分并列）
+        values = {-key for key, _, _, _ in window}
+        greater = dict.fromkeys(values, 0)
+        for tpl in count_map.values():
+            for value in values:
+                if tpl[sort_key] > value:
+                    greater[value] += 1
+        return [(uid, tpl, greater[-key] + 1) for key, _, uid, tpl in window]
+
     @filter.command("邀请排行")
+    @metered("command", "邀请排行")
     async def cmd_invite_rank(self, event: AstrMessageEvent, mode: str = ""):
         """排行模式说明:
         /邀请排行         # 有效邀请排行（全量）
@@ -555,12 +959,15 @@ class InviteQueryPlugin(Star):
         /邀请排行 差      # 无效邀请排行
         /邀请排行 周      # 最近7天新邀请有效人数排行
         /邀请排行 月      # 最近30天新邀请有效人数排行
+        /邀请排行 2026-09-01 2026-09-30   # 自定义日期区间（可与 总/差 组合）
+        /邀请排行 全服    # 汇总同平台所有群（可与以上模式组合）
+        /邀请排行 总 3    # 末尾数字为页码，每页10名
         /邀请排行 帮助    # 帮助
         """
+        page_size = 10
         text = "====邀请排行====\n"
         args = (event.message_str or '').strip().split()
-        if len(args) >= 2:
-            mode = args[1].strip()
+        mode, start_day, end_day, period_display, sort_key, cross, page = self._rank_options(args[1:], mode)
         if mode in {"help", "帮助", "h", "?"}:
             text += (
                 "/邀请排行              —— 全量有效邀请排行\n"
@@ -568,127 +975,153 @@ class InviteQueryPlugin(Star):
                 "/邀请排行 差（或 无效人数）—— 无效邀请排行\n"
                 "/邀请排行 周            —— 最近7天邀请排行\n"
                 "/邀请排行 月            —— 最近30天邀请排行\n"
+                "/邀请排行 2026-09-01 2026-09-30 —— 指定日期区间（单个日期表示至今）\n"
+                "/邀请排行 全服         —— 汇总本平台所有群（可与 总/差/周/月/日期 组合）\n"
+                "/邀请排行 总 3         —— 末尾数字为页码，每页10名\n"
+                "/我的排名 [总|差|周|月] —— 查看自己的名次及前后几名\n"
                 "/邀请排行 帮助         —— 显示本帮助\n"
             )
             yield event.plain_result(text)
             return
-        # 统计范围选择
-        now = datetime.now()
-        cutoff = None
-        period_display = "全量"
-        if mode in {"周","week"}:
-            cutoff = now - timedelta(days=7)
-            period_display = "最近7天"
-        elif mode in {"月","month"}:
-            cutoff = now - timedelta(days=30)
-            period_display = "最近30天"
-        # 依据作用域选择数据桶（需要提供当前群ID，避免 group 模式落入 default 桶）
-        sender_uid = event.get_sender_id() if hasattr(event, 'get_sender_id') else None
-        curr_group_id = None
-        if hasattr(event, 'get_group_id'):
-            try:
-                curr_group_id = getattr(event, 'get_group_id', lambda: None)() or None
-            except Exception:
-                curr_group_id = None
-        if not curr_group_id:
-            raw = getattr(event.message_obj, 'raw_message', {})
-            curr_group_id = str(raw.get('group_id', None)) if raw else None
-        ctx_id_rank = self._ctx_id_for(event, group_id=curr_group_id, user_id=sender_uid)
-        bucket_rank = self._get_bucket_by_ctx(ctx_id_rank)
-
-        # 汇总数据生成（当前作用域桶）
-        count_map = {}  # inviter: [有效, 总, 无效]
-        inviter_name_map = {}
-        for v in bucket_rank.values():
-            inviter = v.get("inviter")
-            join_time_str = v.get("join_time")
-            # 判断是否在时间窗口内
-            in_time = True
-            if cutoff and join_time_str:
-                try:
-                    join_dt = datetime.strptime(join_time_str, '%Y-%m-%d %H:%M:%S')
-                    in_time = join_dt >= cutoff
-                except Exception:
-                    in_time = False
-            if not inviter or (cutoff and not in_time):
-                continue
-            is_invalid = (v.get("leave_type") is not None)
-            if inviter not in count_map:
-                count_map[inviter] = [0, 0, 0]  # 有效, 总, 无效
-            count_map[inviter][1] += 1  # 总
-            if not is_invalid:
-                count_map[inviter][0] += 1  # 有效
-            else:
-                count_map[inviter][2] += 1  # 无效
-            if inviter not in inviter_name_map or not inviter_name_map[inviter]:
-                inviter_name_map[inviter] = bucket_rank.get(inviter, {}).get("nickname", inviter)
-        # 排序模式
-        display_mode = "有效邀请"
-        if mode in {"总", "全部", "all", "人数", "总人数"}:
-            sort_key = 1  # 总
-            display_mode = "总邀请"
-        elif mode in {"差", "失效", "无效", "无效人数"}:
-            sort_key = 2  # 无效
-            display_mode = "无效邀请"
-        else:
-            sort_key = 0  # 有效
+        ctx_id_rank, rank_index = self._rank_index_for(event, cross)
+        display_mode = ("有效邀请", "总邀请", "无效邀请")[sort_key]
+        if start_day or sort_key == 0:
             display_mode = f"{period_display}{display_mode}"
-        sorted_list = sorted(count_map.items(), key=lambda x: -x[1][sort_key])
-        text += f"({display_mode}排行，前10)\n"
-        for idx, (uid, tpl) in enumerate(sorted_list[:10], 1):
+        if cross:
+            display_mode = f"全服{display_mode}"
+        start = (page - 1) * page_size
+        sorted_list, ranked_total = self._ranked(rank_index, sort_key, start_day, end_day, start, start + page_size)
+        pages = max(1, (ranked_total + page_size - 1) // page_size)
+        if page > pages:
+            # 页码超出时显示最后一页
+            page = pages
+            start = (page - 1) * page_size
+            sorted_list, _ = self._ranked(rank_index, sort_key, start_day, end_day, start, start + page_size)
+        inviter_name_map = {}
+        for uid, _, _ in sorted_list:
+            inviter_name_map[uid] = self._inviter_name(rank_index, ctx_id_rank, uid)
+        page_display = "前10" if page == 1 else f"第{page}/{pages}页"
+        text += f"({display_mode}排行，{page_display})\n"
+        for uid, tpl, idx in sorted_list:
             name = inviter_name_map.get(uid, uid)
             text += (
                 f"{idx}. {name}({uid}) | 有效:{tpl[0]} 总:{tpl[1]} 无效:{tpl[2]}\n"
             )
         if not sorted_list:
             text += "无邀请记录\n"
-        # HTML榜模板
-        rows_html = "".join(
-            f"<tr>"
-            f"<td style='font-weight:bold;font-size:1.08em;color:{'#f5ad2e' if idx==1 else ('#bebebe' if idx==2 else ('#e3925d' if idx==3 else '#30b88d'))};'>{idx}.</td>"
-            f"<td style='font-weight:bold;color:#204891'>{inviter_name_map.get(uid,uid)}</td>"
-            f"<td style='color:#988;font-size:0.92em'>({uid})</td>"
-            f"<td style='padding-left:10px;color:#319c5b'>有效:{tpl[0]}</td>"
-            f"<td style='color:#356bb6'>总:{tpl[1]}</td>"
-            f"<td style='color:#b85d36'>无效:{tpl[2]}</td>"
-            f"</tr>"
-            for idx, (uid, tpl) in enumerate(sorted_list[:10], 1)
+        elif page < pages:
+            next_args = [a for a in args[1:] if parse_day(a) or not a.isdigit()] + [str(page + 1)]
+            text += f"共 {pages} 页，发送 /邀请排行 {' '.join(next_args)} 查看下一页\n"
+        # 卡片数据（模板见 templates/invite_rank.html）
+        now_text = datetime.now().strftime('%Y/%m/%d %H:%M')
+        card_title = "邀请排行榜 TOP10" if page == 1 else f"邀请排行榜 第{page}/{pages}页"
+        card_data = {
+            "now": now_text,
+            "mode": display_mode,
+            "title": card_title,
+            "rows": [
+                {"rank": idx, "name": inviter_name_map.get(uid, uid), "uid": uid,
+                 "valid": tpl[0], "total": tpl[1], "invalid": tpl[2]}
+                for uid, tpl, idx in sorted_list
+            ],
+        }
+        rank_colors = {1: "#f5ad2e", 2: "#bebebe", 3: "#e3925d"}
+        card = Card(
+            title=card_title,
+            accent="#30b88d",
+            panel_alpha=0.80,
+            rows=tuple(
+                (Cell(f"{idx}.", rank_colors.get(idx, "#30b88d"), bold=True),
+                 Cell(str(inviter_name_map.get(uid, uid)), "#204891", bold=True),
+                 Cell(f"({uid})", "#998888"),
+                 Cell(f"有效:{tpl[0]}", "#319c5b"),
+                 Cell(f"总:{tpl[1]}", "#356bb6"),
+                 Cell(f"无效:{tpl[2]}", "#b85d36"))
+                for uid, tpl, idx in sorted_list
+            ),
+            empty="暂无邀请记录",
+            footer=now_text,
         )
-        html_body = f"""
-<div style='background:__BG__;'>
-  <div style='background:rgba(255,255,255,0.80);backdrop-filter: blur(6.6px);margin:14px 17px 17px 17px;padding:17px 18px 16px 17px;border-radius:15px;'>
-    <div style='font-weight:800;font-size:1.32rem;color:#30b88d;letter-spacing:1.5px;margin-bottom:2.7px;text-shadow:0 2px 12px #eaffeeab;'>🎉 邀请排行榜 TOP10</div>
-    <hr style='border:none;border-top:1.1px solid #c6efe2;margin:6.5px 0 12px 0'>
-    <table style='width:100%;font-size:1.05rem;line-height:1.9em;'>
-    {rows_html if rows_html else "<tr><td colspan='6' style='color:#bbb'>暂无邀请记录</td></tr>"}
-    </table>
-    <div style='color:#999;font-size:0.91rem;text-align:right;margin-top:7.5px;'>
-        {datetime.now().strftime('%Y/%m/%d %H:%M:%S')}</div>
-  </div>
-</div>
-"""
-        async for result in self.try_render_html(event, html_body, {}, text):
+        async for result in self.try_render_html(event, "invite_rank.html", card_data, text, card=card):
             yield result
 
+    @filter.command("我的排名")
+    @metered("command", "我的排名")
+    async def cmd_my_rank(self, event: AstrMessageEvent, mode: str = ""):
+        """查看自己（或 @成员/QQ）在邀请排行中的名次及前后各两名：/我的排名 [总|差|周|月|全服] [@成员|QQ]"""
+        target_uid = None
+        try:
+            for comp in event.get_messages():
+                if isinstance(comp, Comp.At) and comp.qq:
+                    target_uid = str(comp.qq)
+                    break
+        except Exception:
+            pass
+        args = []
+        for arg in (event.message_str or '').strip().split()[1:]:
+            # 长数字视为 QQ，其余交给排行参数解析
+            if not target_uid and arg.isdigit() and len(arg) >= 5 and not parse_day(arg):
+                target_uid = arg
+            elif not arg.startswith("@"):
+                args.append(arg)
+        target_uid = target_uid or event.get_sender_id()
+        _, start_day, end_day, period_display, sort_key, cross, _ = self._rank_options(args, mode)
+        ctx_id_rank, rank_index = self._rank_index_for(event, cross)
+        display_mode = ("有效邀请", "总邀请", "无效邀请")[sort_key]
+        if start_day or sort_key == 0:
+            display_mode = f"{period_display}{display_mode}"
+        if cross:
+            display_mode = f"全服{display_mode}"
+
+        window = start_day is not None or end_day is not None
+        if not window:
+            # 名次索引直接定位，O(log M)
+            position = rank_index.ranking(sort_key).position(target_uid)
+            total = len(rank_index.ranking(sort_key))
+        else:
+            # 时间窗口排行没有常驻名次索引，窗口计数扫描一遍即可定位，前后几名也从中取
+            count_map = rank_index.counts(start_day, end_day)
+            position = 0 if target_uid in count_map else None
+            total = len(count_map)
+        name = self._inviter_name(rank_index, ctx_id_rank, target_uid)
+        text = f"====我的排名====\n({display_mode}排行)\n"
+        if position is None:
+            text += f"{name}({target_uid}) 暂无邀请记录，未上榜（共 {total} 人上榜）"
+            yield event.plain_result(text)
+            return
+        if window:
+            rows = self._window_neighbours(count_map, sort_key, target_uid)
+        else:
+            rows, _ = self._ranked(rank_index, sort_key, start_day, end_day, max(0, position - 2), position + 3)
+        my_rank = next(rank for uid, _, rank in rows if uid == target_uid)
+        text += f"{name}({target_uid}) 排名第 {my_rank} / {total}\n"
+        for uid, tpl, rank in rows:
+            marker = "👉" if uid == target_uid else "  "
+            text += (
+                f"{marker}{rank}. {self._inviter_name(rank_index, ctx_id_rank, uid)}({uid}) | "
+                f"有效:{tpl[0]} 总:{tpl[1]} 无效:{tpl[2]}\n"
+            )
+        yield event.plain_result(text.rstrip())
+
     @filter.command("邀请奖励")
+    @metered("command", "邀请奖励")
     async def cmd_invite_reward(self, event: AstrMessageEvent):
         msg = self.config.get("reward_message", "暂无奖励内容\n请联系管理员在WebUI配置奖励说明")
-        # 提前处理html内容中的换行
-        msg_html = msg.replace("\n", "<br>")
-        html_body = f"""
-<div style='background:__BG__;'>
-  <div style='background:rgba(255,255,255,0.92);backdrop-filter: blur(5.5px);margin:17px 23px 18px 18px;padding:16px 17px 15px 19px;border-radius:14px;'>
-    <div style='text-align:center;font-weight:bold;color:#f49a1e;font-size:1.38rem;letter-spacing:2px;text-shadow:0 3px 22px #ffe6bf91;'>🎁邀请奖励</div>
-    <hr style='border:none;border-top:1px solid #fae5be;margin:9.5px 0 13px 0'>
-    <div style='font-size:1.07rem;color:#8d5a19;padding:6px 3px 10px 3px;'>{msg_html}</div>
-    <div style='text-align:right;font-size:.91rem;color:#b7ab7d;margin-top:13px;'>奖励内容由WebUI配置</div>
-  </div>
-</div>
-"""
-        async for result in self.try_render_html(event, html_body, {}, msg):
+        # 奖励内容允许 HTML，只需把换行转成 <br>（模板见 templates/invite_reward.html）
+        card_data = {"message_html": msg.replace("\n", "<br>")}
+        card = Card(
+            title="邀请奖励",
+            accent="#f49a1e",
+            panel_alpha=0.92,
+            body=html_to_text(msg),
+            body_color="#8d5a19",
+            footer="奖励内容由WebUI配置",
+        )
+        async for result in self.try_render_html(event, "invite_reward.html", card_data, msg, versioned=False, card=card):
             yield result
 
     @filter.command("邀请重置")
+    @metered("command", "邀请重置")
     async def reset_self(self, event: AstrMessageEvent, 目标: str = ""):
         """重置指定成员的邀请数据"""
         try:
@@ -718,8 +1151,8 @@ class InviteQueryPlugin(Star):
                 target_uid = event.get_sender_id()
 
             # 获取群维度数据桶
-            bucket = self._get_group_ctx_bucket(event)
-            
+            group_ctx_id = self._get_group_ctx_id(event)
+
             # 获取群ID用于获取用户名
             group_id = None
             if hasattr(event, 'get_group_id'):
@@ -728,41 +1161,30 @@ class InviteQueryPlugin(Star):
                 raw = getattr(event.message_obj, 'raw_message', {})
                 group_id = str(raw.get('group_id', None)) if raw else None
 
-            if str(target_uid) in bucket:
-                username = bucket[str(target_uid)].get("nickname", "")
+            record = self.store.get_record(group_ctx_id, target_uid)
+            if record is not None:
+                username = record.nickname or ""
                 if not username:
                     username = await self.safe_get_member_name_by_list(event, group_id, target_uid)
-                
+
                 # 重置为默认值
-                bucket[str(target_uid)] = {
-                    "nickname": username if username else str(target_uid),
-                    "inviter": None,
-                    "inviter_name": None,
-                    "join_type": None,
-                    "join_time": None,
-                    "leave_type": None,
-                    "leave_time": None
-                }
-                self.save()
+                await self.writer.call(
+                    self.store.put_record, group_ctx_id, target_uid,
+                    MemberRecord(nickname=username if username else str(target_uid)), reason="reset",
+                )
                 yield event.plain_result(f"已重置成员 {username or target_uid} 的邀请数据")
                 return
             # 若群维度未命中，回退到当前 storage_scope 对应的数据桶
             ctx_id2 = self._ctx_id_for(event, group_id, target_uid)
-            bucket2 = self._get_bucket_by_ctx(ctx_id2)
-            if str(target_uid) in bucket2:
-                username = bucket2[str(target_uid)].get("nickname", "")
+            record2 = self.store.get_record(ctx_id2, target_uid)
+            if record2 is not None:
+                username = record2.nickname or ""
                 if not username:
                     username = await self.safe_get_member_name_by_list(event, group_id, target_uid)
-                bucket2[str(target_uid)] = {
-                    "nickname": username if username else str(target_uid),
-                    "inviter": None,
-                    "inviter_name": None,
-                    "join_type": None,
-                    "join_time": None,
-                    "leave_type": None,
-                    "leave_time": None
-                }
-                self.save()
+                await self.writer.call(
+                    self.store.put_record, ctx_id2, target_uid,
+                    MemberRecord(nickname=username if username else str(target_uid)), reason="reset",
+                )
                 yield event.plain_result(f"已重置成员 {username or target_uid} 的邀请数据")
                 return
             yield event.plain_result("未找到该成员的邀请数据")
@@ -771,43 +1193,604 @@ class InviteQueryPlugin(Star):
             yield event.plain_result("重置失败，请稍后再试")
 
     @filter.command("全局邀请重置")
+    @metered("command", "全局邀请重置")
     async def reset_all(self, event: AstrMessageEvent):
-        """清空全局邀请数据"""
+        """清空全局邀请数据：所有数据桶切换到新轮次（O(数据桶数)），可用 /邀请恢复 全部 撤销"""
         try:
             # 管理员才能执行（全局清空较危险）
             if not self._is_group_admin(event):
                 yield event.plain_result("仅群管理员可执行此操作")
                 return
-            self.invite_data.clear()
-            self.save()
-            yield event.plain_result("已清空全局邀请数据")
+            retired = await self.writer.call(self._bump_epochs, None, "reset_all")
+            await self.epochs.save()
+            self._schedule_epoch_gc()
+            msg = f"已清空全局邀请数据（{len(retired)} 个数据桶），误操作可发送 /邀请恢复 全部 撤销"
+            legacy = self.store.legacy_count()
+            if legacy:
+                msg += f"\n旧版扁平数据 {legacy} 条不分轮次、未清空，请先 /邀请迁移"
+            yield event.plain_result(msg)
         except Exception as e:
             logger.error(f"全局重置失败: {e}")
             yield event.plain_result("全局重置失败，请稍后再试")
 
+    def _keep_epochs(self) -> int:
+        try:
+            return max(0, int(self.config.get("reset_keep_epochs", 1)))
+        except (TypeError, ValueError):
+            return 1
+
+    def _season_ctx(self, event: AstrMessageEvent) -> str | None:
+        """赛季重置/恢复作用的逻辑数据桶：group 作用域为当前群，global 作用域为全局桶；
+        user 作用域每个成员一个数据桶，无法按群重置，返回 None"""
+        if str(self.config.get("storage_scope", "global")).lower() == "user":
+            return None
+        group_id = None
+        if hasattr(event, 'get_group_id'):
+            group_id = getattr(event, 'get_group_id', lambda: None)() or None
+        if not group_id:
+            raw = getattr(event.message_obj, 'raw_message', {})
+            group_id = str(raw.get('group_id', None)) if raw else None
+        return self._logical_ctx_id(event, group_id, None)
+
+    def _bump_epochs(self, ctx_ids, reason: str) -> list:
+        """在写队列里切换轮次（之前排队的写入仍落在旧轮次）；ctx_ids 为 None 表示所有数据桶。返回被换下的存储 ID"""
+        if ctx_ids is None:
+            ctx_ids = sorted({split_ctx(c)[0] for c in self.store.ctx_ids() if self.epochs.is_live(c)})
+        retired = []
+        for ctx_id in ctx_ids:
+            old, _ = self.epochs.bump(ctx_id, reason)
+            self.store.forget_indexes(old)
+            retired.append(old)
+        return retired
+
+    def _restore_epoch(self, ctx_id: str, expected: int, archived_rows) -> int | None:
+        """在写队列里切回上一轮：已归档的轮次先从归档写回，重置之后新产生的记录逐字段并入恢复的轮次（见 merge_record），
+        然后整桶删除被放弃的轮次。返回并入条数；轮次已被其他操作改变时返回 None"""
+        retired = self.epochs.retired(ctx_id)
+        if not retired or retired[-1]["epoch"] != expected:
+            return None
+        abandoned, restored, _ = self.epochs.restore(ctx_id)
+        for uid, raw in archived_rows or ():
+            if self.store.get_record(restored, uid) is None:
+                self.store.put_record(restored, uid, MemberRecord.from_dict(raw), reason="restore")
+        merged = 0
+        for uid, rec in list(self.store.iter_records(abandoned)):
+            self.store.put_record(restored, uid, merge_record(self.store.get_record(restored, uid), rec), reason="restore")
+            merged += 1
+        self.store.drop_ctx(abandoned, reason="restore")
+        self.store.forget_indexes(restored)
+        return merged
+
+    def _drop_archived(self, ctx_id: str, info: dict, physical: str) -> bool:
+        """归档文件写好后在写队列里整桶删除旧轮次；该轮次期间已被恢复则保留"""
+        if not any(item is info for item in self.epochs.retired(ctx_id)):
+            return False
+        self.store.drop_ctx(physical, reason="archive")
+        info["archived"] = True
+        return True
+
+    def _schedule_epoch_gc(self):
+        if self._epoch_gc_task is None or self._epoch_gc_task.done():
+            self._epoch_gc_task = asyncio.create_task(self._gc_epochs())
+
+    async def _gc_epochs(self):
+        """后台归档超出保留数（reset_keep_epochs）的旧轮次：导出为 gzip JSONL 后整桶删除，之后仍可从归档恢复"""
+        keep = self._keep_epochs()
+        archived = 0
+        while True:
+            pending = self.epochs.to_archive(keep)
+            if not pending:
+                break
+            for ctx_id, info in pending:
+                physical = physical_ctx(ctx_id, info["epoch"])
+                path = self.epochs.archive_path(physical)
+                try:
+                    # 上次归档后中断（已删桶、未记下）时不能用空桶覆盖归档文件
+                    if self.store.has_ctx(physical) or not os.path.exists(path):
+                        records = await self.writer.call(lambda: list(self.store.iter_records(physical)))
+                        await asyncio.to_thread(write_archive, path, records)
+                    if await self.writer.call(self._drop_archived, ctx_id, info, physical):
+                        archived += 1
+                except Exception as e:
+                    logger.error(f"[invite] 归档旧轮次 {physical} 失败：{e}")
+                    return
+            await self.epochs.save()
+        if archived:
+            logger.info(f"[invite] 已归档 {archived} 个旧轮次数据桶到 {self.epochs.archive_dir}")
+
+    def _cold_after_days(self) -> int:
+        try:
+            return max(0, int(self.config.get("cold_after_days", 0) or 0))
+        except (TypeError, ValueError):
+            return 0
+
+    def _cold_candidates(self, ctx_id: str, cutoff: int) -> list:
+        """在写队列里选出可归档的成员：离群时间早于 cutoff，且自己没有邀请过人（邀请树的叶子，归档后树上只留人数）"""
+        inviters = self._inviter_index_for(ctx_id)
+        return [
+            (ctx_id, uid, rec) for uid, rec in self.store.iter_records(ctx_id)
+            if rec.left and 0 < rec.leave_ts < cutoff and inviters.get(uid) is None
+        ]
+
+    def _commit_cold(self, name: str, size: int, rows: list) -> int:
+        """归档文件追加落盘后在写队列里登记，并把仍符合条件的记录移出热数据；返回移动条数"""
+        self.cold.commit(name, size)
+        moved = 0
+        for ctx_id, uid, rec in rows:
+            current = self.store.get_record(ctx_id, uid)
+            # 选出之后重新入群、或成了别人的邀请人的成员留在热数据，归档里的那一行不生效
+            if current is None or not current.left or current.leave_ts != rec.leave_ts:
+                continue
+            if self._inviter_index_for(ctx_id).get(uid) is not None:
+                continue
+            self.store.archive_record(ctx_id, uid, current)
+            moved += 1
+        return moved
+
+    async def _archive_cold(self, name: str, rows: list) -> int:
+        size = await asyncio.to_thread(self.cold.append, name, rows)
+        moved = await self.writer.call(self._commit_cold, name, size, rows)
+        await self.store.flush_async()
+        return moved
+
+    async def _tier_cold(self) -> int:
+        """把离群超过 cold_after_days 天的成员移入冷数据层：逐个数据桶选出，按归档文件每 1000 条一批，
+        先追加写入归档并 fsync，再在写队列里从热数据删除。返回移动条数"""
+        days = self._cold_after_days()
+        if days <= 0:
+            return 0
+        cutoff = int(time.time()) - days * 86400
+        moved = 0
+        pending = {}  # 归档文件名 -> [(ctx_id, uid, 记录)]
+        for ctx_id in self.store.ctx_ids():
+            if not self.epochs.is_live(ctx_id):
+                continue
+            name = self.cold.archive_name(ctx_id)
+            for row in await self.writer.call(self._cold_candidates, ctx_id, cutoff):
+                batch = pending.setdefault(name, [])
+                batch.append(row)
+                if len(batch) >= 1000:
+                    moved += await self._archive_cold(name, pending.pop(name))
+        for name, batch in pending.items():
+            moved += await self._archive_cold(name, batch)
+        return moved
+
+    def _commit_revive(self, name: str, size: int, rows: list) -> int:
+        """作废行追加落盘后在写队列里登记，并扣减冷层汇总；返回作废条数"""
+        self.cold.commit(name, size)
+        for ctx_id, _, rec in rows:
+            self.store.revive_record(ctx_id, rec)
+        # 热数据未变，记一次脏让冷层索引随下次落盘写入
+        self.store.mark_dirty()
+        return len(rows)
+
+    def _rejoined_rows(self, found: dict) -> dict:
+        """在写队列里筛出确实重新入群的成员：热数据中的记录在归档记录离群之后进群。返回 归档文件名 -> 行"""
+        pending = {}
+        for (ctx_id, uid), rec in found.items():
+            current = self.store.get_record(ctx_id, uid)
+            if current is not None and current.join_ts >= rec.leave_ts:
+                pending.setdefault(self.cold.archive_name(ctx_id), []).append((ctx_id, uid, rec))
+        return pending
+
+    async def _reconcile_cold(self) -> int:
+        """核对有归档的数据桶里新入群的成员：在线程里查归档，重新入群的追加作废行并 fsync，
+        再在写队列里扣减冷层汇总，热数据与冷层不重复计数。返回作废条数"""
+        keys = set(self.cold.rejoined)
+        if not keys:
+            return 0
+        found = await asyncio.to_thread(self.cold.lookup, keys)
+        revived = 0
+        if found:
+            for name, rows in (await self.writer.call(self._rejoined_rows, found)).items():
+                size = await asyncio.to_thread(self.cold.append, name, rows, True)
+                revived += await self.writer.call(self._commit_revive, name, size, rows)
+        await self.writer.call(self.cold.settle, keys)
+        await self.store.flush_async()
+        return revived
+
+    async def _cold_tier_loop(self):
+        """冷数据后台任务：有成员在有归档的数据桶入群时稍等片刻合并后核对，每天执行一次归档"""
+        next_tier = 0.0
+        while True:
+            try:
+                revived = await self._reconcile_cold()
+                if revived:
+                    logger.info(f"[invite] {revived} 名已归档成员重新入群，已从冷数据层移回")
+                if self._cold_after_days() > 0 and time.time() >= next_tier:
+                    next_tier = time.time() + 86400
+                    moved = await self._tier_cold()
+                    if moved:
+                        logger.info(f"[invite] 已把 {moved} 名离群超过 {self._cold_after_days()} 天的成员移入冷数据层")
+            except Exception as e:
+                logger.error(f"[invite] 冷数据归档失败（已提交的批次不受影响）：{e}")
+            try:
+                await asyncio.wait_for(self.cold.wakeup.wait(), timeout=max(1.0, next_tier - time.time()) if next_tier else 86400)
+            except asyncio.TimeoutError:
+                continue
+            self.cold.wakeup.clear()
+            await asyncio.sleep(5)
+
+    @filter.command("邀请赛季重置")
+    @metered("command", "邀请赛季重置")
+    async def cmd_season_reset(self, event: AstrMessageEvent):
+        """开启新一轮邀请统计（仅群管理员）：当前群的数据桶切换到新轮次，之前的数据封存，可用 /邀请恢复 撤销"""
+        if not self._is_group_admin(event):
+            yield event.plain_result("仅群管理员可执行此操作")
+            return
+        ctx_id = self._season_ctx(event)
+        if ctx_id is None:
+            yield event.plain_result("user 作用域下每个成员单独统计，无法按群重置，请使用 /全局邀请重置")
+            return
+        try:
+            await self.writer.call(self._bump_epochs, [ctx_id], "season")
+            await self.epochs.save()
+        except Exception as e:
+            logger.error(f"[invite] 赛季重置失败: {e}")
+            yield event.plain_result("赛季重置失败，请稍后再试")
+            return
+        self._schedule_epoch_gc()
+        yield event.plain_result(
+            f"已开启第 {self.epochs.epoch(ctx_id) + 1} 轮邀请统计，之前的数据已封存；误操作可发送 /邀请恢复 撤销"
+        )
+
+    @filter.command("邀请恢复")
+    @metered("command", "邀请恢复")
+    async def cmd_epoch_restore(self, event: AstrMessageEvent, 范围: str = ""):
+        """撤销最近一次重置（仅群管理员）：/邀请恢复 撤销当前群的赛季重置，/邀请恢复 全部 撤销全局重置"""
+        if not self._is_group_admin(event):
+            yield event.plain_result("仅群管理员可执行此操作")
+            return
+        if str(范围).strip() == "全部":
+            targets = [
+                ctx_id for ctx_id in list(self.epochs.buckets)
+                if self.epochs.retired(ctx_id) and self.epochs.retired(ctx_id)[-1]["reason"] == "reset_all"
+            ]
+        else:
+            ctx_id = self._season_ctx(event)
+            targets = [ctx_id] if ctx_id and self.epochs.retired(ctx_id) else []
+        if not targets:
+            yield event.plain_result("没有可撤销的重置")
+            return
+        restored = merged = 0
+        try:
+            for ctx_id in targets:
+                last = self.epochs.retired(ctx_id)[-1]
+                rows = None
+                if last["archived"]:
+                    path = self.epochs.archive_path(physical_ctx(ctx_id, last["epoch"]))
+                    rows = await asyncio.to_thread(read_archive, path)
+                count = await self.writer.call(self._restore_epoch, ctx_id, last["epoch"], rows)
+                if count is not None:
+                    restored += 1
+                    merged += count
+        except Exception as e:
+            logger.error(f"[invite] 恢复重置失败: {e}")
+            yield event.plain_result("恢复失败，请稍后再试")
+            return
+        finally:
+            await self.epochs.save()
+        yield event.plain_result(f"已恢复 {restored} 个数据桶到重置前的数据，重置后新增的 {merged} 条记录已并入")
+
+    @filter.command("邀请审计")
+    @metered("command", "邀请审计")
+    async def cmd_invite_audit(self, event: AstrMessageEvent, qq: str = ""):
+        """查看某成员相关的入群/退群/被踢/重置事件记录（仅群管理员）"""
+        if not self._is_group_admin(event):
+            yield event.plain_result("仅群管理员可执行此操作")
+            return
+        target_uid = None
+        try:
+            for comp in event.get_messages():
+                if isinstance(comp, Comp.At) and comp.qq:
+                    target_uid = str(comp.qq)
+                    break
+        except Exception:
+            pass
+        if not target_uid:
+            digits = ''.join(ch for ch in str(qq) if ch.isdigit())
+            target_uid = digits or event.get_sender_id()
+        entries = self.store.audit_trail(target_uid, limit=20)
+        if not entries:
+            yield event.plain_result(f"未找到 {target_uid} 的事件记录（仅 json 存储后端记录事件日志）")
+            return
+        event_names = {
+            "invite": "邀请入群", "join": "主动入群", "leave": "自己退群", "kick": "被踢",
+            "reset": "管理员重置", "reset_all": "全局重置", "migrate": "数据迁移",
+            "query": "查询建档", "nickname": "昵称更新", "backfill": "历史回填",
+        }
+        text = f"====邀请审计 {target_uid}====\n"
+        for entry in entries:
+            ts = datetime.fromtimestamp(entry.get("ts", 0)).strftime('%Y-%m-%d %H:%M:%S')
+            ev = event_names.get(entry.get("ev"), entry.get("ev") or entry.get("op"))
+            rec = entry.get("rec") or entry.get("f") or {}
+            detail = ""
+            if rec.get("inviter"):
+                detail = f" 邀请人:{rec['inviter']}"
+            if rec.get("leave_type"):
+                detail += f" {rec['leave_type']}"
+            text += f"{ts} [{ev}] {entry.get('uid', '-')}{detail}\n"
+        yield event.plain_result(text)
+
+    @filter.command("邀请导出")
+    @metered("command", "邀请导出")
+    async def cmd_invite_export(self, event: AstrMessageEvent):
+        """把邀请数据导出为可读 JSON（仅群管理员，json 存储后端）"""
+        if not self._is_group_admin(event):
+            yield event.plain_result("仅群管理员可执行此操作")
+            return
+        if not hasattr(self.store, "export_json"):
+            yield event.plain_result(f"当前存储后端 {self.store.backend} 不支持导出 JSON")
+            return
+        try:
+            # 经写队列取快照，保证与前后的变更顺序一致；序列化与写文件在线程执行
+            job = await self.writer.call(self.store.export_json)
+            path = await asyncio.to_thread(job)
+            yield event.plain_result(f"已导出邀请数据：{path}")
+        except Exception as e:
+            logger.error(f"导出邀请数据失败: {e}")
+            yield event.plain_result("导出失败，请稍后再试")
+
+    def _backfill_batch(self, batch) -> int:
+        """写入一个群的历史成员：[(数据桶, uid, 记录)]；已有记录只补全缺失的进群时间，返回变更条数"""
+        changed = 0
+        for ctx_id, uid, rec in batch:
+            member = self.store.get_record(ctx_id, uid)
+            if member is None:
+                self.store.put_record(ctx_id, uid, rec, reason="backfill")
+                changed += 1
+            elif not member.join_ts and rec.join_ts:
+                self.store.update_record(ctx_id, uid, "backfill", join_ts=rec.join_ts)
+                changed += 1
+        return changed
+
+    async def _backfill_group(self, event, group_id) -> int:
+        members = await self.get_group_members(event, group_id)
+        if members is None:
+            raise RuntimeError("获取群成员列表失败")
+        batch = []
+        for uid, member in members.items():
+            try:
+                join_ts = int(member.get("join_time") or 0)
+            except (TypeError, ValueError):
+                join_ts = 0
+            # 成员列表看不出进群方式；群主即建群者记为主动，其余记为未知
+            role = str(member.get("role") or "").lower()
+            batch.append((self._ctx_id_for(event, group_id, uid), uid, MemberRecord(
+                nickname=member.get("card") or member.get("nickname") or uid,
+                join_type=JOIN_ACTIVE if role == "owner" else JOIN_NONE,
+                join_ts=join_ts,
+            )))
+        # 每个群一次写队列提交，落盘后才记检查点
+        changed = await self.writer.call(self._backfill_batch, batch)
+        await self.store.flush_async()
+        return changed
+
+    async def _bot_group_ids(self, event) -> list:
+        with self.metrics.timer("api", "get_group_list"):
+            result = await event.bot.api.call_action('get_group_list')
+        if isinstance(result, dict):
+            result = result.get("data", result)
+        return [str(g["group_id"]) for g in result or [] if isinstance(g, dict) and g.get("group_id")]
+
+    @filter.command("邀请回填")
+    @metered("command", "邀请回填")
+    async def cmd_invite_backfill(self, event: AstrMessageEvent, 目标: str = "", 选项: str = ""):
+        """按群成员列表回填插件安装前入群的成员（仅群管理员）。
+        用法：
+        /邀请回填              # 回填当前群
+        /邀请回填 123456       # 回填指定群
+        /邀请回填 全部         # 回填机器人所在的全部群
+        /邀请回填 全部 重新    # 忽略上次进度，全部重新回填
+        已完成的群会记录进度，中断后再次执行会跳过。
+        """
+        if not self._is_group_admin(event):
+            yield event.plain_result("仅群管理员可执行此操作")
+            return
+        if self.backfiller.running:
+            yield event.plain_result("已有回填任务在进行中，请稍后再试")
+            return
+        target = str(目标 or "").strip()
+        restart = "重新" in (target, str(选项 or "").strip())
+        if target == "重新":
+            target = ""
+        try:
+            if target in {"全部", "all"}:
+                if not (hasattr(event, "bot") and hasattr(event.bot, "api")):
+                    yield event.plain_result("当前平台不支持获取群列表")
+                    return
+                group_ids = await self._bot_group_ids(event)
+            else:
+                gid = ''.join(ch for ch in target if ch.isdigit()) or event.get_group_id()
+                if not gid:
+                    yield event.plain_result("无法确定群号，请在群内使用或指定群号")
+                    return
+                group_ids = [str(gid)]
+        except Exception as e:
+            logger.error(f"获取群列表失败: {e}")
+            yield event.plain_result("获取群列表失败，请稍后再试")
+            return
+
+        total_changed = failed = finished = 0
+        pending = len(group_ids)
+        step = max(1, len(group_ids) // 10)
+        async for finished, pending, gid, changed, error in self.backfiller.run(
+            group_ids, lambda g: self._backfill_group(event, g), restart=restart
+        ):
+            total_changed += changed
+            if error is not None:
+                failed += 1
+            if pending > 1 and finished < pending and finished % step == 0:
+                yield event.plain_result(f"回填进度 {finished}/{pending}，已新增/补全 {total_changed} 条")
+        if not finished:
+            yield event.plain_result("所选群均已回填过，如需重新回填请加参数“重新”")
+            return
+        msg = f"回填完成：处理 {finished} 个群，新增/补全 {total_changed} 条"
+        if failed:
+            msg += f"，{failed} 个群失败（再次执行会重试）"
+        yield event.plain_result(msg)
+
+    def _metric_gauges(self) -> dict:
+        """各组件自带统计转为瞬时值，供 /邀请性能 与 Prometheus 导出共用"""
+        gauges = {"uptime_seconds": round(time.time() - self.metrics.started_at, 1)}
+        gauges["records"] = self.store.count_records()
+        gauges["store_dirty"] = self.store._dirty
+        for key in ("mutations", "flushes", "flush_errors", "bytes_written", "last_flush_ms"):
+            gauges[f"store_{key}"] = self.store.stats[key]
+        for key, value in self.writer.stats.items():
+            gauges[f"writer_{key}"] = value
+        for key, value in self.render_cache.stats.items():
+            gauges[f"render_cache_{key}"] = value
+        for key, value in self.member_directory.stats.items():
+            gauges[f"member_cache_{key}"] = value
+        for key, value in self.dedup.stats.items():
+            gauges[f"dedup_{key}"] = value
+        gauges["cold_records"] = self.cold.count()
+        return gauges
+
+    async def _export_metrics_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self._export_metrics()
+
+    async def _export_metrics(self):
+        try:
+            payload = self.metrics.to_prometheus(self._metric_gauges()).encode("utf-8")
+            await asyncio.to_thread(atomic_write_bytes, self.metrics_file, payload)
+        except Exception as e:
+            logger.debug(f"[invite debug] 导出性能指标失败: {e}")
+
+    @filter.command("邀请性能")
+    @metered("command", "邀请性能")
+    async def cmd_invite_metrics(self, event: AstrMessageEvent, 选项: str = ""):
+        """查看插件性能指标（仅群管理员）：/邀请性能 [重置]"""
+        if not self._is_group_admin(event):
+            yield event.plain_result("仅群管理员可执行此操作")
+            return
+        if str(选项).strip() == "重置":
+            self.metrics.reset()
+            yield event.plain_result("已清空性能统计")
+            return
+        gauges = self._metric_gauges()
+        stats = self.store.stats
+        text = "====邀请插件性能====\n"
+        text += (
+            f"存储后端: {self.store.backend}，记录数: {gauges['records']}（冷数据 {gauges['cold_records']} 条），"
+            f"冷启动加载: {self.load_ms:.1f} ms\n"
+        )
+        text += (
+            f"写盘: 变更 {stats['mutations']} 次 / 落盘 {stats['flushes']} 次（失败 {stats['flush_errors']}），"
+            f"累计 {stats['bytes_written']} 字节，上次 {stats['last_flush_ms']:.1f} ms，待写 {gauges['store_dirty']}\n"
+        )
+        cache = self.render_cache.stats
+        members = self.member_directory.stats
+        text += f"渲染缓存: 命中 {cache['hits']} / 未命中 {cache['misses']}，条目 {len(self.render_cache)}\n"
+        text += f"成员列表缓存: 命中 {members['hits']} / 拉取 {members['fetches']}（失败 {members['errors']}）\n"
+        text += f"写队列: 已执行 {self.writer.stats['applied']}，最长排队 {self.writer.stats['max_queue']}\n"
+        text += f"通知去重: 检查 {self.dedup.stats['checked']}，丢弃重复 {self.dedup.stats['duplicates']}\n"
+        if not self.metrics.enabled:
+            text += "延迟统计未启用（配置 metrics_enabled）"
+            yield event.plain_result(text)
+            return
+        names = {"event": "事件", "command": "命令", "save": "写盘", "render": "渲染", "api": "接口"}
+        text += "延迟（次数 | 平均 | p50≤ | p95≤，毫秒）：\n"
+        for (name, label), hist in sorted(self.metrics.histograms.items()):
+            title = names.get(name, name) + (f"/{label}" if label else "")
+            text += (
+                f"{title}: {hist.count} | {hist.mean:.2f} | {hist.quantile(0.5):g} | {hist.quantile(0.95):g}\n"
+            )
+        errors = {k: v for k, v in self.metrics.counters.items() if k[0].endswith("_errors")}
+        if errors:
+            text += "出错: " + "，".join(f"{label or name} {n}" for (name, label), n in sorted(errors.items())) + "\n"
+        notices = {label: n for (name, label), n in self.metrics.counters.items() if name == "notices"}
+        if notices:
+            text += "通知: " + "，".join(f"{label} {n}" for label, n in sorted(notices.items())) + "\n"
+        yield event.plain_result(text.rstrip())
+
     async def terminate(self):
-        # 卸载插件时可扩展资源释放逻辑
-        pass
+        if self._cold_task is not None and not self._cold_task.done():
+            # 已提交的批次已落盘，未提交的归档内容下次归档时截掉
+            self._cold_task.cancel()
+        if self._epoch_gc_task is not None and not self._epoch_gc_task.done():
+            # 未完成的归档下次启动时继续
+            self._epoch_gc_task.cancel()
+        if self._migration_task is not None and not self._migration_task.done():
+            # 已提交的批次已落盘，下次发送 /邀请迁移 从检查点继续
+            self._migration_task.cancel()
+        if self._metrics_task is not None:
+            self._metrics_task.cancel()
+            self._metrics_task = None
+            await self._export_metrics()
+        # 卸载插件时先执行完写队列，再停止后台写盘任务并做最终刷写
+        await self.writer.close()
+        await self.store.close()
+        stats = self.store.stats
+        logger.info(
+            f"[invite] 数据已落盘：变更 {stats['mutations']} 次，写盘 {stats['flushes']} 次，"
+            f"累计写入 {stats['bytes_written']} 字节"
+        )
+
+    async def _migration_target(self, plan: dict):
+        """按迁移计划返回 user_id -> 目标数据桶 的函数，返回 None 表示跳过（保留在旧数据中）"""
+        platform = plan["platform"]
+        if plan["mode"] == "group":
+            target_ctx = f"{platform}:G:{plan['group_id']}"
+            # 优先用群成员列表过滤，仅迁移当前群内相关用户（无法获取则全部迁移）
+            members = await self.get_group_members(None, str(plan["group_id"]))
+            group_members = set(members) if members is not None else None
+            return lambda uid: (
+                self.epochs.current(target_ctx) if group_members is None or uid in group_members else None
+            )
+        if plan["mode"] == "user":
+            # 每个用户独立 user 桶
+            return lambda uid: self.epochs.current(f"{platform}:U:{uid}")
+        return lambda uid: self.epochs.current(f"{platform}:GLOBAL")
+
+    @staticmethod
+    def _migration_progress(state: dict) -> str:
+        done = state["moved"] + state["skipped"]
+        percent = done * 100 // state["total"] if state["total"] else 100
+        return f"{done}/{state['total']}（{percent}%），已迁移 {state['moved']} 条，跳过 {state['skipped']} 条"
+
+    async def _run_migration_background(self, plan: dict, target_for, resume: bool):
+        """后台迁移：进度写入检查点与日志，管理员用 /邀请迁移 进度 查看"""
+        reported = 0
+        try:
+            async for state in self.migrator.run(self.store, self.writer, plan, target_for, resume):
+                decile = (state["moved"] + state["skipped"]) * 10 // max(1, state["total"])
+                if decile > reported:
+                    reported = decile
+                    logger.info(f"[invite] 旧数据迁移进度：{self._migration_progress(state)}")
+            logger.info(f"[invite] 旧数据迁移完成：{self._migration_progress(self.migrator.checkpoint.state)}")
+        except Exception as e:
+            logger.error(f"[invite] 旧数据迁移中断（已提交的批次不受影响，重新发送 /邀请迁移 可继续）：{e}")
 
     @filter.command("邀请迁移")
+    @metered("command", "邀请迁移")
     async def migrate_invite_data(self, event: AstrMessageEvent, 目标: str = "group"):
-        """将旧版扁平结构邀请数据迁移到作用域桶。
+        """将旧版扁平结构邀请数据分批迁移到作用域桶（每批落盘并记录进度，中断后重发可继续）。
         用法：
-        /邀请迁移                 # 默认迁移到当前群的 group 桶
+        /邀请迁移                 # 默认迁移到当前群的 group 桶；有未完成的迁移时继续上次的迁移
         /邀请迁移 group           # 迁移到当前群的 group 桶
         /邀请迁移 user            # 迁移到 user 桶（为每个用户建立独立桶）
         /邀请迁移 global          # 迁移到 global 桶（全局共享）
+        /邀请迁移 group 后台      # 在后台迁移，不占用命令
+        /邀请迁移 进度            # 查看迁移进度
         /邀请迁移 帮助            # 显示帮助
         仅群管理员可执行。
         """
+        modes = {"group", "user", "global"}
+        args = [a.strip() for a in (event.message_str or '').strip().split()[1:]]
         try:
-            if str(目标).strip() in {"help", "帮助", "?"}:
+            if set(args) & {"help", "帮助", "?"}:
                 help_text = (
                     "用法:\n"
-                    "/邀请迁移              —— 默认迁移到当前群的 group 桶\n"
+                    "/邀请迁移              —— 默认迁移到当前群的 group 桶（有未完成的迁移时继续）\n"
                     "/邀请迁移 group        —— 迁移到当前群的 group 桶\n"
                     "/邀请迁移 user         —— 迁移到 user 桶（每用户独立）\n"
                     "/邀请迁移 global       —— 迁移到 global 桶（全局共享）\n"
+                    "/邀请迁移 group 后台   —— 后台迁移，不阻塞其他命令\n"
+                    "/邀请迁移 进度         —— 查看迁移进度\n"
                 )
                 yield event.plain_result(help_text)
                 return
@@ -817,80 +1800,74 @@ class InviteQueryPlugin(Star):
                 yield event.plain_result("仅群管理员可执行此操作")
                 return
 
+            checkpoint = self.migrator.checkpoint
+            if "进度" in args:
+                if not checkpoint.state:
+                    yield event.plain_result("暂无迁移记录")
+                    return
+                status = "进行中" if self.migrator.running else ("已完成" if checkpoint.state.get("finished") else "已中断，重新发送 /邀请迁移 可继续")
+                yield event.plain_result(f"旧数据迁移（{checkpoint.state['mode']}）{status}：{self._migration_progress(checkpoint.state)}")
+                return
+            if self.migrator.running:
+                yield event.plain_result("已有迁移任务在进行中，可发送 /邀请迁移 进度 查看")
+                return
+            unknown = [a for a in args if a.lower() not in modes and a != "后台"]
+            if unknown:
+                yield event.plain_result("无效参数，请使用 group/user/global 之一或查看 /邀请迁移 帮助")
+                return
+
             # 识别 legacy：顶层 key 为用户ID、value 为包含 nickname/join_type 的 dict，且 key 不含 ':'
-            legacy = {}
-            for k, v in list(self.invite_data.items()):
-                if isinstance(k, str) and isinstance(v, dict) and \
-                   ("nickname" in v or "join_type" in v) and \
-                   (":" not in k):
-                    legacy[k] = v
-
-            if not legacy:
+            total = self.store.legacy_count()
+            if not total:
                 yield event.plain_result("未发现可迁移的旧版数据（或已迁移）")
                 return
 
-            mode = str(目标 or "group").strip().lower()
-            platform = event.get_platform_name() if hasattr(event, "get_platform_name") else "default"
-
-            moved = 0
-            skipped = 0
-
-            if mode == "group":
-                # 迁移到当前群 group 桶
+            explicit = [a.lower() for a in args if a.lower() in modes]
+            resume = not explicit and checkpoint.unfinished
+            if resume:
+                plan = {k: checkpoint.state.get(k) for k in ("mode", "platform", "group_id")}
+            else:
+                mode = explicit[0] if explicit else "group"
+                platform = event.get_platform_name() if hasattr(event, "get_platform_name") else "default"
                 gid = None
-                if hasattr(event, 'get_group_id'):
-                    gid = getattr(event, 'get_group_id', lambda: None)() or None
-                if not gid:
-                    raw = getattr(event.message_obj, 'raw_message', {})
-                    gid = str(raw.get('group_id', None)) if raw else None
-                if not gid:
-                    yield event.plain_result("无法确定当前群ID，无法迁移到群桶")
-                    return
+                if mode == "group":
+                    if hasattr(event, 'get_group_id'):
+                        gid = getattr(event, 'get_group_id', lambda: None)() or None
+                    if not gid:
+                        raw = getattr(event.message_obj, 'raw_message', {})
+                        gid = str(raw.get('group_id', None)) if raw else None
+                    if not gid:
+                        yield event.plain_result("无法确定当前群ID，无法迁移到群桶")
+                        return
+                plan = {"mode": mode, "platform": platform, "group_id": gid}
+            target_for = await self._migration_target(plan)
 
-                target_ctx = f"{platform}:G:{gid}"
-                target_bucket = self.invite_data.setdefault(target_ctx, {})
-
-                # 优先用群成员列表过滤，仅迁移当前群内相关用户（无法获取则全部迁移）
-                group_members = None
-                try:
-                    if hasattr(self.context, 'get_group_member_list'):
-                        members = await self.context.get_group_member_list(str(gid))
-                        group_members = {str(m.get('user_id')) for m in members}
-                except Exception:
-                    group_members = None
-
-                for uid, rec in legacy.items():
-                    if group_members is not None and uid not in group_members:
-                        skipped += 1
-                        continue
-                    target_bucket[uid] = rec
-                    moved += 1
-                    # 从顶层移除旧记录
-                    self.invite_data.pop(uid, None)
-
-            elif mode == "user":
-                # 每个用户独立 user 桶
-                for uid, rec in legacy.items():
-                    ctx = f"{platform}:U:{uid}"
-                    bucket = self.invite_data.setdefault(ctx, {})
-                    bucket[uid] = rec
-                    moved += 1
-                    self.invite_data.pop(uid, None)
-
-            elif mode == "global":
-                ctx = f"{platform}:GLOBAL"
-                bucket = self.invite_data.setdefault(ctx, {})
-                for uid, rec in legacy.items():
-                    bucket[uid] = rec
-                    moved += 1
-                    self.invite_data.pop(uid, None)
-            else:
-                yield event.plain_result("无效参数，请使用 group/user/global 之一或查看 /邀请迁移 帮助")
+            if "后台" in args:
+                self._migration_task = asyncio.create_task(self._run_migration_background(plan, target_for, resume))
+                yield event.plain_result(
+                    f"已在后台{'继续' if resume else '开始'}迁移 {total} 条旧数据，可发送 /邀请迁移 进度 查看"
+                )
                 return
 
-            self.save()
-            msg = f"迁移完成：已迁移 {moved} 条，跳过 {skipped} 条"
-            if mode == "group" and skipped:
+            reported = 0
+            try:
+                async for state in self.migrator.run(self.store, self.writer, plan, target_for, resume):
+                    # 大约每完成 10% 汇报一次
+                    done = state["moved"] + state["skipped"]
+                    decile = done * 10 // max(1, state["total"])
+                    if decile > reported and done < state["total"]:
+                        reported = decile
+                        yield event.plain_result(f"迁移进度：{self._migration_progress(state)}")
+            except Exception as e:
+                logger.error(f"邀请数据迁移失败: {e}")
+                state = checkpoint.state
+                yield event.plain_result(
+                    f"迁移中断：已提交 {state.get('moved', 0)} 条不受影响，重新发送 /邀请迁移 可继续"
+                )
+                return
+            state = checkpoint.state
+            msg = f"迁移完成：已迁移 {state['moved']} 条，跳过 {state['skipped']} 条"
+            if state["mode"] == "group" and state["skipped"]:
                 msg += "（非本群成员跳过）"
             yield event.plain_result(msg)
         except Exception as e:
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from astrbot.api import logger
+
+
+class MemberDirectory:
+    """群成员列表缓存：group_id -> {user_id: member}。
+
+    - 每个群的成员列表缓存 ttl 秒，按 user_id 建字典索引，单人查询 O(1)
+    - 同一群的并发请求共享同一次拉取（single-flight）
+    - 入群/退群事件调用 invalidate()，下次访问重新拉取
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = max(0.0, float(ttl))
+        self._entries = {}  # group_id -> (expires_at, version, {uid: member})
+        self._inflight = {}  # group_id -> asyncio.Task
+        self._version = 0
+        self.stats = {"hits": 0, "misses": 0, "fetches": 0, "shared": 0, "errors": 0}
+
+    async def get_members(self, group_id, fetch) -> dict | None:
+        """返回 {user_id: member}；fetch 为无参协程函数，返回成员 dict 列表。拉取失败返回 None"""
+        entry = self._fresh(group_id)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry[2]
+        self.stats["misses"] += 1
+        key = str(group_id)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, fetch))
+            self._inflight[key] = task
+        else:
+            self.stats["shared"] += 1
+        try:
+            # shield：某个调用方被取消不影响其他共享者
+            return await asyncio.shield(task)
+        except Exception as e:
+            logger.debug(f'[invite debug] get_group_member_list失败: {e}')
+            return None
+
+    async def get_member(self, group_id, user_id, fetch) -> dict | None:
+        members = await self.get_members(group_id, fetch)
+        if not members:
+            return None
+        return members.get(str(user_id))
+
+    def version(self, group_id) -> int:
+        """该群当前缓存的拉取版本号（0 表示未缓存），用于判断是否需要重新同步昵称"""
+        entry = self._entries.get(str(group_id))
+        return entry[1] if entry else 0
+
+    def invalidate(self, group_id=None):
+        if group_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(str(group_id), None)
+
+    def _fresh(self, group_id):
+        entry = self._entries.get(str(group_id))
+        if entry is not None and entry[0] > time.monotonic():
+            return entry
+        return None
+
+    async def _load(self, key, fetch) -> dict:
+        try:
+            self.stats["fetches"] += 1
+            result = await fetch()
+            if isinstance(result, dict):
+                result = result.get("data", result)
+            members = {}
+            for member in result or []:
+                if isinstance(member, dict) and member.get("user_id") is not None:
+                    members[str(member.get("user_id"))] = member
+            self._version += 1
+            self._entries[key] = (time.monotonic() + self.ttl, self._version, members)
+            return members
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
@@ -0,0 +1,176 @@
+import functools
+import inspect
+import time
+
+# 延迟直方图分桶上界（毫秒）
+BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)  # 最后一格为 +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms: float):
+        i = 0
+        for bound in BUCKETS_MS:
+            if ms <= bound:
+                break
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+
+    def quantile(self, q: float) -> float:
+        """按分桶估算分位数（返回所在桶的上界）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "key", "started")
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.metrics._observe(self.key, (time.perf_counter() - self.started) * 1000)
+        # 调用方提前关闭异步生成器（GeneratorExit）不算出错
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.metrics._inc((self.key[0] + "_errors", self.key[1]))
+        return False
+
+
+class Metrics:
+    """插件内部性能指标：按 (指标名, 标签) 记录延迟直方图与计数器。
+
+    未启用时 timer() 返回共享的空上下文、inc()/observe() 直接返回，开销只有一次属性判断。
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = bool(enabled)
+        self.histograms = {}  # (name, label) -> Histogram
+        self.counters = {}  # (name, label) -> int
+        self.started_at = time.time()
+
+    def timer(self, name: str, label: str = ""):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, (name, label))
+
+    def observe(self, name: str, ms: float, label: str = ""):
+        if self.enabled:
+            self._observe((name, label), ms)
+
+    def inc(self, name: str, label: str = "", value: int = 1):
+        if self.enabled:
+            self._inc((name, label), value)
+
+    def _observe(self, key, ms: float):
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        hist.observe(ms)
+
+    def _inc(self, key, value: int = 1):
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self.started_at = time.time()
+
+    def to_prometheus(self, gauges: dict | None = None, prefix: str = "invitecount") -> str:
+        """Prometheus 文本格式：直方图单位为秒；gauges 为 {指标名: 数值} 的附加瞬时值"""
+        lines = []
+        by_name = {}
+        for (name, label), hist in sorted(self.histograms.items()):
+            by_name.setdefault(name, []).append((label, hist))
+        for name, series in by_name.items():
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for label, hist in series:
+                tag = f'label="{_escape(label)}",' if label else ""
+                cumulative = 0
+                for bound, n in zip(BUCKETS_MS + (None,), hist.counts):
+                    cumulative += n
+                    le = "+Inf" if bound is None else repr(bound / 1000)
+                    lines.append(f'{metric}_bucket{{{tag}le="{le}"}} {cumulative}')
+                tag = f'{{label="{_escape(label)}"}}' if label else ""
+                lines.append(f"{metric}_sum{tag} {hist.total / 1000}")
+                lines.append(f"{metric}_count{tag} {hist.count}")
+        by_name = {}
+        for (name, label), value in sorted(self.counters.items()):
+            by_name.setdefault(name, []).append((label, value))
+        for name, series in by_name.items():
+            metric = f"{prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for label, value in series:
+                tag = f'{{label="{_escape(label)}"}}' if label else ""
+                lines.append(f"{metric}{tag} {value}")
+        for name, value in (gauges or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metric = f"{prefix}_{name}"
+                lines.append(f"# TYPE {metric} gauge")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metered(name: str, label: str = ""):
+    """给插件方法计时（协程或异步生成器），指标对象取自 self.metrics；未启用时直接调用原函数"""
+    def decorator(fn):
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def agen_wrapper(self, *args, **kwargs):
+                metrics = self.metrics
+                if not metrics.enabled:
+                    async for item in fn(self, *args, **kwargs):
+                        yield item
+                    return
+                with metrics.timer(name, label):
+                    async for item in fn(self, *args, **kwargs):
+                        yield item
+            return agen_wrapper
+
+        @functools.wraps(fn)
+        async def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(name, label):
+                return await fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import time
+
+from astrbot.api import logger
+
+from .storage import LEGACY_CTX, atomic_write_bytes
+
+
+class MigrationCheckpoint:
+    """迁移进度：目标（mode/platform/group_id）与累计迁移、跳过条数，每批提交后原子写入一次"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.state = json.load(f) or {}
+            except Exception as e:
+                logger.warning(f"[invite] 迁移进度文件损坏，将从头开始：{e}")
+
+    @property
+    def unfinished(self) -> bool:
+        return bool(self.state) and not self.state.get("finished")
+
+    def start(self, plan: dict, total: int):
+        self.state = {
+            **plan, "moved": 0, "skipped": 0, "total": total,
+            "started_at": int(time.time()), "updated_at": int(time.time()), "finished": False,
+        }
+
+    async def save(self):
+        self.state["updated_at"] = int(time.time())
+        payload = json.dumps(self.state, ensure_ascii=False).encode("utf-8")
+        await asyncio.to_thread(atomic_write_bytes, self.path, payload)
+
+
+class LegacyMigrator:
+    """分批迁移旧版扁平数据：每批在写队列里一次完成“取一批 -> 写入作用域桶 -> 删除旧记录”，
+    随即落盘并记录检查点，中途出错时已提交的批次不受影响，重跑会从剩余的旧记录继续（已迁移的记录已不在旧数据里）。
+    不复制整份旧数据：每批只取 chunk_size 条。批次之间让出事件循环，可在后台运行而不阻塞其他命令。
+    同一时刻只允许一个迁移任务。
+    """
+
+    def __init__(self, checkpoint_path: str, chunk_size: int = 500):
+        self.checkpoint = MigrationCheckpoint(checkpoint_path)
+        self.chunk_size = max(1, int(chunk_size))
+        self.running = False
+
+    async def run(self, store, writer, plan: dict, target_for, resume: bool = False):
+        """target_for(user_id) 返回目标数据桶 ID，返回 None 表示跳过（记录保留在旧数据中）。
+        每提交一批产出一次进度字典（即检查点内容）。
+        """
+        checkpoint = self.checkpoint
+        if not (resume and checkpoint.unfinished):
+            checkpoint.start(plan, store.legacy_count())
+        state = checkpoint.state
+        # 跳过的记录留在旧数据最前面，本轮已跳过的条数即下一批的起始偏移
+        offset = 0
+        self.running = True
+        try:
+            while True:
+                moved, skipped = await writer.call(self._migrate_chunk, store, offset, target_for)
+                if not moved and not skipped:
+                    break
+                offset += skipped
+                state["moved"] += moved
+                # 续跑时跳过的记录会重新判断一遍，跳过数即仍留在旧数据里的条数
+                state["skipped"] = offset
+                if moved:
+                    await store.flush_async()
+                await checkpoint.save()
+                yield dict(state)
+                # 让出事件循环，期间其他命令与入群/退群事件照常处理
+                await asyncio.sleep(0)
+            state["finished"] = True
+            await checkpoint.save()
+        finally:
+            self.running = False
+
+    def _migrate_chunk(self, store, offset: int, target_for) -> tuple:
+        # 先定好整批的去向再写入，判定出错时本批不会只迁移一半
+        moves = []
+        skipped = 0
+        for uid, rec in store.legacy_chunk(offset, self.chunk_size):
+            ctx_id = target_for(uid)
+            if ctx_id is None:
+                skipped += 1
+            else:
+                moves.append((ctx_id, uid, rec))
+        for ctx_id, uid, rec in moves:
+            store.put_record(ctx_id, uid, rec, reason="migrate")
+            # 从顶层移除旧记录
+            store.delete_record(LEGACY_CTX, uid, reason="migrate")
+        return len(moves), skipped
@@ -0,0 +1,210 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+# 入群/退群通知的 post_type 取值
+NOTICE_POST_TYPES = frozenset({"notice", "group_notice"})
+
+# notice_type 别名 -> 统一语义
+NOTICE_ALIASES = {
+    **dict.fromkeys(
+        ("group_increase", "member_increase", "group_member_increase", "group_member_increase_event"),
+        "group_increase",
+    ),
+    **dict.fromkeys(
+        ("group_decrease", "member_decrease", "group_member_decrease", "group_member_decrease_event"),
+        "group_decrease",
+    ),
+}
+
+# sub_type 别名 -> 统一语义
+SUB_TYPE_ALIASES = {
+    **dict.fromkeys(("join", "approve", "increase", "pass"), "approve"),  # 主动加群/管理员同意
+    **dict.fromkeys(("invite", "invited"), "invite"),
+    **dict.fromkeys(("leave", "quit", "exit"), "leave"),
+    **dict.fromkeys(("kick", "kick_me", "ban"), "kick"),
+}
+
+
+class FieldMap(NamedTuple):
+    """各协议的字段名映射，每项按优先级排列，取第一个非空值"""
+    notice: tuple
+    sub_type: tuple
+    group_id: tuple
+    user_id: tuple
+    operator_id: tuple
+    time: tuple = ("time",)
+
+
+ADAPTERS = {
+    # go-cqhttp/NapCat 等 v11 实现的邀请人/被踢者字段不统一，保留旧版 or 链里的别名
+    "onebot_v11": FieldMap(
+        notice=("notice_type",),
+        sub_type=("sub_type",),
+        group_id=("group_id",),
+        user_id=("user_id", "target_id", "member_id"),
+        operator_id=("operator_id", "inviter_id", "operator_user_id"),
+    ),
+    "napcat": FieldMap(
+        notice=("notice_type",),
+        sub_type=("sub_type",),
+        group_id=("group_id",),
+        user_id=("user_id", "target_id", "member_id"),
+        operator_id=("operator_id", "inviter_id", "operator_user_id"),
+    ),
+    "onebot_v12": FieldMap(
+        notice=("detail_type", "notice_type"),
+        sub_type=("sub_type",),
+        group_id=("group_id",),
+        user_id=("user_id",),
+        operator_id=("operator_id",),
+    ),
+    "lagrange": FieldMap(
+        notice=("notice_type", "event"),
+        sub_type=("subEvent", "sub_type"),
+        group_id=("groupId", "group_id"),
+        user_id=("userId", "member", "user_id"),
+        operator_id=("operatorUid", "inviter", "operator_id"),
+    ),
+    # 兜底：合并所有已知字段名（与旧版 or 链一致）
+    "generic": FieldMap(
+        notice=("notice_type", "event", "detail_type"),
+        sub_type=("sub_type", "subEvent", "extra_type"),
+        group_id=("group_id", "chat_id", "group", "groupId"),
+        user_id=("user_id", "target_id", "member_id", "userId", "member"),
+        operator_id=("operator_id", "inviter_id", "operator_user_id", "operatorUid", "inviter"),
+    ),
+}
+
+
+class Notice(NamedTuple):
+    """归一化后的群成员变动通知"""
+    post_type: str
+    notice_type: str | None
+    sub_type: str | None
+    group_id: str
+    user_id: str
+    operator_id: str
+    time: int
+    adapter: str
+
+
+def notice_post_type(raw: dict) -> str | None:
+    """快速预筛：普通聊天消息在这里第一次取值就被丢弃，不做任何格式化"""
+    post_type = raw.get('post_type') or raw.get('type') or raw.get('notice_type')
+    return post_type if post_type in NOTICE_POST_TYPES else None
+
+
+def _first(raw: dict, keys: tuple):
+    for key in keys:
+        value = raw.get(key)
+        if value:
+            return value
+    return None
+
+
+def detect_adapter(raw: dict, platform: str = "") -> str:
+    """根据载荷字段特征判断协议"""
+    if "detail_type" in raw:
+        return "onebot_v12"
+    if "groupId" in raw or "operatorUid" in raw or "subEvent" in raw:
+        return "lagrange"
+    if "post_type" in raw and "notice_type" in raw:
+        return "napcat" if "napcat" in platform.lower() else "onebot_v11"
+    return "generic"
+
+
+class NoticeNormalizer:
+    """表驱动的通知归一化：每个平台首次识别出协议后缓存对应的字段映射。
+
+    缓存的映射取不到关键字段（群号、通知类型、成员，以及邀请/被踢时的操作者）时退回 generic 映射，
+    不会因协议识别偏差漏记或把邀请记成主动进群。
+    """
+
+    def __init__(self):
+        self._by_platform = {}
+
+    def normalize(self, raw: dict, post_type: str, platform: str = "") -> Notice:
+        name = self._by_platform.get(platform)
+        if name is None:
+            name = self._by_platform[platform] = detect_adapter(raw, platform)
+        notice = self._extract(raw, post_type, name)
+        if name != "generic" and self._incomplete(notice):
+            notice = self._extract(raw, post_type, "generic")
+        return notice
+
+    @staticmethod
+    def _incomplete(notice: Notice) -> bool:
+        if not (notice.group_id and notice.notice_type and notice.user_id):
+            return True
+        return notice.sub_type in ("invite", "kick") and not notice.operator_id
+
+    @staticmethod
+    def _extract(raw: dict, post_type: str, name: str) -> Notice:
+        fields = ADAPTERS[name]
+        notice_type = _first(raw, fields.notice)
+        sub_type = _first(raw, fields.sub_type)
+        group_id = _first(raw, fields.group_id)
+        user_id = _first(raw, fields.user_id)
+        operator_id = _first(raw, fields.operator_id)
+        try:
+            ts = int(_first(raw, fields.time) or 0)
+        except (TypeError, ValueError):
+            ts = 0
+        return Notice(
+            post_type=post_type,
+            notice_type=NOTICE_ALIASES.get(notice_type, notice_type),
+            sub_type=SUB_TYPE_ALIASES.get(sub_type, sub_type),
+            group_id=str(group_id) if group_id is not None else '',
+            user_id=str(user_id) if user_id is not None else '',
+            operator_id=str(operator_id) if operator_id is not None else '',
+            time=ts,
+            adapter=name,
+        )
+
+    def adapters(self) -> dict:
+        """platform -> 已缓存的协议映射名"""
+        return dict(self._by_platform)
+
+
+class DedupWindow:
+    """重放通知去重：适配器重连后会重发入群/退群通知。
+
+    以 (时间, 群, 用户, 通知类型, 子类型) 为事件身份，记住最近 window 秒内见过的事件
+    （最多 max_size 个，按到达顺序淘汰）。通知不带时间戳时无法区分重放与真实的再次进退群，不做去重。
+    """
+
+    def __init__(self, window: float = 600, max_size: int = 4096):
+        self.window = max(0.0, float(window))
+        self.max_size = max(1, int(max_size))
+        self._seen = OrderedDict()  # 事件身份 -> 首次到达时间(monotonic)
+        self.stats = {"checked": 0, "duplicates": 0}
+
+    @staticmethod
+    def key(notice: Notice):
+        if not notice.time:
+            return None
+        return notice.time, notice.group_id, notice.user_id, notice.notice_type, notice.sub_type
+
+    def is_duplicate(self, notice: Notice) -> bool:
+        """首次见到返回 False 并记住；窗口内再次见到返回 True"""
+        if not self.window:
+            return False
+        key = self.key(notice)
+        if key is None:
+            return False
+        self.stats["checked"] += 1
+        now = time.monotonic()
+        seen = self._seen
+        while seen:
+            oldest, at = next(iter(seen.items()))
+            if now - at <= self.window:
+                break
+            del seen[oldest]
+        if key in seen:
+            self.stats["duplicates"] += 1
+            return True
+        seen[key] = now
+        if len(seen) > self.max_size:
+            seen.popitem(last=False)
+        return False
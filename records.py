@@ -0,0 +1,141 @@
+import sys
+from datetime import datetime
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 进群方式编码（持久化时还原为中文）
+JOIN_NONE = 0
+JOIN_INVITE = 1
+JOIN_ACTIVE = 2
+JOIN_TYPE_TEXT = {JOIN_NONE: None, JOIN_INVITE: "邀请", JOIN_ACTIVE: "主动"}
+JOIN_TYPE_CODE = {v: k for k, v in JOIN_TYPE_TEXT.items()}
+
+# 离群方式编码；被踢的操作者单独存在 kicker 字段
+LEAVE_NONE = 0
+LEAVE_SELF = 1
+LEAVE_KICK = 2
+LEAVE_OTHER = 3
+
+
+def intern_id(value) -> str | None:
+    """用户ID统一转 str 并驻留，百万级记录里的重复邀请人/操作者只占一份内存"""
+    if value is None or value == "":
+        return None
+    return sys.intern(str(value))
+
+
+def intern_text(value):
+    """昵称类文本同样驻留：同一邀请人名、与 QQ 号相同的默认昵称只存一份"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def to_epoch(value) -> int:
+    """'YYYY-mm-dd HH:MM:SS' 或数字时间戳 -> 整数秒；无法解析返回 0"""
+    if not value:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.strptime(str(value), TIME_FORMAT).timestamp())
+    except ValueError:
+        return 0
+
+
+def format_epoch(ts: int) -> str | None:
+    return datetime.fromtimestamp(ts).strftime(TIME_FORMAT) if ts else None
+
+
+class MemberRecord:
+    """内存中的紧凑成员记录。
+
+    时间为整数秒时间戳，进群/离群方式为小整数编码，ID 经过驻留；
+    只在持久化边界通过 from_dict()/to_dict() 与原有可读 JSON 结构互转。
+    """
+
+    __slots__ = ("nickname", "inviter", "inviter_name", "join_type", "join_ts", "leave_type", "leave_ts", "kicker")
+
+    def __init__(self, nickname=None, inviter=None, inviter_name=None, join_type=JOIN_NONE, join_ts=0,
+                 leave_type=LEAVE_NONE, leave_ts=0, kicker=None):
+        self.nickname = intern_text(nickname)
+        self.inviter = intern_id(inviter)
+        self.inviter_name = intern_text(inviter_name)
+        self.join_type = join_type
+        self.join_ts = join_ts
+        self.leave_type = leave_type
+        self.leave_ts = leave_ts
+        self.kicker = intern_id(kicker)
+
+    @property
+    def left(self) -> bool:
+        return self.leave_type != LEAVE_NONE
+
+    @property
+    def join_type_text(self) -> str | None:
+        return JOIN_TYPE_TEXT.get(self.join_type)
+
+    @property
+    def join_time(self) -> str | None:
+        return format_epoch(self.join_ts)
+
+    @property
+    def leave_time(self) -> str | None:
+        return format_epoch(self.leave_ts)
+
+    @property
+    def leave_type_text(self) -> str | None:
+        if self.leave_type == LEAVE_SELF:
+            return "自己退群"
+        if self.leave_type == LEAVE_KICK:
+            return f"被踢({self.kicker})" if self.kicker else "被踢"
+        if self.leave_type == LEAVE_OTHER:
+            return "已离群"
+        return None
+
+    def copy(self) -> "MemberRecord":
+        rec = MemberRecord.__new__(MemberRecord)
+        for name in self.__slots__:
+            setattr(rec, name, getattr(self, name))
+        return rec
+
+    def to_dict(self) -> dict:
+        return {
+            "nickname": self.nickname,
+            "inviter": self.inviter,
+            "inviter_name": self.inviter_name,
+            "join_type": self.join_type_text,
+            "join_time": self.join_time,
+            "leave_type": self.leave_type_text,
+            "leave_time": self.leave_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MemberRecord":
+        leave_text = data.get("leave_type") or ""
+        kicker = data.get("kicker")
+        if not leave_text:
+            leave_type = LEAVE_NONE
+        elif leave_text == "自己退群":
+            leave_type = LEAVE_SELF
+        elif leave_text.startswith("被踢"):
+            leave_type = LEAVE_KICK
+            if kicker is None and leave_text.endswith(")") and "(" in leave_text:
+                kicker = leave_text[leave_text.index("(") + 1:-1]
+        else:
+            leave_type = LEAVE_OTHER
+        return cls(
+            nickname=data.get("nickname"),
+            inviter=data.get("inviter"),
+            inviter_name=data.get("inviter_name"),
+            join_type=JOIN_TYPE_CODE.get(data.get("join_type"), JOIN_NONE),
+            join_ts=to_epoch(data.get("join_time")),
+            leave_type=leave_type,
+            leave_ts=to_epoch(data.get("leave_time")),
+            kicker=kicker,
+        )
+
+
+def json_default(obj):
+    """json.dumps 的 default：MemberRecord 落盘时还原为可读结构"""
+    if isinstance(obj, MemberRecord):
+        return obj.to_dict()
+    return str(obj)
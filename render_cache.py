@@ -0,0 +1,68 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+
+class RenderCache:
+    """渲染结果缓存：HTML 正文 + 背景 + 数据版本 -> 图片 URL/文件。
+
+    - 键为内容哈希，相同卡片重复请求只需一次字典查找
+    - 数据版本变化（任何记录写入）时整体失效；不依赖数据的卡片（如奖励说明）传 version=None 不受影响
+    - LRU 限制条目数，ttl 秒后过期（渲染服务返回的远程 URL 可能失效）
+    """
+
+    def __init__(self, max_size: int = 64, ttl: float = 600):
+        self.max_size = max(0, int(max_size))
+        self.ttl = max(0.0, float(ttl))
+        self._entries = OrderedDict()  # key -> (expires_at, result, 是否依赖数据)
+        self._version = None
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def make_key(html_body: str, background: str | None, versioned: bool = True) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(html_body.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update((background or "").encode("utf-8"))
+        digest.update(b"\1" if versioned else b"\0")
+        return digest.hexdigest()
+
+    def _check_version(self, version):
+        if version is not None and version != self._version:
+            if self._version is not None:
+                # 只丢弃依赖数据的条目
+                stale = [k for k, (_, _, versioned) in self._entries.items() if versioned]
+                for key in stale:
+                    del self._entries[key]
+                self.stats["invalidations"] += 1
+            self._version = version
+
+    def get(self, key: str, version=None):
+        if not self.max_size:
+            return None
+        self._check_version(version)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, key: str, result, version=None):
+        if not self.max_size:
+            return
+        self._check_version(version)
+        self._entries[key] = (time.monotonic() + self.ttl, result, version is not None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,125 @@
+import json
+import mmap
+import struct
+import threading
+
+from .records import MemberRecord
+
+# 二进制快照布局：
+#   MAGIC(8) | 头部长度(uint32 LE) | 头部 JSON | 各数据桶正文
+# 头部为 {"v": 1, "buckets": [[ctx_id, 偏移, 长度, 记录数], ...]}，偏移相对正文起点；
+# 数据桶正文是紧凑 JSON 行数组，每行按 ROW_FIELDS 顺序存整数编码后的字段，解码时无需解析时间字符串
+MAGIC = b"ICSNAP1\0"
+VERSION = 1
+_HEADER_LEN = struct.Struct("<I")
+ROW_FIELDS = ("nickname", "inviter", "inviter_name", "join_type", "join_ts", "leave_type", "leave_ts", "kicker")
+
+
+def encode_bucket(bucket: dict) -> bytes:
+    rows = [[uid] + [getattr(rec, name) for name in ROW_FIELDS] for uid, rec in bucket.items()]
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode_bucket(raw) -> dict:
+    return {row[0]: MemberRecord(*row[1:]) for row in json.loads(bytes(raw))}
+
+
+def encode_snapshot(buckets: dict) -> bytes:
+    """buckets: ctx_id -> {user_id: MemberRecord}，或 (已编码正文, 记录数)（未解码的桶原样写回）"""
+    table = []
+    chunks = []
+    offset = 0
+    for ctx_id, bucket in buckets.items():
+        if isinstance(bucket, tuple):
+            body, count = bucket
+        else:
+            body, count = encode_bucket(bucket), len(bucket)
+        table.append([ctx_id, offset, len(body), count])
+        chunks.append(body)
+        offset += len(body)
+    header = json.dumps({"v": VERSION, "buckets": table}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"".join([MAGIC, _HEADER_LEN.pack(len(header)), header, *chunks])
+
+
+class SnapshotReader:
+    """内存映射读取二进制快照：打开时只解析头部，数据桶在首次访问时才解码。
+    压缩时写盘线程按 spans() 取得的区间直接从映射读取正文，映射的读取与关闭由锁保护"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._raw = None  # detach() 后改为 ctx_id -> bytes
+        self._lock = threading.Lock()
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._mm[:len(MAGIC)] != MAGIC:
+                raise ValueError("不是邀请数据快照文件")
+            start = len(MAGIC) + _HEADER_LEN.size
+            (size,) = _HEADER_LEN.unpack_from(self._mm, len(MAGIC))
+            header = json.loads(self._mm[start:start + size])
+            if header.get("v") != VERSION:
+                raise ValueError(f"不支持的快照版本 {header.get('v')}")
+        except Exception:
+            self._mm.close()
+            raise
+        base = start + size
+        # ctx_id -> (起点, 终点, 记录数)
+        self._index = {ctx: (base + off, base + off + length, count) for ctx, off, length, count in header["buckets"]}
+
+    def __contains__(self, ctx_id) -> bool:
+        return ctx_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def ctx_ids(self) -> list:
+        return list(self._index)
+
+    def count(self, ctx_id: str) -> int:
+        return self._index[ctx_id][2]
+
+    def total(self) -> int:
+        return sum(entry[2] for entry in self._index.values())
+
+    def spans(self) -> dict:
+        """尚未解码的数据桶 ctx_id -> (起点, 终点, 记录数)，交给写盘线程用 read() 读取"""
+        return dict(self._index)
+
+    def read(self, start: int, end: int) -> bytes:
+        """在线程中读取映射区间（须在 detach 之前）"""
+        with self._lock:
+            return self._mm[start:end]
+
+    def raw(self, ctx_id: str) -> bytes:
+        start, end, _ = self._index[ctx_id]
+        with self._lock:
+            if self._raw is not None:
+                return self._raw[ctx_id]
+            return self._mm[start:end]
+
+    def pop(self, ctx_id: str) -> dict:
+        """解码并移出数据桶（之后由调用方在内存中维护）"""
+        bucket = decode_bucket(self.raw(ctx_id))
+        self.discard(ctx_id)
+        return bucket
+
+    def discard(self, ctx_id: str):
+        """丢弃数据桶（不解码）"""
+        with self._lock:
+            del self._index[ctx_id]
+            if self._raw is not None:
+                self._raw.pop(ctx_id, None)
+
+    def detach(self):
+        """把尚未解码的正文复制出来并解除映射，之后即可覆盖快照文件（Windows 下映射中的文件不能替换）"""
+        with self._lock:
+            if self._raw is None:
+                self._raw = {ctx: self._mm[start:end] for ctx, (start, end, _) in self._index.items()}
+                self._mm.close()
+
+    def close(self):
+        with self._lock:
+            self._index.clear()
+            self._raw = {}
+            if not self._mm.closed:
+                self._mm.close()
@@ -0,0 +1,1435 @@
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from itertools import islice
+from urllib.parse import quote, unquote
+
+from astrbot.api import logger
+
+from .indexes import InviterIndex
+from .records import MemberRecord, intern_id, json_default
+from .snapshot import SnapshotReader, encode_snapshot
+
+# 成员记录持久化字段（JSON 与 SQLite 共用，内存中为 MemberRecord）
+RECORD_FIELDS = ("nickname", "inviter", "inviter_name", "join_type", "join_time", "leave_type", "leave_time")
+# 旧版扁平结构（顶层直接是 user_id -> 记录）的虚拟上下文 ID
+LEGACY_CTX = ""
+
+
+def is_legacy_item(key, value) -> bool:
+    """顶层 key 为用户ID、value 为成员记录（含 nickname/join_type 的 dict），且 key 不含 ':'"""
+    if not isinstance(key, str) or ":" in key:
+        return False
+    if isinstance(value, MemberRecord):
+        return True
+    return isinstance(value, dict) and ("nickname" in value or "join_type" in value)
+
+
+def aggregate_key(ctx_id: str) -> str | None:
+    """同一平台、同一作用域的数据桶共用的汇总键（如 aiocqhttp:G:）；全局桶与旧版数据不参与汇总"""
+    parts = str(ctx_id).split(":", 2)
+    if len(parts) == 3 and parts[1] in ("G", "U"):
+        return f"{parts[0]}:{parts[1]}:"
+    return None
+
+
+def atomic_write_bytes(path: str, payload: bytes):
+    """临时文件 + fsync + 原子重命名，保证任何时刻磁盘上都是完整文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    # POSIX 下同步目录项，确保重命名本身落盘；Windows 不支持打开目录，忽略
+    try:
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class InviteStore:
+    """邀请数据存储基类（写后合并）。
+
+    变更只调用 mark_dirty() 记一次脏，后台任务按 flush_interval 秒或累计
+    flush_threshold 次变更合并落盘；terminate 时 close() 做最后一次刷写。
+    子类实现记录读写接口与 _prepare_write()：在事件循环线程里取好写时复制的快照，
+    返回的写盘函数（序列化、fsync 等阻塞操作）交给线程池执行，不阻塞事件循环。
+    写盘函数不改动事件循环持有的状态，需要登记的完成信息随返回值带回，由 _write_done() 在事件循环里处理。
+    """
+
+    backend = ""
+
+    def __init__(self, path: str, flush_interval: float = 5.0, flush_threshold: int = 100):
+        self.path = path
+        self.flush_interval = max(0.1, float(flush_interval))
+        self.flush_threshold = max(1, int(flush_threshold))
+        self._dirty = 0
+        self._wakeup = None
+        self._task = None
+        self._closing = False
+        self._flush_lock = asyncio.Lock()
+        # ctx_id -> InviterIndex，首次访问时构建一次，之后随写入增量维护
+        self._indexes = {}
+        # 汇总键 -> InviterIndex：同平台同作用域所有数据桶的邀请人汇总，被邀请人以 (ctx_id, user_id) 为键
+        self._platform_indexes = {}
+        # 可选回调 ctx_id -> bool：返回 False 的数据桶（已被重置的旧轮次）不计入跨桶汇总
+        self.live_ctx = None
+        # 可选的冷数据层（见 coldtier.ColdTier）：已归档成员只以汇总人数计入邀请人索引
+        self.cold = None
+        # 每次落盘后回调 (耗时毫秒, 写入字节数)，供性能指标统计
+        self.on_flush = None
+        # 写放大统计：mutations / flushes 即平均每次落盘合并的变更数
+        self.stats = {
+            "mutations": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "bytes_written": 0,
+            "last_flush_ms": 0.0,
+            "last_flush_at": None,
+        }
+
+    # ==== 记录接口 ====
+    def load(self):
+        raise NotImplementedError
+
+    def count_records(self) -> int:
+        raise NotImplementedError
+
+    def has_ctx(self, ctx_id: str) -> bool:
+        raise NotImplementedError
+
+    def get_record(self, ctx_id: str, user_id: str) -> MemberRecord | None:
+        """返回记录（只读视图，修改请用 put_record/update_record）"""
+        raise NotImplementedError
+
+    def put_record(self, ctx_id: str, user_id: str, record: MemberRecord, reason: str = ""):
+        """写入整条记录；reason 为归一化事件名（join/leave/kick/reset/...），用于审计日志"""
+        raise NotImplementedError
+
+    def update_record(self, ctx_id: str, user_id: str, reason: str = "", **fields) -> bool:
+        """更新已有记录的部分字段（MemberRecord 属性名），记录不存在返回 False"""
+        raise NotImplementedError
+
+    def delete_record(self, ctx_id: str, user_id: str, reason: str = ""):
+        raise NotImplementedError
+
+    def iter_records(self, ctx_id: str):
+        """遍历 (user_id, MemberRecord)"""
+        raise NotImplementedError
+
+    def ctx_ids(self) -> list:
+        """所有数据桶 ID（不含旧版扁平数据）"""
+        raise NotImplementedError
+
+    def drop_ctx(self, ctx_id: str, reason: str = ""):
+        """整体删除一个数据桶（只记一条日志，不逐条删除）"""
+        raise NotImplementedError
+
+    def records_by_inviter(self, ctx_id: str, inviter: str) -> list:
+        stats = self.inviter_stats(ctx_id, inviter)
+        if stats is None:
+            return []
+        return [(uid, self.get_record(ctx_id, uid)) for uid in stats.invitees]
+
+    # ==== 邀请人索引 ====
+    def inviter_index(self, ctx_id: str) -> InviterIndex:
+        index = self._indexes.get(ctx_id)
+        if index is None:
+            index = self._indexes[ctx_id] = InviterIndex.build(self.iter_records(ctx_id))
+            if self.cold is not None:
+                self.cold.apply(ctx_id, index)
+        return index
+
+    def inviter_stats(self, ctx_id: str, inviter: str):
+        return self.inviter_index(ctx_id).get(inviter)
+
+    def platform_index(self, ctx_id: str) -> InviterIndex | None:
+        """ctx_id 所属平台与作用域的跨桶汇总索引（见 aggregate_key），首次访问时遍历各桶构建一次，
+        之后与单桶索引一样随写入增量维护；全局桶/旧版数据返回 None"""
+        key = aggregate_key(ctx_id)
+        if key is None:
+            return None
+        index = self._platform_indexes.get(key)
+        if index is None:
+            index = InviterIndex(with_tree=False)
+            for ctx in self.ctx_ids():
+                if ctx.startswith(key) and (self.live_ctx is None or self.live_ctx(ctx)):
+                    for uid, rec in self.iter_records(ctx):
+                        index.add((ctx, uid), rec)
+            if self.cold is not None:
+                # 全部成员都已归档的数据桶不在 ctx_ids() 中，按冷层的数据桶单独计入
+                for ctx in self.cold.ctx_ids():
+                    if ctx.startswith(key) and (self.live_ctx is None or self.live_ctx(ctx)):
+                        self.cold.apply(ctx, index)
+            self._platform_indexes[key] = index
+        return index
+
+    def _indexed(self, ctx_id: str) -> bool:
+        """该数据桶的写入是否需要维护索引（单桶索引或汇总索引已构建），有归档成员的桶也需登记重新入群"""
+        return ctx_id in self._indexes or (
+            bool(self._platform_indexes) and aggregate_key(ctx_id) in self._platform_indexes
+        ) or (self.cold is not None and self.cold.has(ctx_id))
+
+    def _reindex(self, ctx_id: str, user_id: str, old: dict | None, new: dict | None):
+        """写记录后调用：索引已构建时按旧减新加更新"""
+        user_id = str(user_id)
+        if (
+            new is not None and new.join_ts and (old is None or old.join_ts != new.join_ts)
+            and self.cold is not None and self.cold.has(ctx_id)
+        ):
+            # 有归档的数据桶里有成员入群：可能是已归档的成员重新入群，登记后由后台查归档作废旧记录（见 revive_record）
+            self.cold.note_rejoin(ctx_id, user_id)
+        index = self._indexes.get(ctx_id)
+        if index is not None:
+            index.remove(user_id, old)
+            index.add(user_id, new)
+        index = self._aggregate_index(ctx_id)
+        if index is not None:
+            index.remove((ctx_id, user_id), old)
+            index.add((ctx_id, user_id), new)
+
+    def archive_record(self, ctx_id: str, user_id: str, record: MemberRecord):
+        """把记录移入冷数据层：热数据删除该记录，其对邀请人计数的贡献改由冷层汇总人数承担。
+        调用前整条记录须已写入冷层归档文件（ColdTier.append）"""
+        self.delete_record(ctx_id, user_id, reason="archive")
+        self._archived(ctx_id, self.cold.add(ctx_id, record), 1)
+
+    def revive_record(self, ctx_id: str, record: MemberRecord):
+        """已归档的成员重新入群后作废其归档记录：以热数据为准，冷层汇总不再计入这一人。
+        调用前作废行须已写入冷层归档文件（ColdTier.append(..., drop=True)）"""
+        key = self.cold.remove(ctx_id, record)
+        if key is not None:
+            self._archived(ctx_id, key, -1)
+
+    def _archived(self, ctx_id: str, key: tuple, sign: int):
+        """冷层汇总人数增减后同步已构建的单桶索引与汇总索引；key 为 (邀请人, 进群日, 离群方式)"""
+        for index in (self._indexes.get(ctx_id), self._aggregate_index(ctx_id)):
+            if index is None:
+                continue
+            if sign > 0:
+                index.add_archived(*key)
+            else:
+                index.remove_archived(*key)
+
+    def _aggregate_index(self, ctx_id: str) -> InviterIndex | None:
+        """ctx_id 所属的已构建汇总索引；不属于当前轮次的数据桶（已重置的旧轮次）不计入汇总"""
+        if not self._platform_indexes or (self.live_ctx is not None and not self.live_ctx(ctx_id)):
+            return None
+        return self._platform_indexes.get(aggregate_key(ctx_id))
+
+    def _drop_indexes(self):
+        self._indexes.clear()
+        self._platform_indexes.clear()
+
+    def forget_indexes(self, ctx_id: str):
+        """数据桶整体被删除或不再属于当前轮次时调用：丢弃其单桶索引与所属汇总索引（下次访问时重建）"""
+        self._indexes.pop(ctx_id, None)
+        self._platform_indexes.pop(aggregate_key(ctx_id), None)
+
+    def set_nicknames(self, ctx_id: str, names: dict) -> int:
+        """批量刷新已入库成员的昵称，返回实际变化条数"""
+        changed = 0
+        for uid, name in names.items():
+            rec = self.get_record(ctx_id, uid)
+            if rec is not None and rec.nickname != name:
+                self.update_record(ctx_id, uid, "nickname", nickname=name)
+                changed += 1
+        return changed
+
+    def legacy_records(self) -> dict:
+        return dict(self.iter_records(LEGACY_CTX))
+
+    def legacy_count(self) -> int:
+        return sum(1 for _ in self.iter_records(LEGACY_CTX))
+
+    def legacy_chunk(self, offset: int, limit: int) -> list:
+        """按存储顺序取第 offset 条起的至多 limit 条旧版扁平记录 [(user_id, MemberRecord)]，供分批迁移"""
+        return list(islice(self.iter_records(LEGACY_CTX), offset, offset + limit))
+
+    def clear_all(self, reason: str = ""):
+        raise NotImplementedError
+
+    def audit_trail(self, user_id: str, limit: int = 20) -> list:
+        """返回与该用户（被邀请人/邀请人/操作者）相关的最近事件，不支持的后端返回空"""
+        return []
+
+    # ==== 写后合并 ====
+    @property
+    def version(self) -> int:
+        """数据版本号：每次变更递增，渲染缓存等据此判断数据是否变化"""
+        return self.stats["mutations"]
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty > 0
+
+    def mark_dirty(self, count: int = 1):
+        """登记变更，由后台任务合并落盘"""
+        self._dirty += count
+        self.stats["mutations"] += count
+        if self._wakeup is not None and self._dirty >= self.flush_threshold:
+            self._wakeup.set()
+
+    def _prepare_write(self):
+        """在事件循环线程调用：准备好本次要落盘的数据，返回无参写盘函数。
+        写盘函数返回写入字节数，或 (写入字节数, 完成信息)"""
+        raise NotImplementedError
+
+    def _write_done(self, done):
+        """在事件循环线程调用：登记写盘函数带回的完成信息"""
+
+    def flush(self) -> bool:
+        """同步落盘（阻塞当前线程）；无脏数据时直接返回。平时由后台任务调用 flush_async"""
+        if not self._dirty:
+            return True
+        pending = self._dirty
+        started = time.perf_counter()
+        try:
+            written, done, cold = self._write_job()()
+        except Exception as e:
+            self.stats["flush_errors"] += 1
+            logger.error(f"保存邀请数据失败：{e}")
+            return False
+        self._flushed(pending, written, started, done, cold)
+        return True
+
+    async def flush_async(self) -> bool:
+        """异步落盘：快照在事件循环里取，序列化与文件 I/O 在线程池执行"""
+        if not self._dirty:
+            return True
+        async with self._flush_lock:
+            if not self._dirty:
+                return True
+            pending = self._dirty
+            started = time.perf_counter()
+            try:
+                job = self._write_job()
+                written, done, cold = await asyncio.to_thread(job)
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                logger.error(f"保存邀请数据失败：{e}")
+                return False
+            self._flushed(pending, written, started, done, cold)
+            return True
+
+    def _write_job(self):
+        """本次落盘的写盘函数，返回 (写入字节数, 完成信息, 冷层结果)；冷数据层有变更时其索引紧随存储数据一起写入，
+        冷层结果为 (版本号, 异常或 None)，无需写冷层时为 None"""
+        job = self._prepare_write()
+        cold_job, cold_version = self.cold.save_job() if self.cold is not None and self.cold.dirty else (None, None)
+
+        def write():
+            result = job()
+            written, done = result if isinstance(result, tuple) else (result, None)
+            if cold_job is None:
+                return written, done, None
+            # 存储数据已写入，冷层索引写失败不影响其完成信息的登记，只把异常带回事件循环
+            try:
+                written += cold_job()
+            except Exception as e:
+                return written, done, (cold_version, e)
+            return written, done, (cold_version, None)
+        return write
+
+    def _flushed(self, pending: int, written: int, started: float, done=None, cold=None):
+        # 写盘期间可能又有新变更，只扣除本次已写入的部分
+        self._dirty = max(0, self._dirty - pending)
+        if done is not None:
+            self._write_done(done)
+        if cold is not None:
+            version, error = cold
+            if error is None:
+                self.cold.saved(version)
+            else:
+                # 冷层保持待保存，并重新记脏，由下次落盘重试
+                self.stats["flush_errors"] += 1
+                logger.error(f"[invite] 保存冷数据索引失败，将随下次落盘重试：{error}")
+                self.mark_dirty()
+        self.stats["flushes"] += 1
+        self.stats["bytes_written"] += written
+        self.stats["last_flush_ms"] = (time.perf_counter() - started) * 1000
+        self.stats["last_flush_at"] = time.time()
+        if self.on_flush is not None:
+            self.on_flush(self.stats["last_flush_ms"], written)
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._dirty and not self._closing:
+                await self.flush_async()
+
+    async def close(self):
+        """停止后台任务（等待进行中的写盘完成）并做最终刷写"""
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush_async()
+
+
+class EventJournal:
+    """追加写事件日志：每次变更一行紧凑 JSON。
+
+    日志按段写入：第 0 段为 path 本身，之后为 path.1、path.2……。快照压缩时事件循环只关闭当前段、
+    切换到下一段（之后的变更写入新段），旧段在写盘线程里 fsync 后并入 .sealed；
+    快照落盘后封存日志整体追加进 gzip 审计归档（多成员 gzip 可直接续写）；
+    归档只追加不改写，用于追溯“谁邀请了谁”。
+    """
+
+    def __init__(self, path: str, archive_path: str):
+        self.path = path
+        self.sealed_path = f"{path}.sealed"
+        self.archive_path = archive_path
+        self.entries = 0
+        self.bytes_pending = 0
+        self._fp = None
+        self._seq = 0
+        self.active = path
+
+    def _segment_path(self, seq: int) -> str:
+        return self.path if not seq else f"{self.path}.{seq}"
+
+    def _segments(self, below: int | None = None) -> list:
+        """磁盘上已有的日志段 [(段号, 路径)]，按段号排序；below 只取段号更小的"""
+        folder = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        found = [(0, self.path)] if os.path.exists(self.path) else []
+        try:
+            names = os.listdir(folder)
+        except FileNotFoundError:
+            names = []
+        for name in names:
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                found.append((int(name[len(prefix):]), os.path.join(folder, name)))
+        found.sort()
+        return [item for item in found if below is None or item[0] < below]
+
+    def files(self) -> list:
+        """尚未并入审计归档的日志文件（封存日志与各日志段）"""
+        paths = [self.sealed_path] if os.path.exists(self.sealed_path) else []
+        return paths + [path for _, path in self._segments()]
+
+    def replay(self):
+        """逐条读出日志（先封存日志、再按段号读各日志段）；日志记录的是整条记录，重复重放结果不变"""
+        # 上次压缩未完成（快照可能已写、也可能没写），封存日志需要重放
+        yield from self._replay_file(self.sealed_path)
+        segments = self._segments()
+        for _, path in segments:
+            yield from self._replay_file(path)
+        # 之后的追加接在最新一段后面
+        if segments:
+            self._seq = segments[-1][0]
+            self.active = segments[-1][1]
+
+    def _replay_file(self, path: str):
+        """崩溃时可能残留半行，重放后截掉不完整的尾部，避免与后续追加粘连"""
+        if not os.path.exists(path):
+            return
+        good_end = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("[invite] 事件日志存在损坏的行，已忽略")
+                    good_end += len(line)
+                    continue
+                good_end += len(line)
+                self.entries += 1
+                yield entry
+        if good_end < os.path.getsize(path):
+            logger.warning("[invite] 事件日志尾部不完整（上次可能异常退出），已截断")
+            with open(path, "r+b") as f:
+                f.truncate(good_end)
+
+    def append(self, entry: dict):
+        if self._fp is None:
+            self._fp = open(self.active, "a", encoding="utf-8")
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=json_default) + "\n"
+        self._fp.write(line)
+        self.entries += 1
+        self.bytes_pending += len(line.encode("utf-8"))
+
+    def sync_job(self):
+        """在事件循环线程把缓冲交给系统，返回在线程里执行的 fsync 函数（返回落盘字节数）"""
+        written, self.bytes_pending = self.bytes_pending, 0
+        if self._fp is None:
+            return lambda: written
+        self._fp.flush()
+        fd = self._fp.fileno()
+
+        def job():
+            try:
+                os.fsync(fd)
+            except OSError:
+                # 期间日志已被封存关闭，封存时已做过 flush
+                pass
+            return written
+        return job
+
+    def seal(self):
+        """在事件循环线程调用：关闭当前日志段并切换到下一段，之后的追加写入新段。
+        返回在写盘线程里执行的函数：把新段之前的各段按顺序 fsync 并入 .sealed（须在写快照之前执行）"""
+        self.close()
+        self.entries = 0
+        self.bytes_pending = 0
+        self._seq += 1
+        self.active = self._segment_path(self._seq)
+        upto = self._seq
+
+        def job():
+            # 也会收走之前某次失败后残留的旧段，封存日志始终是按段号排列的前缀
+            for _, path in self._segments(below=upto):
+                self._seal_file(path)
+        return job
+
+    def _seal_file(self, path: str):
+        if not os.path.getsize(path):
+            os.remove(path)
+            return
+        if os.path.exists(self.sealed_path):
+            # 上一次封存的日志还没归档（归档失败），接在其后
+            with open(path, "rb") as src, open(self.sealed_path, "ab") as dst:
+                while chunk := src.read(1 << 20):
+                    dst.write(chunk)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(path)
+        else:
+            with open(path, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(path, self.sealed_path)
+
+    def archive_sealed(self) -> int:
+        """快照已落盘后调用（可在线程里执行，只动文件）：封存日志并入审计归档后删除，返回并入的字节数"""
+        if not os.path.exists(self.sealed_path):
+            return 0
+        archived = 0
+        with open(self.sealed_path, "rb") as src, gzip.open(self.archive_path, "ab") as dst:
+            while chunk := src.read(1 << 20):
+                dst.write(chunk)
+                archived += len(chunk)
+        os.remove(self.sealed_path)
+        return archived
+
+    def search(self, user_id: str, limit: int = 20) -> list:
+        """在审计归档与当前日志中查找与 user_id 相关的事件（按时间倒序取最近 limit 条）"""
+        user_id = str(user_id)
+        needle = f'"{user_id}"'
+        hits = []
+
+        def scan(lines):
+            for line in lines:
+                if needle not in line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                rec = entry.get("rec") or entry.get("f") or {}
+                if user_id in (entry.get("uid"), rec.get("inviter")):
+                    hits.append(entry)
+                    if len(hits) > limit:
+                        del hits[0]
+
+        if os.path.exists(self.archive_path):
+            try:
+                with gzip.open(self.archive_path, "rt", encoding="utf-8") as f:
+                    scan(f)
+            except (OSError, EOFError) as e:
+                logger.warning(f"[invite] 读取审计归档失败：{e}")
+        if self._fp is not None:
+            self._fp.flush()
+        for path in self.files():
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    scan(f)
+            except FileNotFoundError:
+                continue
+        return hits[::-1]
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+
+class JsonStore(InviteStore):
+    """整库常驻内存，快照 + 事件日志，变更追加到事件日志。
+
+    每次事件只追加一行日志（O(1)），写后合并任务只做 fsync；日志条数达到
+    compact_threshold 或插件卸载时才重写快照并压缩日志。启动时先读快照再重放日志。
+    记录写时复制（更新时替换为新对象），快照只需浅拷贝各数据桶即可交给线程序列化。
+
+    快照格式 snapshot_format=binary 时写 invitecount.snap（见 snapshot.py）：启动时内存映射，
+    只解析头部，各数据桶首次访问时才解码，未访问过的桶压缩时按原始字节写回；
+    snapshot_format=json 时写可读的 invitecount.json。启动时读取两者中较新的一个，
+    可随时用 export_json() 导出 JSON 作为交换格式。
+    """
+
+    backend = "json"
+
+    def __init__(self, path: str, flush_interval: float = 5.0, flush_threshold: int = 100,
+                 compact_threshold: int = 5000, snapshot_format: str = "binary"):
+        super().__init__(path, flush_interval, flush_threshold)
+        self.compact_threshold = max(1, int(compact_threshold))
+        self.snapshot_format = "json" if str(snapshot_format).lower() == "json" else "binary"
+        self.data = {}
+        base = os.path.splitext(path)[0]
+        self.snap_path = f"{base}.snap"
+        self._lazy = None  # SnapshotReader：尚未解码的数据桶
+        self._retired = []  # 已不再使用、等写盘结束后关闭的 SnapshotReader
+        self.journal = EventJournal(f"{base}.journal.jsonl", f"{base}.audit.jsonl.gz")
+        self.stats["snapshots"] = 0
+        self.stats["archived_bytes"] = 0
+        self.stats["replayed"] = 0
+        self.stats["lazy_decoded"] = 0
+
+    def _snapshot_source(self) -> str | None:
+        """返回较新的快照文件：二进制快照或 JSON（手动替换过的 JSON 较新时以它为准）"""
+        try:
+            snap_mtime = os.stat(self.snap_path).st_mtime_ns
+        except OSError:
+            return self.path if os.path.exists(self.path) else None
+        try:
+            json_mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self.snap_path
+        return self.path if json_mtime > snap_mtime else self.snap_path
+
+    def load(self) -> dict:
+        source = self._snapshot_source()
+        if source == self.snap_path:
+            try:
+                self._lazy = SnapshotReader(self.snap_path)
+                # 旧版扁平数据直接挂在顶层，启动时即解码（通常很少）
+                if LEGACY_CTX in self._lazy:
+                    self.data.update(self._lazy.pop(LEGACY_CTX))
+            except Exception as e:
+                logger.error(f"加载邀请数据快照失败：{e}")
+                self._lazy = None
+                self.data = {}
+        elif source is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = self._decode(json.load(f))
+            except Exception as e:
+                logger.error(f"加载邀请数据失败：{e}")
+                self.data = {}
+        for entry in self.journal.replay():
+            self._apply(entry)
+        self.stats["replayed"] = self.journal.entries
+        if self.journal.entries:
+            # 重放出的变更尚未进入快照
+            self._dirty += self.journal.entries
+            logger.info(f"[invite] 已重放事件日志 {self.journal.entries} 条")
+        # 加载时一次性建好各数据桶的邀请人索引
+        for ctx_id, bucket in self.data.items():
+            if not is_legacy_item(ctx_id, bucket) and isinstance(bucket, dict):
+                self.inviter_index(ctx_id)
+        return self.data
+
+    @staticmethod
+    def _decode(raw: dict) -> dict:
+        """持久化结构 -> 内存结构（记录转为 MemberRecord，ID 驻留）"""
+        data = {}
+        for key, value in raw.items():
+            if is_legacy_item(key, value):
+                data[intern_id(key)] = MemberRecord.from_dict(value)
+            elif isinstance(value, dict):
+                data[key] = {
+                    intern_id(uid): MemberRecord.from_dict(rec)
+                    for uid, rec in value.items() if isinstance(rec, dict)
+                }
+        return data
+
+    def _log(self, op: str, ctx_id: str, user_id=None, reason: str = "", **extra):
+        entry = {"ts": int(time.time()), "op": op, "ev": reason, "ctx": ctx_id}
+        if user_id is not None:
+            entry["uid"] = str(user_id)
+        entry.update(extra)
+        self.journal.append(entry)
+        self.mark_dirty()
+
+    def _apply(self, entry: dict):
+        """重放单条日志（不再写日志）"""
+        op = entry.get("op")
+        ctx_id = entry.get("ctx", LEGACY_CTX)
+        uid = entry.get("uid")
+        if op == "put":
+            self._bucket(ctx_id, create=True)[intern_id(uid)] = MemberRecord.from_dict(entry.get("rec") or {})
+        elif op == "set":
+            rec = self.get_record(ctx_id, uid)
+            if rec is not None:
+                self._bucket(ctx_id)[uid] = MemberRecord.from_dict({**rec.to_dict(), **(entry.get("f") or {})})
+        elif op == "del":
+            self._bucket(ctx_id).pop(uid, None)
+        elif op == "drop":
+            self._drop(ctx_id)
+        elif op == "clear":
+            self._clear()
+
+    def _bucket(self, ctx_id: str, create: bool = False) -> dict:
+        # 旧版扁平数据直接挂在顶层
+        if ctx_id == LEGACY_CTX:
+            return self.data
+        bucket = self.data.get(ctx_id)
+        if bucket is None and self._lazy is not None and ctx_id in self._lazy:
+            bucket = self.data[ctx_id] = self._lazy.pop(ctx_id)
+            self.stats["lazy_decoded"] += 1
+        if bucket is None and create:
+            bucket = self.data[ctx_id] = {}
+        return bucket if isinstance(bucket, dict) else {}
+
+    def iter_buckets(self):
+        """遍历 (ctx_id, 数据桶)，不含旧版扁平数据；未解码的桶会在此解码"""
+        if self._lazy is not None:
+            for ctx_id in self._lazy.ctx_ids():
+                self._bucket(ctx_id)
+            # 进行中的压缩可能还在读它的映射，写盘结束后再关闭
+            self._retired.append(self._lazy)
+            self._lazy = None
+        for key, value in list(self.data.items()):
+            if isinstance(value, dict):
+                yield key, value
+
+    def count_records(self) -> int:
+        total = sum(1 if is_legacy_item(k, v) else len(v) for k, v in self.data.items())
+        return total + (self._lazy.total() if self._lazy is not None else 0)
+
+    def has_ctx(self, ctx_id: str) -> bool:
+        return isinstance(self.data.get(ctx_id), dict) or (self._lazy is not None and ctx_id in self._lazy)
+
+    def get_record(self, ctx_id, user_id):
+        rec = self._bucket(ctx_id).get(str(user_id))
+        return rec if isinstance(rec, MemberRecord) else None
+
+    def put_record(self, ctx_id, user_id, record, reason=""):
+        bucket = self._bucket(ctx_id, create=True)
+        user_id = intern_id(user_id)
+        old = bucket.get(user_id)
+        bucket[user_id] = record
+        self._reindex(ctx_id, user_id, old, record)
+        self._log("put", ctx_id, user_id, reason, rec=record)
+
+    def update_record(self, ctx_id, user_id, reason="", **fields):
+        rec = self.get_record(ctx_id, user_id)
+        if rec is None:
+            return False
+        # 写时复制：旧对象可能正被写盘线程序列化，不能原地修改
+        old, rec = rec, rec.copy()
+        for name, value in fields.items():
+            setattr(rec, name, value)
+        self._bucket(ctx_id)[intern_id(user_id)] = rec
+        self._reindex(ctx_id, user_id, old, rec)
+        # 日志记录更新后的整条记录，重放时无需再解析字段差异
+        self._log("put", ctx_id, user_id, reason, rec=rec)
+        return True
+
+    def delete_record(self, ctx_id, user_id, reason=""):
+        old = self._bucket(ctx_id).pop(str(user_id), None)
+        if old is not None:
+            self._reindex(ctx_id, user_id, old, None)
+            self._log("del", ctx_id, user_id, reason)
+
+    def iter_records(self, ctx_id):
+        bucket = self._bucket(ctx_id)
+        for uid, rec in list(bucket.items()):
+            if isinstance(rec, MemberRecord):
+                yield uid, rec
+
+    def legacy_count(self):
+        return sum(1 for v in self.data.values() if isinstance(v, MemberRecord))
+
+    def legacy_chunk(self, offset, limit):
+        # 直接遍历顶层字典，不像 iter_records 那样先复制整个列表
+        items = ((k, v) for k, v in self.data.items() if isinstance(v, MemberRecord))
+        return list(islice(items, offset, offset + limit))
+
+    def ctx_ids(self):
+        ids = [k for k, v in self.data.items() if isinstance(v, dict)]
+        return ids + (self._lazy.ctx_ids() if self._lazy is not None else [])
+
+    def _clear(self):
+        self.data.clear()
+        self._drop_indexes()
+        if self._lazy is not None:
+            self._retired.append(self._lazy)
+            self._lazy = None
+
+    def _drop(self, ctx_id: str):
+        self.data.pop(ctx_id, None)
+        if self._lazy is not None and ctx_id in self._lazy:
+            self._lazy.discard(ctx_id)
+        self.forget_indexes(ctx_id)
+
+    def drop_ctx(self, ctx_id, reason=""):
+        if ctx_id != LEGACY_CTX and self.has_ctx(ctx_id):
+            self._drop(ctx_id)
+            self._log("drop", ctx_id, reason=reason)
+
+    def clear_all(self, reason=""):
+        self._clear()
+        self._log("clear", "", reason=reason)
+
+    def audit_trail(self, user_id, limit=20):
+        return self.journal.search(user_id, limit)
+
+    def _prepare_write(self):
+        if self.journal.entries < self.compact_threshold:
+            return self.journal.sync_job()
+        return self._compact_job()
+
+    def _compact_job(self):
+        """封存日志并浅拷贝数据（写时复制，记录对象不会再被修改），返回线程里执行的快照写盘函数"""
+        if self.snapshot_format == "json":
+            return self._json_compact_job()
+        seal = self.journal.seal()
+        buckets = {}
+        legacy = {k: v for k, v in self.data.items() if isinstance(v, MemberRecord)}
+        if legacy:
+            buckets[LEGACY_CTX] = legacy
+        buckets.update((k, dict(v)) for k, v in self.data.items() if isinstance(v, dict))
+        # 未访问过的桶无需解码：事件循环只取区间，写盘线程从仍在映射的旧快照读出原始字节写回
+        reader = self._lazy
+        spans = reader.spans() if reader is not None else {}
+
+        def job():
+            seal()
+            for ctx_id, (start, end, count) in spans.items():
+                buckets[ctx_id] = (reader.read(start, end), count)
+            if reader is not None and os.name == "nt":
+                # Windows 下映射中的文件不能替换，先把未解码的正文复制出来再解除映射
+                reader.detach()
+            payload = encode_snapshot(buckets)
+            atomic_write_bytes(self.snap_path, payload)
+            archived = self.journal.archive_sealed()
+            # 映射新快照，由事件循环换下旧的（_write_done）
+            fresh = SnapshotReader(self.snap_path) if reader is not None else None
+            return len(payload), (archived, reader, fresh)
+        return job
+
+    def _json_snapshot(self) -> dict:
+        # JSON 快照需要全部数据桶
+        for _ in self.iter_buckets():
+            pass
+        return {k: dict(v) if isinstance(v, dict) else v for k, v in self.data.items()}
+
+    def _json_compact_job(self):
+        seal = self.journal.seal()
+        snapshot = self._json_snapshot()
+
+        def job():
+            seal()
+            payload = json.dumps(
+                snapshot, ensure_ascii=False, separators=(",", ":"), default=json_default
+            ).encode("utf-8")
+            atomic_write_bytes(self.path, payload)
+            # 二进制快照已过期，删除以免下次启动误读
+            if os.path.exists(self.snap_path):
+                os.remove(self.snap_path)
+            return len(payload), (self.journal.archive_sealed(), None, None)
+        return job
+
+    def _write_done(self, done):
+        """快照写盘函数带回 (并入审计归档的字节数, 压缩时的快照读取器, 新快照的读取器)"""
+        archived, reader, fresh = done
+        self.stats["snapshots"] += 1
+        self.stats["archived_bytes"] += archived
+        if fresh is not None:
+            if reader is not None and self._lazy is reader:
+                # 写盘期间已解码或删除的桶以内存为准，新映射里只留仍未解码的
+                for ctx_id in fresh.ctx_ids():
+                    if ctx_id not in reader:
+                        fresh.discard(ctx_id)
+                self._lazy = fresh
+                self._retired.append(reader)
+            else:
+                fresh.close()
+        for retired in self._retired:
+            retired.close()
+        self._retired.clear()
+
+    def export_json(self, path: str | None = None):
+        """返回把当前数据导出为可读 JSON 的写盘函数（交给线程执行），默认导出到 invitecount.json 同目录"""
+        path = path or os.path.splitext(self.path)[0] + ".export.json"
+        snapshot = self._json_snapshot()
+
+        def job():
+            payload = json.dumps(snapshot, ensure_ascii=False, indent=2, default=json_default).encode("utf-8")
+            atomic_write_bytes(path, payload)
+            return path
+        return job
+
+    def compact(self) -> int:
+        """同步重写快照并把日志并入审计归档"""
+        written, done = self._compact_job()()
+        self._write_done(done)
+        return written
+
+    async def close(self):
+        await super().close()
+        # 卸载时压缩日志，下次启动无需重放
+        if self.journal.entries or self.journal.files() or self._needs_format_switch():
+            async with self._flush_lock:
+                try:
+                    _, done = await asyncio.to_thread(self._compact_job())
+                    self._write_done(done)
+                except Exception as e:
+                    logger.error(f"保存邀请数据快照失败：{e}")
+        self.journal.close()
+        for reader in self._retired + [self._lazy]:
+            if reader is not None:
+                reader.close()
+        self._retired.clear()
+
+    def _needs_format_switch(self) -> bool:
+        """快照格式与配置不一致时（切换了 snapshot_format），卸载时按新格式重写"""
+        source = self._snapshot_source()
+        target = self.path if self.snapshot_format == "json" else self.snap_path
+        return source is not None and source != target
+
+
+class SqliteStore(InviteStore):
+    """SQLite 后端：按 (ctx_id, user_id) 主键存储，(ctx_id, inviter) 与 (ctx_id, join_time) 建索引。
+
+    变更直接写入连接上的未提交事务，后台任务按写后合并策略批量 commit。
+    首次启动时若库为空且存在旧 invitecount.json，则一次性导入。
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, flush_interval: float = 5.0, flush_threshold: int = 100,
+                 import_from: str | None = None):
+        super().__init__(path, flush_interval, flush_threshold)
+        self.import_from = import_from
+        self.conn = None
+
+    def load(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS invite_records (
+                ctx_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                nickname TEXT,
+                inviter TEXT,
+                inviter_name TEXT,
+                join_type TEXT,
+                join_time TEXT,
+                leave_type TEXT,
+                leave_time TEXT,
+                PRIMARY KEY (ctx_id, user_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_invite_inviter ON invite_records (ctx_id, inviter);
+            CREATE INDEX IF NOT EXISTS idx_invite_join_time ON invite_records (ctx_id, join_time);
+            CREATE TABLE IF NOT EXISTS invite_meta (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        self.conn.commit()
+        self._import_json_once()
+
+    def _import_json_once(self):
+        if not self.import_from:
+            return
+        source = JsonStore(self.import_from)
+        if source._snapshot_source() is None:
+            return
+        row = self.conn.execute("SELECT value FROM invite_meta WHERE key='json_imported'").fetchone()
+        if row:
+            return
+        # 经 JsonStore 读取：二进制快照、JSON 与未压缩的事件日志都会包含在内
+        try:
+            source.load()
+        except Exception as e:
+            logger.error(f"[invite] 导入旧 JSON 数据失败：{e}")
+            return
+        finally:
+            source.journal.close()
+        rows = [self._row(LEGACY_CTX, uid, rec.to_dict()) for uid, rec in source.iter_records(LEGACY_CTX)]
+        for ctx_id, bucket in source.iter_buckets():
+            rows.extend(self._row(ctx_id, uid, rec.to_dict()) for uid, rec in bucket.items())
+        with self.conn:
+            self.conn.executemany(self._UPSERT, rows)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO invite_meta (key, value) VALUES ('json_imported', ?)",
+                (self.import_from,),
+            )
+        logger.info(f"[invite] 已从 {self.import_from} 导入 {len(rows)} 条记录到 SQLite")
+
+    _UPSERT = (
+        "INSERT OR REPLACE INTO invite_records (ctx_id, user_id, "
+        + ", ".join(RECORD_FIELDS) + ") VALUES (?, ?, " + ", ".join("?" * len(RECORD_FIELDS)) + ")"
+    )
+    _COLUMNS = "user_id, " + ", ".join(RECORD_FIELDS)
+
+    @staticmethod
+    def _row(ctx_id, user_id, record):
+        if isinstance(record, MemberRecord):
+            record = record.to_dict()
+        return (ctx_id, str(user_id), *(
+            None if record.get(k) is None else str(record.get(k)) for k in RECORD_FIELDS
+        ))
+
+    @staticmethod
+    def _record(row) -> tuple:
+        return intern_id(row[0]), MemberRecord.from_dict(dict(zip(RECORD_FIELDS, row[1:])))
+
+    def count_records(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM invite_records").fetchone()[0]
+
+    def has_ctx(self, ctx_id):
+        return self.conn.execute(
+            "SELECT 1 FROM invite_records WHERE ctx_id=? LIMIT 1", (ctx_id,)
+        ).fetchone() is not None
+
+    def get_record(self, ctx_id, user_id):
+        row = self.conn.execute(
+            f"SELECT {self._COLUMNS} FROM invite_records WHERE ctx_id=? AND user_id=?",
+            (ctx_id, str(user_id)),
+        ).fetchone()
+        return self._record(row)[1] if row else None
+
+    def put_record(self, ctx_id, user_id, record, reason=""):
+        if self._indexed(ctx_id):
+            self._reindex(ctx_id, user_id, self.get_record(ctx_id, user_id), record)
+        self.conn.execute(self._UPSERT, self._row(ctx_id, user_id, record))
+        self.mark_dirty()
+
+    def update_record(self, ctx_id, user_id, reason="", **fields):
+        old = self.get_record(ctx_id, user_id)
+        if old is None:
+            return False
+        rec = old.copy()
+        for name, value in fields.items():
+            setattr(rec, name, value)
+        self._reindex(ctx_id, user_id, old, rec)
+        self.conn.execute(self._UPSERT, self._row(ctx_id, user_id, rec))
+        self.mark_dirty()
+        return True
+
+    def delete_record(self, ctx_id, user_id, reason=""):
+        if self._indexed(ctx_id):
+            self._reindex(ctx_id, user_id, self.get_record(ctx_id, user_id), None)
+        cur = self.conn.execute(
+            "DELETE FROM invite_records WHERE ctx_id=? AND user_id=?", (ctx_id, str(user_id))
+        )
+        if cur.rowcount:
+            self.mark_dirty()
+
+    def iter_records(self, ctx_id):
+        cur = self.conn.execute(
+            f"SELECT {self._COLUMNS} FROM invite_records WHERE ctx_id=?", (ctx_id,)
+        )
+        for row in cur.fetchall():
+            yield self._record(row)
+
+    def legacy_count(self):
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM invite_records WHERE ctx_id=?", (LEGACY_CTX,)
+        ).fetchone()[0]
+
+    def legacy_chunk(self, offset, limit):
+        cur = self.conn.execute(
+            f"SELECT {self._COLUMNS} FROM invite_records WHERE ctx_id=? ORDER BY user_id LIMIT ? OFFSET ?",
+            (LEGACY_CTX, limit, offset),
+        )
+        return [self._record(row) for row in cur.fetchall()]
+
+    def ctx_ids(self):
+        cur = self.conn.execute("SELECT DISTINCT ctx_id FROM invite_records WHERE ctx_id<>?", (LEGACY_CTX,))
+        return [row[0] for row in cur.fetchall()]
+
+    def records_by_inviter(self, ctx_id, inviter):
+        cur = self.conn.execute(
+            f"SELECT {self._COLUMNS} FROM invite_records WHERE ctx_id=? AND inviter=?",
+            (ctx_id, str(inviter)),
+        )
+        return [self._record(row) for row in cur.fetchall()]
+
+    def drop_ctx(self, ctx_id, reason=""):
+        cur = self.conn.execute("DELETE FROM invite_records WHERE ctx_id=?", (ctx_id,))
+        self.forget_indexes(ctx_id)
+        if cur.rowcount:
+            self.mark_dirty()
+
+    def clear_all(self, reason=""):
+        self.conn.execute("DELETE FROM invite_records")
+        self._drop_indexes()
+        self.mark_dirty()
+
+    def _prepare_write(self):
+        # 变更已在连接的事务里，线程里只做 commit（WAL 同步）
+        conn = self.conn
+
+        def job():
+            conn.commit()
+            return 0
+        return job
+
+    async def close(self):
+        await super().close()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class ShardedStore(InviteStore):
+    """按数据桶分片：每个 ctx_id 一个 JSON 文件，首次访问时才加载。
+
+    常驻内存的分片超过 max_resident 个时按 LRU 淘汰已落盘的冷分片（连同其邀请人索引）；
+    写盘只重写有变更的分片。每次变更先追加事件日志，分片落盘后日志并入审计归档。
+    首次启用时自动把单文件 invitecount.json 拆分为分片，原文件保留不动。
+    """
+
+    backend = "sharded"
+    MANIFEST = "manifest.json"
+
+    def __init__(self, path: str, flush_interval: float = 5.0, flush_threshold: int = 100,
+                 max_resident: int = 256, import_from: str | None = None):
+        super().__init__(path, flush_interval, flush_threshold)
+        self.max_resident = max(1, int(max_resident))
+        self.import_from = import_from
+        self.imported_from = None
+        self._resident = OrderedDict()  # ctx_id -> {user_id: MemberRecord}，按访问顺序
+        self._counts = {}  # ctx_id -> 记录数（含未加载的分片，None 表示未知）
+        # 分片变更代数：_gen 为内存中的最新代数，_saved 为已落盘的代数，两者不等即为脏分片。
+        # 代数全局递增，整桶删除后重建的分片不会与写盘中的旧代数相同
+        self._gen = {}
+        self._saved = {}
+        self._gen_seq = 0
+        self._deleted = set()  # 清空/整桶删除后待删除的分片
+        self.journal = EventJournal(os.path.join(path, "journal.jsonl"), os.path.join(path, "audit.jsonl.gz"))
+        self.stats.update(shard_loads=0, shard_evictions=0, shards_written=0, replayed=0)
+
+    # ==== 分片文件 ====
+    @staticmethod
+    def _shard_name(ctx_id: str) -> str:
+        return ("_legacy" if ctx_id == LEGACY_CTX else quote(ctx_id, safe="")) + ".json"
+
+    @staticmethod
+    def _ctx_from_name(name: str) -> str:
+        stem = name[:-len(".json")]
+        return LEGACY_CTX if stem == "_legacy" else unquote(stem)
+
+    def _shard_path(self, ctx_id: str) -> str:
+        return os.path.join(self.path, self._shard_name(ctx_id))
+
+    def load(self):
+        os.makedirs(self.path, exist_ok=True)
+        manifest = {}
+        manifest_path = os.path.join(self.path, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except Exception as e:
+                logger.warning(f"[invite] 分片清单损坏，将按需重新统计：{e}")
+        counts = manifest.get("counts") or {}
+        self.imported_from = manifest.get("imported_from")
+        for name in os.listdir(self.path):
+            if name.endswith(".json") and name != self.MANIFEST:
+                ctx_id = self._ctx_from_name(name)
+                self._counts[ctx_id] = counts.get(ctx_id)
+        if not self._counts and not self.imported_from:
+            self._import_json_once()
+        for entry in self.journal.replay():
+            self._apply(entry)
+        self.stats["replayed"] = self.journal.entries
+        if self.journal.entries:
+            self._dirty += self.journal.entries
+            logger.info(f"[invite] 已重放事件日志 {self.journal.entries} 条")
+
+    def _import_json_once(self):
+        """把单文件数据（含其未压缩的事件日志）拆分为分片"""
+        if not self.import_from:
+            return
+        source = JsonStore(self.import_from)
+        journal = source.journal
+        if source._snapshot_source() is None and not journal.files():
+            return
+        source.load()
+        source.journal.close()
+        buckets = dict(source.iter_buckets())
+        legacy = dict(source.iter_records(LEGACY_CTX))
+        if legacy:
+            buckets[LEGACY_CTX] = legacy
+        for ctx_id, bucket in buckets.items():
+            self._write_shard(ctx_id, bucket)
+            self._counts[ctx_id] = len(bucket)
+        self.imported_from = self.import_from
+        self._write_manifest(dict(self._counts))
+        logger.info(f"[invite] 已从 {self.import_from} 拆分出 {len(buckets)} 个数据分片")
+
+    def _write_shard(self, ctx_id: str, bucket: dict) -> int:
+        payload = json.dumps(bucket, ensure_ascii=False, separators=(",", ":"), default=json_default).encode("utf-8")
+        atomic_write_bytes(self._shard_path(ctx_id), payload)
+        return len(payload)
+
+    def _write_manifest(self, counts: dict):
+        payload = json.dumps({"counts": counts, "imported_from": self.imported_from}, ensure_ascii=False)
+        atomic_write_bytes(os.path.join(self.path, self.MANIFEST), payload.encode("utf-8"))
+
+    def _load_shard(self, ctx_id: str) -> dict:
+        try:
+            with open(self._shard_path(ctx_id), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            raw = {}
+        except Exception as e:
+            logger.error(f"[invite] 加载数据分片 {ctx_id} 失败：{e}")
+            raw = {}
+        self.stats["shard_loads"] += 1
+        bucket = {
+            intern_id(uid): MemberRecord.from_dict(rec) for uid, rec in raw.items() if isinstance(rec, dict)
+        }
+        self._counts[ctx_id] = len(bucket)
+        return bucket
+
+    def _is_dirty(self, ctx_id: str) -> bool:
+        return self._gen.get(ctx_id, 0) != self._saved.get(ctx_id, 0)
+
+    def _touch(self, ctx_id: str):
+        self._gen_seq += 1
+        self._gen[ctx_id] = self._gen_seq
+
+    def _bucket(self, ctx_id: str, create: bool = False) -> dict:
+        bucket = self._resident.get(ctx_id)
+        if bucket is not None:
+            self._resident.move_to_end(ctx_id)
+            return bucket
+        if ctx_id in self._counts:
+            bucket = self._load_shard(ctx_id)
+        elif create:
+            bucket = {}
+            self._counts[ctx_id] = 0
+        else:
+            return {}
+        self._resident[ctx_id] = bucket
+        self._evict()
+        return bucket
+
+    def _evict(self):
+        """淘汰最久未访问且已落盘的分片；脏分片要等写盘后才能淘汰。
+        刚取出的分片（最后一个）即将被写入，不能淘汰，否则写入会落在已不常驻的字典上而丢失"""
+        if len(self._resident) <= self.max_resident:
+            return
+        for ctx_id in list(self._resident)[:-1]:
+            if len(self._resident) <= self.max_resident:
+                break
+            if self._is_dirty(ctx_id):
+                continue
+            del self._resident[ctx_id]
+            self._indexes.pop(ctx_id, None)
+            self.stats["shard_evictions"] += 1
+
+    # ==== 记录接口 ====
+    def count_records(self) -> int:
+        total = 0
+        for ctx_id, count in list(self._counts.items()):
+            if count is None:
+                count = len(self._bucket(ctx_id))
+            total += count
+        return total
+
+    def has_ctx(self, ctx_id: str) -> bool:
+        return ctx_id != LEGACY_CTX and ctx_id in self._counts
+
+    def get_record(self, ctx_id, user_id):
+        return self._bucket(ctx_id).get(str(user_id))
+
+    def _log(self, op: str, ctx_id: str, user_id=None, reason: str = "", **extra):
+        entry = {"ts": int(time.time()), "op": op, "ev": reason, "ctx": ctx_id}
+        if user_id is not None:
+            entry["uid"] = str(user_id)
+        entry.update(extra)
+        self.journal.append(entry)
+        self.mark_dirty()
+
+    def _apply(self, entry: dict):
+        """重放单条日志（不再写日志）"""
+        op = entry.get("op")
+        ctx_id = entry.get("ctx", LEGACY_CTX)
+        uid = entry.get("uid")
+        if op == "put":
+            bucket = self._bucket(ctx_id, create=True)
+            uid = intern_id(uid)
+            if uid not in bucket:
+                self._counts[ctx_id] = len(bucket) + 1
+            bucket[uid] = MemberRecord.from_dict(entry.get("rec") or {})
+            self._touch(ctx_id)
+        elif op == "del":
+            bucket = self._bucket(ctx_id)
+            if bucket.pop(uid, None) is not None:
+                self._counts[ctx_id] = len(bucket)
+                self._touch(ctx_id)
+        elif op == "drop":
+            self._drop(ctx_id)
+        elif op == "clear":
+            self._clear()
+
+    def put_record(self, ctx_id, user_id, record, reason=""):
+        bucket = self._bucket(ctx_id, create=True)
+        user_id = intern_id(user_id)
+        old = bucket.get(user_id)
+        bucket[user_id] = record
+        self._counts[ctx_id] = len(bucket)
+        self._touch(ctx_id)
+        self._reindex(ctx_id, user_id, old, record)
+        self._log("put", ctx_id, user_id, reason, rec=record)
+
+    def update_record(self, ctx_id, user_id, reason="", **fields):
+        bucket = self._bucket(ctx_id)
+        user_id = intern_id(user_id)
+        old = bucket.get(user_id)
+        if old is None:
+            return False
+        # 写时复制：旧对象可能正被写盘线程序列化
+        rec = old.copy()
+        for name, value in fields.items():
+            setattr(rec, name, value)
+        bucket[user_id] = rec
+        self._touch(ctx_id)
+        self._reindex(ctx_id, user_id, old, rec)
+        self._log("put", ctx_id, user_id, reason, rec=rec)
+        return True
+
+    def delete_record(self, ctx_id, user_id, reason=""):
+        bucket = self._bucket(ctx_id)
+        old = bucket.pop(str(user_id), None)
+        if old is not None:
+            self._counts[ctx_id] = len(bucket)
+            self._touch(ctx_id)
+            self._reindex(ctx_id, user_id, old, None)
+            self._log("del", ctx_id, user_id, reason)
+
+    def iter_records(self, ctx_id):
+        for uid, rec in list(self._bucket(ctx_id).items()):
+            yield uid, rec
+
+    def legacy_count(self):
+        return len(self._bucket(LEGACY_CTX)) if LEGACY_CTX in self._counts else 0
+
+    def legacy_chunk(self, offset, limit):
+        if LEGACY_CTX not in self._counts:
+            return []
+        return list(islice(self._bucket(LEGACY_CTX).items(), offset, offset + limit))
+
+    def ctx_ids(self):
+        return [ctx_id for ctx_id in self._counts if ctx_id != LEGACY_CTX]
+
+    def _clear(self):
+        self._deleted.update(self._counts)
+        self._resident.clear()
+        self._counts.clear()
+        self._drop_indexes()
+        self._gen.clear()
+        self._saved.clear()
+
+    def _drop(self, ctx_id: str):
+        if ctx_id in self._counts:
+            self._deleted.add(ctx_id)
+        self._resident.pop(ctx_id, None)
+        self._counts.pop(ctx_id, None)
+        self._gen.pop(ctx_id, None)
+        self._saved.pop(ctx_id, None)
+        self.forget_indexes(ctx_id)
+
+    def drop_ctx(self, ctx_id, reason=""):
+        if self.has_ctx(ctx_id):
+            self._drop(ctx_id)
+            self._log("drop", ctx_id, reason=reason)
+
+    def clear_all(self, reason=""):
+        self._clear()
+        self._log("clear", "", reason=reason)
+
+    def audit_trail(self, user_id, limit=20):
+        return self.journal.search(user_id, limit)
+
+    # ==== 写盘 ====
+    def _prepare_write(self):
+        """封存日志、浅拷贝脏分片（记录写时复制），返回线程里执行的写盘函数。
+        写盘函数带回已删除的分片与已写入分片的代数，由 _write_done 在事件循环里登记"""
+        seal = self.journal.seal()
+        for ctx_id in [c for c, g in self._gen.items() if self._saved.get(c) == g]:
+            # 已落盘的分片不再跟踪代数
+            del self._gen[ctx_id]
+            self._saved.pop(ctx_id, None)
+        shards = {ctx_id: (gen, dict(self._resident.get(ctx_id, {}))) for ctx_id, gen in self._gen.items()}
+        deleted = [ctx_id for ctx_id in self._deleted if ctx_id not in self._counts]
+        counts = {k: v for k, v in self._counts.items() if v is not None}
+
+        def job():
+            seal()
+            written = 0
+            for ctx_id in deleted:
+                try:
+                    os.remove(self._shard_path(ctx_id))
+                except FileNotFoundError:
+                    pass
+            saved = {}
+            for ctx_id, (gen, bucket) in shards.items():
+                written += self._write_shard(ctx_id, bucket)
+                saved[ctx_id] = gen
+            self._write_manifest(counts)
+            # 全部分片落盘后日志才可归档；中途失败则保留封存日志，下次启动可重放
+            self.journal.archive_sealed()
+            return written, (deleted, saved)
+        return job
+
+    def _write_done(self, done):
+        deleted, saved = done
+        self._deleted.difference_update(deleted)
+        for ctx_id, gen in saved.items():
+            # 写盘期间又有变更（或整桶被删）的分片代数已变，仍算脏分片，留待下次落盘
+            if self._gen.get(ctx_id) == gen:
+                self._saved[ctx_id] = gen
+        self.stats["shards_written"] += len(saved)
+        # 脏分片落盘后才能淘汰，常驻数回到 shard_cache_size 以内
+        self._evict()
+
+    async def close(self):
+        await super().close()
+        self.journal.close()
+
+
+def create_store(backend: str, json_path: str, flush_interval=5.0, flush_threshold=100,
+                 compact_threshold=5000, max_resident=256, snapshot_format="binary") -> InviteStore:
+    """按配置创建存储后端；sqlite 库文件、分片目录与 json 同目录"""
+    backend = str(backend or "json").lower()
+    if backend == "sqlite":
+        db_path = os.path.splitext(json_path)[0] + ".db"
+        return SqliteStore(db_path, flush_interval, flush_threshold, import_from=json_path)
+    if backend == "sharded":
+        shard_dir = os.path.splitext(json_path)[0] + "_shards"
+        return ShardedStore(shard_dir, flush_interval, flush_threshold, max_resident=max_resident,
+                            import_from=json_path)
+    return JsonStore(json_path, flush_interval, flush_threshold, compact_threshold, snapshot_format)
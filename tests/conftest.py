@@ -0,0 +1,120 @@
+import logging
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _install_astrbot_shim():
+    """未安装 AstrBot 时提供插件模块导入所需的最小接口，只供测试使用"""
+    try:
+        import astrbot.api  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    class _Filter:
+        class EventMessageType:
+            GROUP_MESSAGE = "group"
+
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: (lambda f: f)
+
+    class Star:
+        def __init__(self, context):
+            self.context = context
+
+    api = types.ModuleType("astrbot.api")
+    api.logger = logging.getLogger("astrbot")
+    api.AstrBotConfig = type("AstrBotConfig", (dict,), {})
+    event = types.ModuleType("astrbot.api.event")
+    event.filter = _Filter()
+    event.AstrMessageEvent = type("AstrMessageEvent", (), {})
+    event.MessageEventResult = type("MessageEventResult", (), {})
+    star = types.ModuleType("astrbot.api.star")
+    star.Context = type("Context", (), {})
+    star.Star = Star
+    star.register = lambda *args, **kwargs: (lambda cls: cls)
+    components = types.ModuleType("astrbot.api.message_components")
+    components.At = type("At", (), {"__init__": lambda self, qq=None: setattr(self, "qq", qq)})
+    root = types.ModuleType("astrbot")
+    root.api = api
+    api.event, api.star, api.message_components = event, star, components
+    sys.modules.update({
+        "astrbot": root, "astrbot.api": api, "astrbot.api.event": event,
+        "astrbot.api.star": star, "astrbot.api.message_components": components,
+    })
+
+
+_install_astrbot_shim()
+# 插件目录即包（AstrBot 按包加载，模块间使用相对导入）
+if "invitecount" not in sys.modules:
+    package = types.ModuleType("invitecount")
+    package.__path__ = [ROOT]
+    sys.modules["invitecount"] = package
+
+
+class FakeEvent:
+    """测试用的群消息/通知事件（aiocqhttp 平台）"""
+
+    def __init__(self, raw: dict, text: str = "", sender: str = "100", admin: bool = True):
+        self.message_obj = types.SimpleNamespace(raw_message=raw, message=[])
+        self.message_str = text
+        self.sender = sender
+        self.admin = admin
+
+    def get_platform_name(self):
+        return "aiocqhttp"
+
+    def get_group_id(self):
+        return str(self.message_obj.raw_message.get("group_id") or "")
+
+    def get_sender_id(self):
+        return self.sender
+
+    def get_session_id(self):
+        return "session"
+
+    def is_admin(self):
+        return self.admin
+
+    def get_messages(self):
+        return []
+
+    def plain_result(self, text):
+        return ("plain", text)
+
+    def image_result(self, url):
+        return ("image", url)
+
+    @classmethod
+    def notice(cls, notice_type, sub_type, user_id, operator_id="", group_id=1, ts=1700000000):
+        return cls({
+            "post_type": "notice", "notice_type": notice_type, "sub_type": sub_type, "group_id": group_id,
+            "user_id": str(user_id), "operator_id": str(operator_id), "time": ts,
+        })
+
+    @classmethod
+    def command(cls, text, group_id=1, sender="100"):
+        return cls({"group_id": group_id}, text, sender=sender)
+
+
+@pytest.fixture
+def fake_event():
+    return FakeEvent
+
+
+@pytest.fixture
+def make_plugin(tmp_path):
+    """按配置创建插件实例，数据写在 tmp_path/plugin-data 下；返回协程函数，测试结束前须调用 terminate()"""
+    from invitecount.main import InviteQueryPlugin
+
+    async def factory(**config):
+        context = types.SimpleNamespace(data_dir=str(tmp_path))
+        plugin = InviteQueryPlugin(context, sys.modules["astrbot.api"].AstrBotConfig({"save_interval": 0.1, **config}))
+        await plugin.initialize()
+        return plugin
+    return factory
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import date
+
+import pytest
+
+from invitecount import coldtier
+from invitecount.coldtier import ColdTier
+from invitecount.indexes import InviterIndex
+from invitecount.records import JOIN_ACTIVE, JOIN_INVITE, LEAVE_KICK, LEAVE_NONE, LEAVE_SELF, MemberRecord
+
+CTX = "aiocqhttp:G:1"
+NOW = int(time.time())
+DAY = 86400
+
+
+async def collect(results):
+    return [item async for item in results]
+
+
+async def open_plugin(make_plugin, backend):
+    plugin = await make_plugin(storage_backend=backend, storage_scope="group", cold_after_days=30)
+    # 由测试直接调用归档与核对，不等后台任务
+    plugin._cold_task.cancel()
+    return plugin
+
+
+def populate(store, seed=1):
+    """写入一批成员：一部分早已离群（可归档），一部分邀请过人（成链，不归档）；返回 {uid: 记录}"""
+    rng = random.Random(seed)
+    records = {}
+    for i in range(400):
+        uid = str(5000 + i)
+        inviter = str(10 + rng.randrange(6)) if rng.random() < 0.9 else None
+        if i > 40 and rng.random() < 0.2:
+            inviter = str(5000 + rng.randrange(40))
+        join_ts = NOW - rng.randrange(300) * DAY
+        roll = rng.random()
+        if roll < 0.4:
+            leave_type, leave_ts = LEAVE_NONE, 0
+        else:
+            leave_type = LEAVE_KICK if roll < 0.7 else LEAVE_SELF
+            leave_ts = max(join_ts, NOW - rng.randrange(200) * DAY)
+        records[uid] = MemberRecord(
+            nickname=f"n{uid}", inviter=inviter, join_type=JOIN_INVITE if inviter else JOIN_ACTIVE,
+            join_ts=join_ts, leave_type=leave_type, leave_ts=leave_ts,
+        )
+        store.put_record(CTX, uid, records[uid])
+    return records
+
+
+def summary(plugin):
+    """邀请人计数、日汇总、名次、邀请树与跨桶汇总"""
+    index = plugin.store.inviter_index(CTX)
+    window = (date.fromtimestamp(NOW - 90 * DAY), None)
+    ranking = index.ranking(1)
+    return (
+        {k: (s.total, s.valid, s.kicked, s.left) for k, s in index.by_inviter.items()},
+        index.counts(), index.counts(*window),
+        {k: ranking.rank(k) for k in index.by_inviter},
+        {uid: (n.total, n.valid, dict(n.levels)) for uid, n in index.tree.nodes.items() if n.total},
+        plugin.store.platform_index(CTX).counts(),
+    )
+
+
+def brute_force(records):
+    """不经冷数据层、按全部记录直接构建的结果"""
+    index = InviterIndex.build(records.items())
+    platform = InviterIndex.build(((CTX, uid), rec) for uid, rec in records.items())
+    window = (date.fromtimestamp(NOW - 90 * DAY), None)
+    ranking = index.ranking(1)
+    return (
+        {k: (s.total, s.valid, s.kicked, s.left) for k, s in index.by_inviter.items()},
+        index.counts(), index.counts(*window),
+        {k: ranking.rank(k) for k in index.by_inviter},
+        {uid: (n.total, n.valid, dict(n.levels)) for uid, n in index.tree.nodes.items() if n.total},
+        platform.counts(),
+    )
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "sharded"])
+def test_totals_unchanged_by_tiering_and_reload(make_plugin, backend):
+    async def run():
+        plugin = await open_plugin(make_plugin, backend)
+        try:
+            records = await plugin.writer.call(populate, plugin.store)
+            expected = brute_force(records)
+            assert summary(plugin) == expected
+            hot = plugin.store.count_records()
+            moved = await plugin._tier_cold()
+            assert moved and plugin.cold.count() == moved
+            assert plugin.store.count_records() == hot - moved
+            assert summary(plugin) == expected
+            # 再跑一次没有可归档的成员
+            assert await plugin._tier_cold() == 0
+        finally:
+            await plugin.terminate()
+        # 内存里只有汇总，重启后从 index.json 恢复
+        with open(plugin.cold.index_path, encoding="utf-8") as f:
+            assert "members" not in json.load(f)
+        reopened = await open_plugin(make_plugin, backend)
+        try:
+            assert reopened.cold.count() == moved
+            assert summary(reopened) == expected
+        finally:
+            await reopened.terminate()
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_archived_member_listed_queried_and_revived_on_rejoin(make_plugin, fake_event, backend):
+    async def run():
+        plugin = await open_plugin(make_plugin, backend)
+        try:
+            records = await plugin.writer.call(populate, plugin.store)
+            await plugin._tier_cold()
+            stats = plugin.store.inviter_stats(CTX, "11")
+            rows = await asyncio.to_thread(lambda: list(plugin.cold.scan(lambda c: c == CTX, "11")))
+            assert len(rows) == stats.archived > 0
+            uid = rows[0][1]
+
+            # 查询已归档成员：从归档读出，不新建热数据模板
+            hot = plugin.store.count_records()
+            result = await collect(plugin.cmd_invite_query(fake_event.command(f"/邀请查询 {uid}")))
+            assert plugin.store.count_records() == hot
+            assert "●邀请人：11" in result[-1][1]
+
+            # 重新入群：核对后冷层作废旧记录，与只按热数据计数的结果一致
+            back = MemberRecord(nickname="back", inviter="12", join_type=JOIN_INVITE, join_ts=NOW)
+            await plugin.writer.call(plugin.store.put_record, CTX, uid, back)
+            assert plugin.cold.rejoined == {(CTX, uid)}
+            assert await plugin._reconcile_cold() == 1
+            assert not plugin.cold.rejoined
+            records[uid] = back
+            expected = brute_force(records)
+            assert summary(plugin) == expected
+            rows = await asyncio.to_thread(lambda: list(plugin.cold.scan(lambda c: c == CTX)))
+            assert uid not in {row[1] for row in rows}
+            # 新入群的成员没有归档，核对后不影响计数
+            await plugin.writer.call(plugin.store.put_record, CTX, "9999", MemberRecord(inviter="12", join_ts=NOW))
+            assert await plugin._reconcile_cold() == 0
+            records["9999"] = plugin.store.get_record(CTX, "9999")
+            expected = brute_force(records)
+            assert summary(plugin) == expected
+        finally:
+            await plugin.terminate()
+        reopened = await open_plugin(make_plugin, backend)
+        try:
+            assert summary(reopened) == expected
+        finally:
+            await reopened.terminate()
+    asyncio.run(run())
+
+
+def test_index_write_failure_keeps_cold_tier_dirty(make_plugin, monkeypatch):
+    async def run():
+        plugin = await open_plugin(make_plugin, "json")
+        try:
+            await plugin.writer.call(populate, plugin.store)
+
+            def fail(*args, **kwargs):
+                raise OSError("disk full")
+            # 只让冷层索引写失败：存储数据照常落盘，冷层保持待保存并重新记脏
+            monkeypatch.setattr(coldtier, "atomic_write_bytes", fail)
+            await plugin._tier_cold()
+            errors = plugin.store.stats["flush_errors"]
+            assert errors and plugin.cold.dirty and plugin.store.dirty
+            monkeypatch.undo()
+            assert await plugin.store.flush_async()
+            assert not plugin.cold.dirty
+            assert os.path.exists(plugin.cold.index_path)
+        finally:
+            await plugin.terminate()
+    asyncio.run(run())
+
+
+def test_legacy_member_index_converted_to_summary(tmp_path):
+    join_ts = NOW - 100 * DAY
+    with open(tmp_path / "index.json", "w", encoding="utf-8") as f:
+        json.dump({"sizes": {}, "members": {CTX: {
+            "1": ["7", JOIN_INVITE, join_ts, LEAVE_SELF, NOW],
+            "2": ["7", JOIN_INVITE, join_ts, LEAVE_SELF, NOW],
+            "3": ["8", JOIN_INVITE, 0, LEAVE_KICK, NOW],
+        }}}, f)
+    cold = ColdTier(str(tmp_path))
+    assert cold.count(CTX) == 3
+    index = InviterIndex()
+    cold.apply(CTX, index)
+    assert (index.get("7").archived, index.get("7").left, index.get("8").kicked) == (2, 2, 1)
+    assert index.counts() == {"7": [0, 2, 2], "8": [0, 1, 1]}
+    assert index.counts(date.fromtimestamp(join_ts), None) == {"7": [0, 2, 2]}
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from invitecount.epochs import merge_record
+from invitecount.records import JOIN_INVITE, LEAVE_KICK, LEAVE_NONE, LEAVE_SELF, MemberRecord
+
+CTX = "aiocqhttp:G:1"
+
+
+async def collect(results):
+    return [item async for item in results]
+
+
+def test_merge_keeps_archived_join_over_blank_template():
+    archived = MemberRecord(nickname="a", inviter="777", join_type=JOIN_INVITE, join_ts=100)
+    merged = merge_record(archived, MemberRecord(nickname="b"))
+    assert (merged.inviter, merged.join_ts, merged.nickname) == ("777", 100, "b")
+
+
+def test_merge_takes_newer_leave_and_newer_join():
+    archived = MemberRecord(inviter="777", join_type=JOIN_INVITE, join_ts=100)
+    left = merge_record(archived, MemberRecord(leave_type=LEAVE_KICK, leave_ts=200, kicker="9"))
+    assert (left.inviter, left.leave_type, left.kicker) == ("777", LEAVE_KICK, "9")
+    rejoined = merge_record(left, MemberRecord(inviter="888", join_type=JOIN_INVITE, join_ts=300))
+    assert (rejoined.inviter, rejoined.join_ts, rejoined.leave_type) == ("888", 300, LEAVE_NONE)
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "sharded"])
+def test_reset_query_restore_keeps_archived_data(make_plugin, fake_event, backend):
+    async def run():
+        plugin = await make_plugin(storage_backend=backend, storage_scope="group")
+        try:
+            await plugin.handle_group_event(fake_event.notice("group_increase", "invite", 555, 777))
+            await plugin.handle_group_event(fake_event.notice("group_increase", "invite", 556, 777))
+            joined = plugin.store.get_record(CTX, "555").join_ts
+            await collect(plugin.cmd_season_reset(fake_event.command("/邀请赛季重置")))
+            # 新一轮里查询旧成员会新建空白模板；重置前入群的成员退群
+            await collect(plugin.cmd_invite_query(fake_event.command("/邀请查询 555")))
+            assert plugin.store.get_record(plugin.epochs.current(CTX), "555").inviter is None
+            aggregate = plugin.store.platform_index(plugin.epochs.current(CTX))
+            await plugin.handle_group_event(fake_event.notice("group_decrease", "leave", 556, ts=1700000100))
+            # 记到旧轮次的离群不计入当前轮次的汇总
+            assert aggregate.get("777") is None
+            await collect(plugin.cmd_epoch_restore(fake_event.command("/邀请恢复")))
+
+            current = plugin.epochs.current(CTX)
+            assert current == CTX
+            member = plugin.store.get_record(current, "555")
+            assert (member.inviter, member.join_ts, member.leave_type) == ("777", joined, LEAVE_NONE)
+            assert plugin.store.get_record(current, "556").leave_type == LEAVE_SELF
+            stats = plugin.store.inviter_stats(current, "777")
+            assert (stats.total, stats.valid, stats.left) == (2, 1, 1)
+        finally:
+            await plugin.terminate()
+    asyncio.run(run())
@@ -0,0 +1,102 @@
+import random
+
+from invitecount.indexes import InviterIndex
+from invitecount.records import LEAVE_NONE, LEAVE_SELF, MemberRecord
+
+
+def member(inviter, alive=True):
+    return MemberRecord(inviter=inviter, join_ts=1700000000, leave_type=LEAVE_NONE if alive else LEAVE_SELF)
+
+
+class Bucket:
+    """按存储层的方式维护索引：改记录 = 旧记录减、新记录加"""
+
+    def __init__(self):
+        self.records = {}
+        self.index = InviterIndex()
+
+    def put(self, uid, record):
+        self.index.remove(uid, self.records.get(uid))
+        self.records[uid] = record
+        self.index.add(uid, record)
+
+    def delete(self, uid):
+        self.index.remove(uid, self.records.pop(uid, None))
+
+
+def brute_subtree(records, uid):
+    """暴力统计 uid 的下线：总数、在群数、各层人数"""
+    children = {}
+    for child, rec in records.items():
+        if rec.inviter:
+            children.setdefault(rec.inviter, []).append(child)
+    total = valid = 0
+    levels = {}
+    frontier, depth = [uid], 0
+    while frontier:
+        depth += 1
+        frontier = [c for parent in frontier for c in children.get(parent, ())]
+        if frontier:
+            levels[depth] = len(frontier)
+            total += len(frontier)
+            valid += sum(records[c].leave_type == LEAVE_NONE for c in frontier)
+    return total, valid, levels
+
+
+def assert_tree_matches(bucket):
+    tree = bucket.index.tree
+    uids = set(bucket.records) | {r.inviter for r in bucket.records.values() if r.inviter}
+    for uid in uids:
+        expected = brute_subtree(bucket.records, uid)
+        node = tree.get(uid)
+        actual = (node.total, node.valid, dict(node.levels)) if node else (0, 0, {})
+        assert actual == expected, uid
+
+
+def test_cycle_edge_relinked_when_blocking_edge_changes():
+    bucket = Bucket()
+    bucket.put("B", member("A"))
+    bucket.put("A", member("B"))  # 成环，暂不接入
+    assert bucket.index.tree.pending == {"A": ("B", True)}
+    bucket.put("B", member("C"))  # 阻挡它的边改了邀请人
+    assert not bucket.index.tree.pending
+    assert bucket.index.tree.ancestors("A") == ["B", "C"]
+    assert_tree_matches(bucket)
+
+
+def test_cycle_edge_relinked_when_blocking_member_removed():
+    bucket = Bucket()
+    bucket.put("B", member("A"))
+    bucket.put("C", member("B"))
+    bucket.put("A", member("C"))
+    bucket.delete("B")
+    assert not bucket.index.tree.pending
+    assert_tree_matches(bucket)
+
+
+def test_removing_pending_edge_forgets_it():
+    bucket = Bucket()
+    bucket.put("B", member("A"))
+    bucket.put("A", member("B"))
+    bucket.delete("A")
+    bucket.delete("B")
+    assert not bucket.index.tree.pending
+    assert not bucket.index.tree.nodes
+
+
+def test_tree_aggregates_match_brute_force_after_churn():
+    rng = random.Random(7)
+    uids = [str(i) for i in range(15)]
+    bucket = Bucket()
+    # 随机改邀请人（途中会出现环），再逐个改成无环的最终状态
+    for _ in range(300):
+        uid = rng.choice(uids)
+        if rng.random() < 0.1:
+            bucket.delete(uid)
+        else:
+            bucket.put(uid, member(rng.choice(uids), rng.random() < 0.7))
+    for i in rng.sample(range(len(uids)), len(uids)):
+        inviter = uids[rng.randrange(i)] if i and rng.random() < 0.9 else None
+        bucket.put(uids[i], member(inviter, rng.random() < 0.7))
+    assert not bucket.index.tree.pending
+    assert_tree_matches(bucket)
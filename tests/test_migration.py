@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+
+from invitecount import storage
+from invitecount.migration import LegacyMigrator
+from invitecount.writer import StoreWriter
+
+
+def legacy_data(count=230):
+    """旧版扁平结构：顶层直接是 user_id -> 记录；另有一个已迁移的作用域桶"""
+    data = {
+        str(10 ** 6 + i): {
+            "nickname": f"n{i}", "inviter": str(50 + i % 7), "inviter_name": None, "join_type": "邀请",
+            "join_time": "2024-01-01 00:00:00", "leave_type": "退群" if i % 5 == 0 else None,
+            "leave_time": "2024-02-01 00:00:00" if i % 5 == 0 else None,
+        }
+        for i in range(count)
+    }
+    data["aiocqhttp:G:9"] = {"1": {"nickname": "x", "inviter": None, "join_type": "主动"}}
+    return data
+
+
+def open_store(tmp_path, backend):
+    store = storage.create_store(backend, str(tmp_path / "invitecount.json"))
+    store.load()
+    return store
+
+
+async def drain(results):
+    return [state async for state in results]
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite", "sharded"])
+def test_migration_resumes_after_failure_without_losing_records(tmp_path, backend):
+    (tmp_path / "invitecount.json").write_text(json.dumps(legacy_data()), encoding="utf-8")
+
+    async def run():
+        store = open_store(tmp_path, backend)
+        original = store.legacy_records()
+        writer = StoreWriter()
+        await writer.start()
+        migrator = LegacyMigrator(str(tmp_path / "checkpoint.json"), chunk_size=50)
+        plan = {"mode": "group", "group_id": "1"}
+        calls = []
+
+        def failing(uid):
+            calls.append(uid)
+            if len(calls) > 120:
+                raise RuntimeError("boom")
+            return "aiocqhttp:G:1"
+
+        # 第三批判定出错：前两批已提交，本批一条都不迁移
+        with pytest.raises(RuntimeError):
+            await drain(migrator.run(store, writer, plan, failing))
+        assert migrator.checkpoint.state["moved"] == 100
+        assert store.legacy_count() == len(original) - 100
+        await store.close()
+        await writer.close()
+
+        # 重启后按检查点续跑
+        store = open_store(tmp_path, backend)
+        writer = StoreWriter()
+        await writer.start()
+        migrator = LegacyMigrator(str(tmp_path / "checkpoint.json"), chunk_size=50)
+        assert migrator.checkpoint.unfinished
+        states = await drain(migrator.run(store, writer, plan, lambda uid: "aiocqhttp:G:1", resume=True))
+        assert states[-1]["moved"] == len(original)
+        assert migrator.checkpoint.state["finished"] and not migrator.checkpoint.unfinished
+        assert store.legacy_count() == 0
+        assert {uid: rec.to_dict() for uid, rec in store.iter_records("aiocqhttp:G:1")} == {
+            uid: rec.to_dict() for uid, rec in original.items()
+        }
+        assert store.get_record("aiocqhttp:G:9", "1") is not None
+        await store.close()
+        await writer.close()
+    asyncio.run(run())
+
+
+def test_skipped_records_stay_in_legacy_data(tmp_path):
+    (tmp_path / "invitecount.json").write_text(json.dumps(legacy_data(120)), encoding="utf-8")
+
+    async def run():
+        store = open_store(tmp_path, "json")
+        writer = StoreWriter()
+        await writer.start()
+        migrator = LegacyMigrator(str(tmp_path / "checkpoint.json"), chunk_size=25)
+        # 尾号为 0 的成员找不到目标（如已不在任何群），保留在旧数据里，其余照常迁移
+        def target_for(uid):
+            return None if uid.endswith("0") else f"aiocqhttp:U:{uid}"
+        states = await drain(migrator.run(store, writer, {"mode": "user"}, target_for))
+        assert (states[-1]["moved"], states[-1]["skipped"]) == (108, 12)
+        assert sorted(store.legacy_records()) == sorted(uid for uid in legacy_data(120) if uid.endswith("0") and ":" not in uid)
+        assert store.get_record("aiocqhttp:U:1000001", "1000001").nickname == "n1"
+        await store.close()
+        await writer.close()
+    asyncio.run(run())
@@ -0,0 +1,60 @@
+import importlib.util
+import os
+
+import pytest
+
+# protocol.py 不依赖 astrbot，直接按文件加载
+_spec = importlib.util.spec_from_file_location(
+    "invitecount_protocol", os.path.join(os.path.dirname(os.path.dirname(__file__)), "protocol.py")
+)
+protocol = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(protocol)
+
+
+def notice(**fields):
+    return {"post_type": "notice", "group_id": 1, "time": 1700000000, **fields}
+
+
+@pytest.mark.parametrize("platform", ["aiocqhttp", "napcat"])
+@pytest.mark.parametrize("alias", ["operator_id", "inviter_id", "operator_user_id"])
+def test_invite_operator_aliases(platform, alias):
+    raw = notice(notice_type="group_increase", sub_type="invite", user_id=1001, **{alias: 42})
+    result = protocol.NoticeNormalizer().normalize(raw, "notice", platform)
+    assert result.sub_type == "invite"
+    assert result.user_id == "1001"
+    assert result.operator_id == "42"
+
+
+@pytest.mark.parametrize("platform", ["aiocqhttp", "napcat"])
+@pytest.mark.parametrize("alias", ["user_id", "target_id", "member_id"])
+def test_kick_member_aliases(platform, alias):
+    raw = notice(notice_type="group_decrease", sub_type="kick", operator_user_id=9, **{alias: 1002})
+    result = protocol.NoticeNormalizer().normalize(raw, "notice", platform)
+    assert result.sub_type == "kick"
+    assert result.user_id == "1002"
+    assert result.operator_id == "9"
+
+
+@pytest.mark.parametrize("alias", ["userId", "member"])
+def test_generic_fallback_for_other_member_aliases(alias):
+    # 平台已缓存为 onebot_v11，载荷却用了其他协议的字段名
+    normalizer = protocol.NoticeNormalizer()
+    normalizer.normalize(notice(notice_type="group_increase", sub_type="approve", user_id=1), "notice", "aiocqhttp")
+    raw = notice(notice_type="group_decrease", sub_type="leave", **{alias: 1003})
+    result = normalizer.normalize(raw, "notice", "aiocqhttp")
+    assert result.user_id == "1003"
+    assert result.adapter == "generic"
+
+
+@pytest.mark.parametrize("alias", ["operatorUid", "inviter"])
+def test_generic_fallback_for_other_operator_aliases(alias):
+    raw = notice(notice_type="group_increase", sub_type="invite", user_id=1004, **{alias: 77})
+    result = protocol.NoticeNormalizer().normalize(raw, "notice", "aiocqhttp")
+    assert result.operator_id == "77"
+
+
+def test_active_join_without_operator_keeps_cached_adapter():
+    raw = notice(notice_type="group_increase", sub_type="approve", user_id=1005)
+    result = protocol.NoticeNormalizer().normalize(raw, "notice", "aiocqhttp")
+    assert result.adapter == "onebot_v11"
+    assert result.operator_id == ""
@@ -0,0 +1,88 @@
+import random
+from datetime import date, datetime
+
+import pytest
+
+from invitecount.indexes import InviterIndex, RankIndex
+from invitecount.main import InviteQueryPlugin
+from invitecount.records import LEAVE_KICK, LEAVE_NONE, LEAVE_SELF, MemberRecord
+
+
+def brute_rank(scores, key):
+    return 1 + sum(value > scores[key] for value in scores.values())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rank_index_matches_brute_force(seed):
+    rng = random.Random(seed)
+    ranking, scores = RankIndex(), {}
+    for _ in range(500):
+        key = str(rng.randrange(40))
+        if rng.random() < 0.2:
+            ranking.set(key, None)
+            scores.pop(key, None)
+        else:
+            # 偶尔给很大的计数，触发树状数组扩容
+            scores[key] = rng.choice([rng.randrange(6), rng.randrange(100)])
+            ranking.set(key, scores[key])
+    assert len(ranking) == len(scores)
+    for key in scores:
+        assert ranking.rank(key) == brute_rank(scores, key)
+    rows = ranking.items(0, len(scores))
+    assert sorted(key for key, _, _ in rows) == sorted(scores)
+    assert [count for _, count, _ in rows] == sorted(scores.values(), reverse=True)
+    for position, (key, count, rank) in enumerate(rows):
+        assert count == scores[key] and rank == brute_rank(scores, key)
+        assert ranking.position(key) == position
+    # 任意一页与整表切片一致
+    assert ranking.items(7, 19) == rows[7:19]
+
+
+def test_index_rankings_and_windows_match_records():
+    rng = random.Random(3)
+    index, records = InviterIndex(), {}
+    base = datetime(2026, 9, 1).timestamp()
+    for _ in range(800):
+        uid = str(rng.randrange(200))
+        record = MemberRecord(
+            inviter=str(rng.randrange(12)), join_ts=base + rng.randrange(60) * 86400,
+            leave_type=rng.choice([LEAVE_NONE, LEAVE_NONE, LEAVE_KICK, LEAVE_SELF]),
+        )
+        index.remove(uid, records.get(uid))
+        records[uid] = record
+        index.add(uid, record)
+        if uid == "0":
+            index.ranking(1)  # 中途构建后转为增量维护
+
+    def expected(start=None, end=None):
+        counts = {}
+        for rec in records.values():
+            day = date.fromtimestamp(rec.join_ts)
+            if (start and day < start) or (end and day > end):
+                continue
+            row = counts.setdefault(rec.inviter, [0, 0, 0])
+            row[1] += 1
+            row[2 if rec.leave_type else 0] += 1
+        return counts
+
+    assert index.counts() == expected()
+    window = (date(2026, 9, 10), date(2026, 9, 20))
+    assert index.counts(*window) == {k: v for k, v in expected(*window).items() if v[1]}
+    totals = {k: v[1] for k, v in expected().items()}
+    for inviter in totals:
+        assert index.ranking(1).rank(inviter) == brute_rank(totals, inviter)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_window_neighbours_match_sorted_ranking(seed):
+    rng = random.Random(seed)
+    count_map = {str(i): [rng.randrange(5), rng.randrange(5), rng.randrange(3)] for i in range(rng.randint(1, 30))}
+    for sort_key in range(3):
+        target = rng.choice(list(count_map))
+        # 稳定排序：同分保持原顺序，与 _ranked 的堆取前 N 名一致
+        order = sorted(count_map, key=lambda k: count_map[k][sort_key], reverse=True)
+        pos = order.index(target)
+        values = {k: v[sort_key] for k, v in count_map.items()}
+        expected = [(uid, brute_rank(values, uid)) for uid in order[max(0, pos - 2):pos + 3]]
+        rows = InviteQueryPlugin._window_neighbours(count_map, sort_key, target)
+        assert [(uid, rank) for uid, _, rank in rows] == expected
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import random
+
+import pytest
+
+from invitecount import storage
+from invitecount.indexes import InviterIndex
+from invitecount.records import LEAVE_KICK, LEAVE_NONE, LEAVE_SELF, MemberRecord
+
+BACKENDS = ["json", "json-text", "sqlite", "sharded"]
+
+
+def open_store(tmp_path, backend, **kwargs):
+    if backend == "json-text":
+        kwargs.setdefault("snapshot_format", "json")
+        backend = "json"
+    store = storage.create_store(backend, str(tmp_path / "invitecount.json"), max_resident=2, **kwargs)
+    store.load()
+    return store
+
+
+def churn(store, seed=1):
+    """对存储做一串随机写入，返回期望的最终数据 {ctx_id: {uid: 记录字典}}"""
+    rng = random.Random(seed)
+    expected = {}
+    for _ in range(400):
+        ctx_id = f"aiocqhttp:G:{rng.randrange(6)}"
+        uid = str(rng.randrange(40))
+        roll = rng.random()
+        if roll < 0.7:
+            record = MemberRecord(
+                inviter=str(rng.randrange(8)), join_ts=1700000000 + rng.randrange(10 ** 6),
+                leave_type=rng.choice([LEAVE_NONE, LEAVE_NONE, LEAVE_KICK, LEAVE_SELF]),
+            )
+            store.put_record(ctx_id, uid, record, reason="join")
+            expected.setdefault(ctx_id, {})[uid] = record.to_dict()
+        elif roll < 0.9:
+            store.delete_record(ctx_id, uid, reason="reset")
+            expected.get(ctx_id, {}).pop(uid, None)
+        elif roll < 0.97:
+            if store.has_ctx(ctx_id):
+                store.drop_ctx(ctx_id, reason="reset")
+            expected.pop(ctx_id, None)
+        else:
+            nickname = f"n{rng.randrange(100)}"
+            store.update_record(ctx_id, uid, reason="rename", nickname=nickname)
+            if uid in expected.get(ctx_id, {}):
+                expected[ctx_id][uid]["nickname"] = nickname
+    return expected
+
+
+def contents(store):
+    return {
+        ctx_id: {uid: rec.to_dict() for uid, rec in store.iter_records(ctx_id)}
+        for ctx_id in store.ctx_ids()
+    }
+
+
+def assert_matches(store, expected):
+    expected = {k: v for k, v in expected.items() if v}
+    actual = {k: v for k, v in contents(store).items() if v}
+    assert {ctx: set(rows) for ctx, rows in actual.items()} == {ctx: set(rows) for ctx, rows in expected.items()}
+    for ctx_id, rows in expected.items():
+        assert actual[ctx_id] == rows
+        # 增量维护的邀请人索引与按记录重建的一致
+        rebuilt = InviterIndex.build(store.iter_records(ctx_id))
+        assert store.inviter_index(ctx_id).counts() == rebuilt.counts()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_restart_after_close(tmp_path, backend):
+    async def run():
+        store = open_store(tmp_path, backend, compact_threshold=50)
+        await store.start()
+        expected = churn(store)
+        await store.close()
+        reopened = open_store(tmp_path, backend)
+        assert_matches(reopened, expected)
+        await reopened.close()
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_flushed_changes_survive_crash(tmp_path, backend):
+    async def run():
+        store = open_store(tmp_path, backend, compact_threshold=10 ** 6)
+        expected = churn(store, seed=2)
+        assert await store.flush_async()
+        # 不调用 close()：模拟进程在两次落盘之间退出
+        if hasattr(store, "journal"):
+            store.journal.close()
+        reopened = open_store(tmp_path, backend)
+        assert_matches(reopened, expected)
+        await reopened.close()
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("backend", ["json", "json-text", "sharded"])
+def test_journal_replayed_when_snapshot_write_fails(tmp_path, backend, monkeypatch):
+    async def run():
+        store = open_store(tmp_path, backend, compact_threshold=1)
+        expected = churn(store, seed=3)
+
+        def fail(*args, **kwargs):
+            raise OSError("disk full")
+        # 封存日志之后、快照或分片写入时失败：重启后应从封存日志与日志段重放
+        monkeypatch.setattr(storage, "atomic_write_bytes", fail)
+        assert not await store.flush_async()
+        monkeypatch.undo()
+        store.journal.close()
+        reopened = open_store(tmp_path, backend)
+        assert reopened.stats["replayed"] > 0
+        assert_matches(reopened, expected)
+        await reopened.close()
+    asyncio.run(run())
+
+
+def test_journal_segments_replayed_in_order(tmp_path):
+    async def run():
+        store = open_store(tmp_path, "json", compact_threshold=10 ** 6)
+        store.put_record("aiocqhttp:G:1", "1", MemberRecord(inviter="a"))
+        store.journal.seal()  # 封存任务未执行即退出：旧段留在磁盘上
+        store.put_record("aiocqhttp:G:1", "1", MemberRecord(inviter="b"))
+        await store.flush_async()
+        store.journal.close()
+        assert sorted(os.listdir(tmp_path)) == ["invitecount.journal.jsonl", "invitecount.journal.jsonl.1"]
+        reopened = open_store(tmp_path, "json")
+        assert reopened.get_record("aiocqhttp:G:1", "1").inviter == "b"
+        await reopened.close()
+        assert not reopened.journal.files()
+    asyncio.run(run())
+
+
+def test_sharded_flush_evicts_to_cache_size(tmp_path):
+    async def run():
+        store = open_store(tmp_path, "sharded")
+        for i in range(20):
+            store.put_record(f"aiocqhttp:U:{i}", str(i), MemberRecord(inviter="1"))
+        assert len(store._resident) > 2
+        await store.flush_async()
+        assert len(store._resident) <= 2
+        assert store.stats["shards_written"] == 20
+        await store.close()
+    asyncio.run(run())
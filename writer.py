@@ -0,0 +1,117 @@
+import asyncio
+
+from astrbot.api import logger
+
+
+class WriteSlot:
+    """写队列中的占位：事件到达时先占位，准备好数据（如异步查昵称）后再 commit 具体变更"""
+
+    __slots__ = ("_job", "result")
+
+    def __init__(self):
+        loop = asyncio.get_running_loop()
+        self._job = loop.create_future()
+        self.result = loop.create_future()
+
+    def commit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """提交变更；返回的 future 在变更执行后给出 fn 的返回值"""
+        if not self._job.done():
+            self._job.set_result((fn, args, kwargs))
+        return self.result
+
+    def cancel(self):
+        """放弃占位（例如准备数据时出错）"""
+        if not self._job.done():
+            self._job.set_result(None)
+
+
+class StoreWriter:
+    """单写者：所有记录变更经队列按事件到达顺序串行执行。
+
+    处理函数在第一个 await 之前 reserve() 占位，之后查昵称等异步操作可以并发进行，
+    但变更一律按占位顺序落到存储上，不会出现“退群先于入群写入”之类的交错。
+    占位超过 slot_timeout 秒未提交则跳过，不阻塞后续变更；迟到的提交直接执行。
+    未 start() 时（或已关闭后）提交的变更立即执行。
+    """
+
+    def __init__(self, slot_timeout: float = 15.0):
+        self.slot_timeout = slot_timeout
+        self._queue = None
+        self._task = None
+        self.stats = {"applied": 0, "expired": 0, "errors": 0, "max_queue": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    def reserve(self) -> WriteSlot:
+        slot = WriteSlot()
+        if self._task is None:
+            # 未运行：提交时立即执行
+            slot._job.add_done_callback(lambda _: self._apply(slot))
+            return slot
+        self._queue.put_nowait(slot)
+        size = self._queue.qsize()
+        if size > self.stats["max_queue"]:
+            self.stats["max_queue"] = size
+        return slot
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        return self.reserve().commit(fn, *args, **kwargs)
+
+    async def call(self, fn, *args, **kwargs):
+        """提交变更并等待执行完成，返回 fn 的返回值"""
+        return await self.submit(fn, *args, **kwargs)
+
+    async def _run(self):
+        while True:
+            slot = await self._queue.get()
+            try:
+                if slot is None:
+                    return
+                if not slot._job.done():
+                    try:
+                        await asyncio.wait_for(asyncio.shield(slot._job), timeout=self.slot_timeout)
+                    except asyncio.TimeoutError:
+                        self.stats["expired"] += 1
+                        logger.warning("[invite] 写队列占位超时未提交，已跳过")
+                        slot._job.add_done_callback(lambda _, s=slot: self._apply(s))
+                        continue
+                self._apply(slot)
+            finally:
+                self._queue.task_done()
+
+    def _apply(self, slot: WriteSlot):
+        job = slot._job.result()
+        if slot.result.done():
+            return
+        if job is None:
+            slot.result.set_result(None)
+            return
+        fn, args, kwargs = job
+        try:
+            slot.result.set_result(fn(*args, **kwargs))
+            self.stats["applied"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"[invite] 写入邀请数据失败：{e}")
+            slot.result.set_exception(e)
+
+    async def drain(self):
+        """等待已入队的变更全部执行"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        if self._task is None:
+            return
+        # 先摘掉任务，关闭期间新的提交改为立即执行，不会排到结束标记之后
+        task, self._task = self._task, None
+        self._queue.put_nowait(None)
+        await task